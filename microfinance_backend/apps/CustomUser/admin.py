@@ -1,3 +1,29 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import BalanceEntry, BalanceSnapshot
+
+@admin.register(BalanceEntry)
+class BalanceEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'amount', 'balance_after', 'reference', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('user__username', 'reference', 'memo')
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+    show_full_result_count = False # The ledger grows without bound
+
+    # Append-only: entries are posted through apps/CustomUser/ledger.py, never edited here
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'balance', 'entry', 'created_at')
+    raw_id_fields = ('user', 'entry')
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'entry', 'balance', 'created_at') # Written by ledger.take_balance_snapshots()
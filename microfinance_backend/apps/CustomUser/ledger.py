@@ -0,0 +1,104 @@
+# apps/CustomUser/ledger.py
+"""
+Append-only ledger behind CustomUser.account_balance.
+
+post_entry() applies a change with a single `UPDATE ... SET account_balance
+= account_balance + amount`, so concurrent deposits and commissions from
+different workers can never overwrite each other, and records it as a
+BalanceEntry in the same transaction. The UPDATE's row lock is held only
+for that short transaction, so entries of one user get increasing ids in
+the order they were applied and each carries the balance it produced.
+
+account_balance stays the O(1) current balance. take_balance_snapshots()
+(Celery Beat) periodically records each changed balance as a
+BalanceSnapshot; replay_balance() rebuilds a balance from the last snapshot
+plus the entries after it, which is also how snapshots check for drift.
+Snapshots are incremental: the newest snapshot's entry id is the high-water
+mark, and a run only reads the entries posted after it.
+"""
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Sum
+
+from .models import BalanceEntry, BalanceSnapshot, CustomUser
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+
+def to_amount(amount):
+    """Birr amount as a 2-place Decimal; floats go through str() to avoid binary noise."""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return amount.quantize(CENT)
+
+def post_entry(user_id, amount, kind=BalanceEntry.KIND_ADJUSTMENT, reference='', memo=''):
+    """Applies `amount` to the user's balance and returns the new BalanceEntry."""
+    amount = to_amount(amount)
+    with transaction.atomic():
+        updated = CustomUser.objects.filter(pk=user_id).update(account_balance=F('account_balance') + amount)
+        if not updated:
+            raise CustomUser.DoesNotExist(f"No user with id {user_id}.")
+        # Read back inside the transaction: our UPDATE holds the row until commit
+        balance_after = CustomUser.objects.filter(pk=user_id).values_list('account_balance', flat=True).get()
+        return BalanceEntry.objects.create(
+            user_id=user_id, kind=kind, amount=amount, balance_after=balance_after,
+            reference=reference, memo=memo,
+        )
+
+def replay_balance(user_id, up_to_entry_id=None):
+    """Rebuilds the user's balance (as of `up_to_entry_id`, or now) from their last snapshot and the entries after it."""
+    snapshots = BalanceSnapshot.objects.filter(user_id=user_id)
+    if up_to_entry_id is not None:
+        snapshots = snapshots.filter(entry_id__lte=up_to_entry_id)
+    snapshot = snapshots.order_by('-entry_id').first()
+    entries = BalanceEntry.objects.filter(user_id=user_id)
+    if snapshot is not None:
+        entries = entries.filter(id__gt=snapshot.entry_id)
+    if up_to_entry_id is not None:
+        entries = entries.filter(id__lte=up_to_entry_id)
+    since = entries.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    return (snapshot.balance if snapshot is not None else Decimal('0')) + since
+
+def _snapshot_high_water_mark():
+    """Id of the newest entry any snapshot covers; every entry up to it has been through a run."""
+    return BalanceSnapshot.objects.aggregate(last=Max('entry_id'))['last'] or 0
+
+def take_balance_snapshots(batch_size=None):
+    """
+    Snapshots every user whose ledger moved since the last run, reading only
+    the entries above the high-water mark, `batch_size` entries at a time.
+    Returns the number of snapshots written.
+    """
+    batch_size = batch_size or getattr(settings, 'BALANCE_SNAPSHOT_BATCH_SIZE', 500)
+    taken = 0
+    while True:
+        after = _snapshot_high_water_mark()
+        entry_ids = list(BalanceEntry.objects.filter(id__gt=after).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not entry_ids:
+            break
+        # The user owning the last entry gets a snapshot of it, which moves the mark to entry_ids[-1]
+        pending = list(
+            BalanceEntry.objects.filter(id__gt=after, id__lte=entry_ids[-1])
+            .values('user').annotate(latest_entry_id=Max('id'))
+            .order_by('user').values_list('user', 'latest_entry_id')
+        )
+        latest_entries = BalanceEntry.objects.in_bulk([entry_id for _, entry_id in pending])
+        snapshots = []
+        for user_id, entry_id in pending:
+            entry = latest_entries[entry_id]
+            replayed = replay_balance(user_id, up_to_entry_id=entry_id)
+            if replayed != entry.balance_after:
+                # account_balance was changed outside the ledger; the entry reflects the real balance
+                logger.error(
+                    f"Balance drift for user {user_id}: ledger replays to {replayed}, "
+                    f"entry #{entry_id} recorded {entry.balance_after}."
+                )
+            snapshots.append(BalanceSnapshot(user_id=user_id, entry=entry, balance=entry.balance_after))
+        BalanceSnapshot.objects.bulk_create(snapshots)
+        taken += len(snapshots)
+    return taken
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def post_opening_balances(apps, schema_editor):
+    """Starts each existing user's ledger with their current balance, so replays match account_balance."""
+    CustomUser = apps.get_model('CustomUser', 'CustomUser')
+    BalanceEntry = apps.get_model('CustomUser', 'BalanceEntry')
+    BalanceEntry.objects.bulk_create(
+        BalanceEntry(
+            user_id=user_id, kind='OPENING', amount=balance, balance_after=balance, memo='Opening balance',
+        )
+        for user_id, balance in CustomUser.objects.exclude(account_balance=0).values_list('id', 'account_balance').iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CustomUser', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='account_balance',
+            field=models.DecimalField(decimal_places=2, default=0.0, help_text='Current account balance in Birr. Maintained by the balance ledger (apps/CustomUser/ledger.py); do not assign directly.', max_digits=15),
+        ),
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OPENING', 'Opening balance'), ('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('COMMISSION', 'Commission'), ('SHARE_PURCHASE', 'Share purchase'), ('ADJUSTMENT', 'Adjustment')], default='ADJUSTMENT', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Signed change; negative for debits.', max_digits=15)),
+                ('balance_after', models.DecimalField(decimal_places=2, help_text='Account balance right after this entry was applied.', max_digits=15)),
+                ('reference', models.CharField(blank=True, default='', help_text='Id of the deposit, commission, ... behind this entry.', max_length=100)),
+                ('memo', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Balance Entry',
+                'verbose_name_plural': 'Balance Entries',
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('entry', models.ForeignKey(help_text='Last entry covered.', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='CustomUser.balanceentry')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Balance Snapshot',
+                'verbose_name_plural': 'Balance Snapshots',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='balanceentry',
+            index=models.Index(fields=['user', 'id'], name='balance_entry_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['user', 'entry'], name='balance_snapshot_user_idx'),
+        ),
+        migrations.RunPython(post_opening_balances, migrations.RunPython.noop),
+    ]
@@ -50,7 +50,7 @@ class CustomUserManager(BaseUserManager):
         grand_father_name = extra_fields.pop('grand_father_name', '')
 
         referral_code = extra_fields.pop('referral_code', str(uuid.uuid4())[:8].upper())
-        account_balance = extra_fields.pop('account_balance', 0.00)
+        opening_balance = extra_fields.pop('account_balance', 0) # Posted to the ledger below
         
         # KYC related fields
         is_kyc_verified = extra_fields.pop('is_kyc_verified', False)
@@ -69,7 +69,6 @@ class CustomUserManager(BaseUserManager):
             father_name=father_name,
             grand_father_name=grand_father_name,
             referral_code=referral_code,
-            account_balance=account_balance,
             is_kyc_verified=is_kyc_verified,
             kyc_status=kyc_status,
             role=role, # Pass new field
@@ -77,6 +76,8 @@ class CustomUserManager(BaseUserManager):
         )
         user.set_password(password)
         user.save(using=self._db)
+        if opening_balance:
+            user.update_balance(opening_balance, kind=BalanceEntry.KIND_OPENING, memo='Opening balance')
         return user
 
     def create_user(self, username, telegram_id, phone_number, password=None, **extra_fields):
@@ -129,7 +130,7 @@ class CustomUser(AbstractUser):
         max_digits=15,
         decimal_places=2,
         default=0.00,
-        help_text="Current account balance in Birr."
+        help_text="Current account balance in Birr. Maintained by the balance ledger (apps/CustomUser/ledger.py); do not assign directly."
     )
     last_bot_interaction = models.DateTimeField(
         auto_now=True,
@@ -190,12 +191,102 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the user without writing account_balance back over an existing
+        row: the ledger changes it in the database, so the copy on an
+        instance loaded earlier may be stale. Only update_balance() moves it.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'account_balance'
+            ]
+        super().save(*args, **kwargs)
+
     def get_balance(self):
         """Returns the user's current account balance."""
         return self.account_balance
 
-    def update_balance(self, amount):
-        """Updates the user's account balance."""
-        self.account_balance += amount
-        self.save(update_fields=['account_balance'])
+    def update_balance(self, amount, kind=None, reference='', memo=''):
+        """
+        Adds `amount` (negative for a debit) to the account balance through the
+        ledger and returns the new balance. Safe under concurrent updates.
+        """
+        from .ledger import post_entry
+
+        entry = post_entry(self.pk, amount, kind=kind or BalanceEntry.KIND_ADJUSTMENT, reference=reference, memo=memo)
+        self.account_balance = entry.balance_after
         return self.account_balance
+
+
+class BalanceEntry(models.Model):
+    """
+    One change to a CustomUser's account balance. Entries are append-only:
+    corrections are posted as new entries, never by editing old ones.
+    """
+    KIND_OPENING = 'OPENING'
+    KIND_DEPOSIT = 'DEPOSIT'
+    KIND_WITHDRAWAL = 'WITHDRAWAL'
+    KIND_COMMISSION = 'COMMISSION'
+    KIND_SHARE_PURCHASE = 'SHARE_PURCHASE'
+    KIND_ADJUSTMENT = 'ADJUSTMENT'
+    KIND_CHOICES = [
+        (KIND_OPENING, _('Opening balance')),
+        (KIND_DEPOSIT, _('Deposit')),
+        (KIND_WITHDRAWAL, _('Withdrawal')),
+        (KIND_COMMISSION, _('Commission')),
+        (KIND_SHARE_PURCHASE, _('Share purchase')),
+        (KIND_ADJUSTMENT, _('Adjustment')),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='balance_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_ADJUSTMENT)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, help_text=_("Signed change; negative for debits."))
+    balance_after = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        help_text=_("Account balance right after this entry was applied.")
+    )
+    reference = models.CharField(max_length=100, blank=True, default='', help_text=_("Id of the deposit, commission, ... behind this entry."))
+    memo = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Balance entries are append-only; post a correcting entry instead.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Balance entries are append-only; post a correcting entry instead.")
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount:+} ({self.kind})"
+
+    class Meta:
+        verbose_name = _("Balance Entry")
+        verbose_name_plural = _("Balance Entries")
+        indexes = [
+            models.Index(fields=['user', 'id'], name='balance_entry_user_idx'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """
+    A user's balance as of `entry`, written periodically by
+    ledger.take_balance_snapshots() so history can be replayed from it.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='balance_snapshots')
+    entry = models.ForeignKey(BalanceEntry, on_delete=models.CASCADE, related_name='+', help_text=_("Last entry covered."))
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} as of entry #{self.entry_id}"
+
+    class Meta:
+        verbose_name = _("Balance Snapshot")
+        verbose_name_plural = _("Balance Snapshots")
+        indexes = [
+            models.Index(fields=['user', 'entry'], name='balance_snapshot_user_idx'),
+        ]
@@ -24,7 +24,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
             user.set_password(password)
         else:
             user.set_unusable_password()
-        user.save()
+        user.save(update_fields=['password'])
         return user
 
     def update(self, instance, validated_data):
@@ -34,5 +34,6 @@ class CustomUserSerializer(serializers.ModelSerializer):
         
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        # Only the submitted fields: account_balance is the ledger's (see CustomUser.save)
+        instance.save(update_fields=[*validated_data, *(['password'] if password else [])])
         return instance
\ No newline at end of file
@@ -0,0 +1,14 @@
+# apps/CustomUser/tasks.py
+import logging
+from celery import shared_task
+
+from .ledger import take_balance_snapshots
+
+logger = logging.getLogger(__name__)
+
+@shared_task(ignore_result=True)
+def snapshot_balances_task():
+    """Periodic task (Celery Beat) that snapshots the balances changed since the last run."""
+    taken = take_balance_snapshots()
+    if taken:
+        logger.info(f"Took {taken} balance snapshot(s).")
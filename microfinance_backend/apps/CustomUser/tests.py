@@ -0,0 +1,134 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from .ledger import post_entry, replay_balance, take_balance_snapshots
+from .models import BalanceEntry, BalanceSnapshot, CustomUser
+
+
+class LedgerTestCase(TestCase):
+    def make_user(self, n=1, **extra_fields):
+        return CustomUser.objects.create_user(f'user{n}', str(1000 + n), f'09120000{n:02d}', **extra_fields)
+
+    def stored_balance(self, user):
+        return CustomUser.objects.values_list('account_balance', flat=True).get(pk=user.pk)
+
+
+class BalanceLedgerTests(LedgerTestCase):
+    def test_post_entry_records_balance_after(self):
+        user = self.make_user()
+        first = post_entry(user.pk, '100.50', kind=BalanceEntry.KIND_DEPOSIT, reference='dep-1')
+        second = post_entry(user.pk, -20.25)
+        self.assertEqual(first.balance_after, Decimal('100.50'))
+        self.assertEqual(second.balance_after, Decimal('80.25'))
+        self.assertEqual(second.amount, Decimal('-20.25'))
+        self.assertEqual(self.stored_balance(user), Decimal('80.25'))
+
+    def test_post_entry_unknown_user(self):
+        with self.assertRaises(CustomUser.DoesNotExist):
+            post_entry(999999, 10)
+        self.assertFalse(BalanceEntry.objects.exists())
+
+    def test_opening_balance_is_posted_to_the_ledger(self):
+        user = self.make_user(account_balance=Decimal('250'))
+        self.assertEqual(self.stored_balance(user), Decimal('250.00'))
+        entry = BalanceEntry.objects.get(user=user)
+        self.assertEqual(entry.kind, BalanceEntry.KIND_OPENING)
+        self.assertEqual(entry.balance_after, Decimal('250.00'))
+
+    def test_update_balance_returns_new_balance(self):
+        user = self.make_user()
+        self.assertEqual(user.update_balance(40), Decimal('40.00'))
+        self.assertEqual(user.account_balance, Decimal('40.00'))
+
+    def test_entries_are_append_only(self):
+        entry = post_entry(self.make_user().pk, 10)
+        entry.memo = 'edited'
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+    def test_replay_balance(self):
+        user = self.make_user()
+        first = post_entry(user.pk, 100)
+        post_entry(user.pk, -30)
+        self.assertEqual(replay_balance(user.pk), Decimal('70'))
+        self.assertEqual(replay_balance(user.pk, up_to_entry_id=first.pk), Decimal('100'))
+        take_balance_snapshots()
+        post_entry(user.pk, 5)
+        self.assertEqual(replay_balance(user.pk), Decimal('75'))
+
+
+class StaleSaveTests(LedgerTestCase):
+    def test_stale_instance_save_keeps_ledger_balance(self):
+        user = self.make_user()
+        stale = CustomUser.objects.get(pk=user.pk)
+        post_entry(user.pk, 500)
+        stale.email = 'abebe@example.com'
+        stale.save()
+        self.assertEqual(self.stored_balance(user), Decimal('500.00'))
+        self.assertEqual(CustomUser.objects.get(pk=user.pk).email, 'abebe@example.com')
+
+    def test_assigned_balance_is_not_written(self):
+        user = self.make_user()
+        user.account_balance = Decimal('1000000')
+        user.save()
+        self.assertEqual(self.stored_balance(user), Decimal('0.00'))
+
+    def test_update_fields_save_keeps_ledger_balance(self):
+        user = self.make_user()
+        stale = CustomUser.objects.get(pk=user.pk)
+        post_entry(user.pk, 75)
+        stale.telegram_id = '2002'
+        stale.save(update_fields=['telegram_id'])
+        self.assertEqual(self.stored_balance(user), Decimal('75.00'))
+
+
+class BalanceSnapshotTests(LedgerTestCase):
+    def test_snapshots_only_changed_users(self):
+        alice, bob = self.make_user(1), self.make_user(2)
+        post_entry(alice.pk, 10)
+        post_entry(alice.pk, 15)
+        post_entry(bob.pk, 7)
+        self.assertEqual(take_balance_snapshots(), 2)
+        self.assertEqual(BalanceSnapshot.objects.get(user=alice).balance, Decimal('25.00'))
+
+        self.assertEqual(take_balance_snapshots(), 0) # Nothing posted since
+
+        entry = post_entry(bob.pk, 3)
+        self.assertEqual(take_balance_snapshots(), 1)
+        snapshot = BalanceSnapshot.objects.filter(user=bob).latest('entry_id')
+        self.assertEqual((snapshot.entry_id, snapshot.balance), (entry.pk, Decimal('10.00')))
+        self.assertEqual(BalanceSnapshot.objects.filter(user=alice).count(), 1)
+
+    def test_run_reads_only_entries_after_the_last_snapshot(self):
+        user = self.make_user()
+        post_entry(user.pk, 10)
+        take_balance_snapshots()
+        post_entry(user.pk, 5)
+        # Mark, entry ids after it, grouped users, their entries, one replay (2),
+        # the insert, then mark and entry ids again to find nothing left
+        with self.assertNumQueries(9):
+            self.assertEqual(take_balance_snapshots(), 1)
+
+    def test_batches_advance_the_high_water_mark(self):
+        alice, bob = self.make_user(1), self.make_user(2)
+        entries = [post_entry(user.pk, 1) for user in (alice, bob, alice, bob, alice)]
+        self.assertEqual(take_balance_snapshots(batch_size=2), 5)
+        self.assertEqual(
+            list(BalanceSnapshot.objects.order_by('entry_id').values_list('entry_id', flat=True)),
+            [entry.pk for entry in entries],
+        )
+        self.assertEqual(BalanceSnapshot.objects.filter(user=alice).latest('entry_id').balance, Decimal('3.00'))
+        self.assertEqual(take_balance_snapshots(batch_size=2), 0)
+
+    def test_drift_is_logged(self):
+        user = self.make_user()
+        post_entry(user.pk, 10)
+        CustomUser.objects.filter(pk=user.pk).update(account_balance=Decimal('500')) # Outside the ledger
+        post_entry(user.pk, 5)
+        with self.assertLogs('apps.CustomUser.ledger', 'ERROR') as logs:
+            take_balance_snapshots()
+        self.assertIn(f'Balance drift for user {user.pk}', logs.output[0])
+        self.assertEqual(BalanceSnapshot.objects.get(user=user).balance, Decimal('505.00'))
@@ -42,7 +42,7 @@ def register_user(request):
                 telegram_id = data.get('telegram_id')
                 if telegram_id and not user.telegram_id:
                     user.telegram_id = telegram_id
-                    user.save()
+                    user.save(update_fields=['telegram_id'])
                     logger.info(f"Existing user {phone_number} linked to Telegram ID {telegram_id}")
                 
                 # Serialize the existing user data to return
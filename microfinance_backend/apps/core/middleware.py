@@ -0,0 +1,83 @@
+# apps/core/middleware.py
+"""
+Serves collected static files (STATIC_ROOT) with the best precompressed
+variant the client accepts and long-lived cache headers; see
+apps/core/staticfiles.py for how the variants are built.
+
+Files with a content hash in their name are sent with
+`Cache-Control: public, max-age=31536000, immutable`, since a changed file
+gets a new name. Other files are revalidated with Last-Modified. Requests
+for files that are not in STATIC_ROOT pass through, so `runserver` keeps
+serving app static directories in development.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$') # name.<md5 prefix>.ext, as written by ManifestStaticFilesStorage
+ENCODINGS = (('br', '.br'), ('gzip', '.gz')) # In order of preference
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(header):
+    """Codings named in an Accept-Encoding header, minus those refused with q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '').lower() in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.root = os.path.normpath(str(settings.STATIC_ROOT)) if settings.STATIC_ROOT else None
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/') if settings.STATIC_URL else None
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 300) # For names without a hash
+
+    def __call__(self, request):
+        if self.root and self.prefix and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def _path(self, name):
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            return None # Path traversal
+        return path
+
+    def serve(self, request, name):
+        path = self._path(name)
+        if path is None or not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        hashed = bool(HASHED_NAME.search(name))
+        if not hashed and not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        content_type, _ = mimetypes.guess_type(path)
+        encoding, body_path = None, path
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.isfile(path + suffix):
+                encoding, body_path = coding, path + suffix
+                break
+
+        response = FileResponse(open(body_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = os.path.getsize(body_path)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = IMMUTABLE if hashed else f'public, max-age={self.max_age}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -0,0 +1,63 @@
+# apps/core/staticfiles.py
+"""
+Fingerprinted, precompressed static files.
+
+`python manage.py collectstatic` is the build step: with
+PrecompressedManifestStaticFilesStorage it copies every file to STATIC_ROOT
+under a content-hashed name (miniapp/js/main.3f2a9c1e07b4.js), rewrites
+{% static %} URLs to those names through staticfiles.json, and writes .gz
+and .br (when the optional `brotli` package is installed) variants of text
+assets next to them.
+
+PrecompressedStaticMiddleware (apps/core/middleware.py) serves the best
+variant the client accepts, with immutable cache headers for hashed names.
+"""
+import gzip
+import logging
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError: # Optional; gzip variants are still written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.html', '.htm', '.svg', '.json', '.map', '.txt', '.xml', '.ico')
+
+
+def compress_gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0) # mtime=0 keeps builds reproducible
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz/.br variants of compressible files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        min_size = getattr(settings, 'STATIC_PRECOMPRESS_MIN_SIZE', 256)
+        for name in sorted(set(self.hashed_files.values()) | set(self.hashed_files)):
+            if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                data = original.read()
+            if len(data) < min_size:
+                continue
+            for compress, suffix in ((compress_gzip, '.gz'), (compress_brotli if brotli else None, '.br')):
+                if compress is None:
+                    continue
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue # Not worth sending
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+                yield name + suffix, name + suffix, True
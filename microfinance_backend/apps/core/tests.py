@@ -1,3 +1,128 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .middleware import IMMUTABLE, PrecompressedStaticMiddleware, accepted_encodings
+
+PRECOMPRESSED_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "apps.core.staticfiles.PrecompressedManifestStaticFilesStorage"},
+}
+
+
+# --- collectstatic build (staticfiles.py) ---
+
+class CollectStaticTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.settings = override_settings(STATIC_ROOT=cls.static_root, STATICFILES_DIRS=[], STORAGES=PRECOMPRESSED_STORAGES)
+        cls.settings.enable()
+        cls.addClassCleanup(cls.settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+
+    def manifest(self):
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as manifest:
+            return json.load(manifest)['paths']
+
+    def test_files_get_content_hashed_names(self):
+        hashed = self.manifest()['miniapp/js/main.js']
+        self.assertRegex(hashed, r'^miniapp/js/main\.[0-9a-f]{12}\.js$')
+        self.assertTrue(os.path.isfile(os.path.join(self.static_root, hashed)))
+
+    def test_text_assets_get_a_gzip_variant(self):
+        hashed = os.path.join(self.static_root, self.manifest()['miniapp/js/main.js'])
+        with open(hashed, 'rb') as original, gzip.open(hashed + '.gz') as compressed:
+            self.assertEqual(compressed.read(), original.read())
+
+    def test_static_tag_points_at_the_hashed_name(self):
+        from django.templatetags.static import static
+
+        self.assertEqual(static('miniapp/js/main.js'), '/static/' + self.manifest()['miniapp/js/main.js'])
+
+    def test_debug_off_from_the_environment_selects_the_manifest_storage(self):
+        from django.conf import settings
+
+        script = (
+            "from microfinance_backend import settings; "
+            "print(settings.DEBUG, settings.STORAGES['staticfiles']['BACKEND'])"
+        )
+        env = {**os.environ, 'DJANGO_DEBUG': 'False'}
+        output = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), ['False', PRECOMPRESSED_STORAGES['staticfiles']['BACKEND']])
+
+    def test_only_compressible_files_get_variants(self):
+        from .staticfiles import COMPRESSIBLE_EXTENSIONS
+
+        variants = []
+        for dirpath, _, filenames in os.walk(self.static_root):
+            variants.extend(name[:-len('.gz')] for name in filenames if name.endswith('.gz'))
+        self.assertTrue(variants)
+        self.assertTrue(all(name.lower().endswith(COMPRESSIBLE_EXTENSIONS) for name in variants))
+
+
+# --- Serving precompressed files (middleware.py) ---
+
+class PrecompressedStaticMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        self.body = b'console.log("dashboard");\n' * 40
+        for name, data in (('app.0123456789ab.js', self.body), ('app.0123456789ab.js.gz', gzip.compress(self.body)),
+                           ('app.0123456789ab.js.br', b'brotli bytes'), ('robots.txt', b'User-agent: *\n')):
+            with open(os.path.join(self.static_root, name), 'wb') as static_file:
+                static_file.write(data)
+        settings = override_settings(STATIC_ROOT=self.static_root, STATIC_URL='/static/', STATIC_MAX_AGE=300)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse('from the app'))
+
+    def get(self, path, **headers):
+        response = self.middleware(RequestFactory().get(path, **headers))
+        if hasattr(response, 'streaming_content'):
+            self.addCleanup(response.close)
+        return response
+
+    def test_best_accepted_variant_is_served(self):
+        response = self.get('/static/app.0123456789ab.js', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        response = self.get('/static/app.0123456789ab.js', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_identity_when_nothing_is_accepted(self):
+        response = self.get('/static/app.0123456789ab.js')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(int(response['Content-Length']), len(self.body))
+
+    def test_hashed_names_are_immutable(self):
+        self.assertEqual(self.get('/static/app.0123456789ab.js')['Cache-Control'], IMMUTABLE)
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.get('/static/robots.txt')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        response = self.get('/static/robots.txt', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_files_and_traversal_fall_through(self):
+        self.assertEqual(self.get('/static/missing.js').content, b'from the app')
+        self.assertEqual(self.get('/static/../../etc/passwd').content, b'from the app')
+        self.assertEqual(self.get('/miniapp/').content, b'from the app')
+
+    def test_accept_encoding_parsing(self):
+        self.assertEqual(accepted_encodings('gzip;q=1.0, br; q=0, identity'), {'gzip', 'identity'})
+        self.assertEqual(accepted_encodings('BR'), {'br'})
@@ -5,4 +5,10 @@ from django.apps import AppConfig
 class MiniappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.miniapp' # This name must match how it's listed in INSTALLED_APPS (i.e., 'apps.miniapp')
-    verbose_name = "Mini App Integration"  # Optional: A human-readable name for the app, useful in the Django admin interface  
\ No newline at end of file
+    verbose_name = "Mini App Integration"  # Optional: A human-readable name for the app, useful in the Django admin interface  
+
+    def ready(self):
+        # Cached dashboards are dropped, and open Mini Apps notified, when the rows behind them change
+        from .signals import connect_dashboard_signals, connect_event_signals
+        connect_dashboard_signals()
+        connect_event_signals()
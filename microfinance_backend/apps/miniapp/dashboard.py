@@ -0,0 +1,156 @@
+# apps/miniapp/dashboard.py
+"""
+Read model behind the Mini App dashboard.
+
+build_dashboard() gathers everything the dashboard shows (share balance,
+commissions earned, token balance, pending deposits, KYC status, profile)
+in a single query: each figure is a correlated subquery on the CustomUser
+row, so adding one costs no extra round trip.
+
+get_dashboard() caches the result per user for
+TELEGRAM_MINIAPP_DASHBOARD_TTL seconds. The receivers in signals.py drop a
+user's entry whenever one of their SharePurchase, Commission, TokenBatch,
+Transaction or KYCProfile rows is saved or deleted, so an unchanged
+dashboard is served from one cache hit. Queryset.update(), raw SQL and
+other writes that send no signals show up once the TTL expires.
+
+Dropping an entry bumps the user's generation, and entries are stored
+under a generation-scoped key with cache.add(). A read that ran its query
+before a write committed, and stores after the invalidation, writes under
+the old generation's key, which no reader asks for any more.
+
+The ETag is a hash of the dashboard's content, stored next to it in the
+cache. A conditional GET for an unchanged dashboard is answered with 304
+from one cache read, without building or serializing anything, and a
+client can never get a 304 for content the server would not send it: the
+tag changes whenever a rebuild yields different figures, however they
+were written, and every process computes the same tag for the same data.
+"""
+import hashlib
+import json
+import logging
+import time
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.CustomUser.models import CustomUser
+from apps.payments.models import Transaction
+from apps.shares.models import Commission, SharePurchase
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'miniapp:dashboard:'
+DASHBOARD_SCHEMA = 1 # Bump when the dashboard's fields change, so clients drop old copies
+MONEY = DecimalField(max_digits=13, decimal_places=2)
+
+
+def _dashboard_cache():
+    return caches[getattr(settings, 'TELEGRAM_MINIAPP_DASHBOARD_CACHE_ALIAS', 'default')]
+
+def _generation_key(custom_user_id):
+    return f"{CACHE_KEY_PREFIX}gen:{custom_user_id}"
+
+def _generation(cache, custom_user_id):
+    """The user's current dashboard generation, started if the cache has none."""
+    key = _generation_key(custom_user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Clock-based start, so a generation evicted and started again never reuses an old one's key
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+def _cache_key(custom_user_id, generation):
+    return f"{CACHE_KEY_PREFIX}{custom_user_id}:{generation}"
+
+def _per_user_total(queryset, user_field, expression, output_field):
+    """Correlated subquery aggregating `queryset` rows that belong to the outer CustomUser."""
+    totals = (
+        queryset.filter(**{user_field: OuterRef('pk')})
+        .order_by().values(user_field)
+        .annotate(total=expression).values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=output_field), Value(0), output_field=output_field)
+
+def _token_balance():
+    if not apps.is_installed('apps.tokens'):
+        return Value(0, output_field=IntegerField()) # Token system not enabled
+    from apps.tokens.models import TokenBatch
+
+    active = TokenBatch.objects.filter(status='active', expires_at__gt=timezone.now())
+    return _per_user_total(active, 'owner', Sum('count'), IntegerField())
+
+def build_dashboard(custom_user_id):
+    """Reads the dashboard for one user in a single query. Returns None if the user does not exist."""
+    row = (
+        CustomUser.objects.filter(pk=custom_user_id)
+        .annotate(
+            share_total=_per_user_total(SharePurchase.objects.all(), 'user', Sum('amount'), MONEY),
+            commission_total=_per_user_total(Commission.objects.all(), 'receiver', Sum('amount'), MONEY),
+            pending_deposits=_per_user_total(Transaction.objects.filter(status='pending'), 'user', Count('id'), IntegerField()),
+            token_balance=_token_balance(),
+        )
+        .values(
+            'username', 'phone_number', 'telegram_profile__username', 'kyc_profile__status',
+            'share_total', 'commission_total', 'pending_deposits', 'token_balance',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return {
+        "username": row['username'],
+        "phone_number": row['phone_number'],
+        "telegram_username": row['telegram_profile__username'],
+        "share_balance": f"{Decimal(row['share_total']):.2f} ETB",
+        "commission_total": f"{Decimal(row['commission_total']):.2f} ETB",
+        "token_balance": row['token_balance'],
+        "pending_deposits": row['pending_deposits'],
+        "kyc_status": row['kyc_profile__status'] or 'NOT_SUBMITTED',
+    }
+
+def dashboard_etag_for(dashboard):
+    """Strong ETag derived from the dashboard's content."""
+    payload = json.dumps([DASHBOARD_SCHEMA, dashboard], sort_keys=True, default=str).encode('utf-8')
+    return f'"dash-{hashlib.sha256(payload).hexdigest()[:32]}"'
+
+def get_dashboard_entry(custom_user_id):
+    """Cached (dashboard, etag) for one user, or None if the user does not exist."""
+    cache = _dashboard_cache()
+    # Read before the query: an invalidation after it moves readers off this key
+    key = _cache_key(custom_user_id, _generation(cache, custom_user_id))
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+    dashboard = build_dashboard(custom_user_id)
+    if dashboard is None:
+        return None
+    entry = (dashboard, dashboard_etag_for(dashboard))
+    cache.add(key, entry, getattr(settings, 'TELEGRAM_MINIAPP_DASHBOARD_TTL', 300))
+    return entry
+
+def get_dashboard(custom_user_id):
+    """Cached build_dashboard()."""
+    entry = get_dashboard_entry(custom_user_id)
+    return entry[0] if entry is not None else None
+
+def dashboard_etag(custom_user_id):
+    entry = get_dashboard_entry(custom_user_id)
+    return entry[1] if entry is not None else None
+
+def invalidate_dashboards(custom_user_ids):
+    """Bumps the users' generations, so the next read rebuilds their dashboards."""
+    cache = _dashboard_cache()
+    for user_id in custom_user_ids:
+        if user_id is None:
+            continue
+        try:
+            cache.incr(_generation_key(user_id))
+        except ValueError:
+            cache.add(_generation_key(user_id), time.time_ns(), None) # None yet: any new one is past the old entries
@@ -0,0 +1,179 @@
+# apps/miniapp/events.py
+"""
+Server-push for the Mini App.
+
+Changes to a user's deposits, commissions and KYC profile are published as
+small events (see signals.py) and streamed to their open Mini App over
+Server-Sent Events (views.miniapp_api_events). The client refreshes only
+what an event says has changed, instead of polling.
+
+Two brokers fan events out to the streams:
+
+* 'memory' - in-process queues; enough when the web server is a single
+  process and the events are published from it.
+* 'redis'  - events are PUBLISHed on Redis so that any web process holding
+  the user's stream receives them, whichever process or Celery worker made
+  the change. Each web process keeps a single pattern subscription and
+  fans out to its local streams.
+
+Streams need the ASGI server (microfinance_backend/asgi.py, run by the
+Dockerfile under uvicorn workers): an open stream is an idle coroutine
+there, where under WSGI it would hold a worker thread. Deployments still
+on WSGI set TELEGRAM_MINIAPP_EVENTS_ENABLED = False and the Mini App polls
+the status endpoint with conditional GETs instead.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'miniapp:events:'
+
+
+class Subscription:
+    """One open stream's queue of events for a user."""
+
+    def __init__(self, broker, user_id, max_pending):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, event):
+        """Thread-safe: hands an event to the stream's event loop."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait() # A stalled client loses the oldest event, not the newest
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fans events out to the streams open in this process."""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self.subscriptions = {} # user_id -> set of Subscription
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Opens a subscription; must be called from the stream's event loop."""
+        subscription = Subscription(self, user_id, self.max_pending)
+        with self.lock:
+            self.subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.user_id]
+
+    def dispatch(self, user_id, event):
+        """Delivers an event to this process's streams for `user_id`."""
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def publish(self, user_id, event):
+        self.dispatch(user_id, event)
+
+    def close(self):
+        pass
+
+
+class RedisBroker(InProcessBroker):
+    """Publishes through Redis pub/sub so every web process sees every event."""
+
+    def __init__(self, url, max_pending=100):
+        import redis # Only needed for multi-process deployments
+
+        super().__init__(max_pending)
+        self.client = redis.Redis.from_url(url)
+        self.listener = None
+        self.pubsub = None
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def _ensure_listener(self):
+        if self.listener is not None:
+            return
+        with self.lock:
+            if self.listener is None:
+                self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                self.pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                self.listener = threading.Thread(target=self._listen, name='miniapp-events', daemon=True)
+                self.listener.start()
+
+    def _listen(self):
+        try:
+            for message in self.pubsub.listen():
+                try:
+                    user_id = int(message['channel'].decode().rsplit(':', 1)[1])
+                    self.dispatch(user_id, json.loads(message['data']))
+                except (ValueError, IndexError):
+                    logger.warning(f"Ignoring malformed Mini App event on {message.get('channel')!r}.")
+        except Exception:
+            logger.exception("Mini App event listener stopped; streams will not receive events until restart.")
+
+    def publish(self, user_id, event):
+        try:
+            self.client.publish(f'{CHANNEL_PREFIX}{user_id}', json.dumps(event, default=str))
+        except Exception:
+            # Pushing is best effort: the Mini App still shows fresh data on its next load
+            logger.exception(f"Could not publish Mini App event for user {user_id}.")
+
+    def close(self):
+        if self.pubsub is not None:
+            self.pubsub.close()
+        self.client.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_event_broker():
+    """Returns the process-wide broker selected by TELEGRAM_MINIAPP_EVENTS_BROKER."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                max_pending = getattr(settings, 'TELEGRAM_MINIAPP_EVENTS_MAX_PENDING', 100)
+                if getattr(settings, 'TELEGRAM_MINIAPP_EVENTS_BROKER', 'memory') == 'redis':
+                    _broker = RedisBroker(settings.TELEGRAM_MINIAPP_EVENTS_REDIS_URL, max_pending)
+                else:
+                    _broker = InProcessBroker(max_pending)
+    return _broker
+
+def close_event_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is not None:
+            _broker.close()
+        _broker = None
+
+def publish_event(custom_user_id, event_type, **data):
+    """Pushes an event to the user's open Mini App streams, if any."""
+    if custom_user_id is not None:
+        get_event_broker().publish(custom_user_id, dict(data, type=event_type))
+
+
+def format_sse(event):
+    """Encodes an event as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,142 @@
+# apps/miniapp/session.py
+"""
+Short-lived session tokens for the Mini App.
+
+The Mini App exchanges its initData once at /miniapp/api/session/ for a
+token signed with SECRET_KEY (django.core.signing) that carries the
+Telegram id, the linked CustomUser id and the user's role. API calls then
+send `Authorization: Bearer <token>` and are authenticated from the token
+alone: no initData parsing and no TelegramUser / CustomUser lookup.
+
+Tokens expire after TELEGRAM_MINIAPP_SESSION_TTL seconds; the Mini App
+fetches a new one with the same initData. Views decorated with
+@miniapp_auth still accept raw initData from clients that have no token.
+
+EventSource cannot send headers, so the event stream is opened with a
+separate stream token in the query string instead. It is signed with its
+own salt, so it is not accepted as a session token (nor the other way
+round), and it expires after TELEGRAM_MINIAPP_EVENTS_TOKEN_TTL seconds: a
+copy left in an access log cannot call the API and soon opens nothing.
+"""
+import functools
+import json
+import logging
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+
+from apps.telegram.init_data import validate_telegram_init_data
+from apps.telegram.models import TelegramUser
+
+logger = logging.getLogger(__name__)
+
+SESSION_SALT = 'apps.miniapp.session'
+STREAM_SALT = 'apps.miniapp.events'
+INIT_DATA_HEADER = 'microfinance_backend-Telegram-Init-Data'
+
+
+class MiniAppSession:
+    """Who is calling the Mini App API."""
+
+    __slots__ = ('telegram_id', 'custom_user_id', 'role')
+
+    def __init__(self, telegram_id, custom_user_id=None, role=None):
+        self.telegram_id = telegram_id
+        self.custom_user_id = custom_user_id
+        self.role = role
+
+    @property
+    def is_registered(self):
+        return self.custom_user_id is not None
+
+
+def session_ttl():
+    return getattr(settings, 'TELEGRAM_MINIAPP_SESSION_TTL', 900)
+
+def issue_session_token(session):
+    """Signs a session into a compact URL-safe token."""
+    return signing.dumps([session.telegram_id, session.custom_user_id, session.role], salt=SESSION_SALT, compress=True)
+
+def read_session_token(token):
+    """Returns the MiniAppSession in a token, or None if it is forged or expired."""
+    try:
+        telegram_id, custom_user_id, role = signing.loads(token, salt=SESSION_SALT, max_age=session_ttl())
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return MiniAppSession(telegram_id, custom_user_id, role)
+
+def stream_token_ttl():
+    return getattr(settings, 'TELEGRAM_MINIAPP_EVENTS_TOKEN_TTL', 60)
+
+def issue_stream_token(session):
+    """Signs a token that only opens the event stream of the session's user."""
+    return signing.dumps(session.custom_user_id, salt=STREAM_SALT)
+
+def read_stream_token(token):
+    """Returns the CustomUser id a stream token was issued for, or None if it is forged or expired."""
+    try:
+        custom_user_id = signing.loads(token, salt=STREAM_SALT, max_age=stream_token_ttl())
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return custom_user_id if isinstance(custom_user_id, int) else None
+
+def session_for_telegram_id(telegram_id):
+    """Builds a session from the database in one query; used when a token is issued."""
+    link = TelegramUser.objects.filter(user_id=telegram_id).values_list(
+        'linked_custom_user_id', 'linked_custom_user__role',
+    ).first()
+    return MiniAppSession(telegram_id, *(link or ()))
+
+
+def init_data_from_request(request):
+    """Raw initData from the custom header or the JSON body ('initData'), or None."""
+    init_data_raw = request.headers.get(INIT_DATA_HEADER)
+    if not init_data_raw:
+        try:
+            init_data_raw = json.loads(request.body.decode('utf-8')).get('initData')
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return None
+    return init_data_raw or None
+
+def session_from_init_data(request):
+    """Verifies the request's initData and returns (session, None) or (None, error_response)."""
+    init_data_raw = init_data_from_request(request)
+    if not init_data_raw:
+        return None, HttpResponseBadRequest("InitData is required.")
+    is_valid, validated_init_data = validate_telegram_init_data(init_data_raw, settings.TELEGRAM_BOT_TOKEN)
+    if not is_valid:
+        return None, HttpResponseForbidden("Unauthorized: Invalid Telegram InitData")
+    telegram_id = (validated_init_data.get('user_data') or {}).get('id')
+    if not telegram_id:
+        return None, JsonResponse({"error": "Telegram User ID missing from InitData."}, status=400)
+    return session_for_telegram_id(telegram_id), None
+
+def miniapp_auth(view):
+    """
+    Authenticates a Mini App API call from its session token, falling back
+    to initData for clients without one, and sets request.miniapp_session.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            session = read_session_token(authorization[len('Bearer '):].strip())
+            if session is None:
+                return JsonResponse({"error": "Session expired or invalid."}, status=401)
+        else:
+            session, error = session_from_init_data(request)
+            if error is not None:
+                return error
+        request.miniapp_session = session
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def session_response(session):
+    """JSON body handed to the Mini App with a fresh token."""
+    return {
+        "token": issue_session_token(session),
+        "expires_in": session_ttl(),
+        "is_registered": session.is_registered,
+    }
@@ -0,0 +1,74 @@
+# apps/miniapp/signals.py
+"""
+Keeps the cached Mini App dashboards (dashboard.py) in step with the rows
+they are built from, and pushes the changes users care about to their open
+Mini App (events.py). Connected in MiniappConfig.ready().
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .dashboard import invalidate_dashboards
+from .events import publish_event
+
+# model label -> attributes holding the ids of the users whose dashboard shows the row
+DASHBOARD_SOURCES = {
+    'CustomUser.CustomUser': ('pk',),
+    'telegram.TelegramUser': ('linked_custom_user_id',),
+    'shares.SharePurchase': ('user_id',),
+    'shares.Commission': ('receiver_id',),
+    'payments.Transaction': ('user_id',),
+    'kyc.KYCProfile': ('user_id',),
+    'tokens.TokenBatch': ('owner_id',),
+}
+
+
+def _invalidate_for(instance, attributes):
+    user_ids = [getattr(instance, attribute) for attribute in attributes]
+    # After commit, so a concurrent read cannot cache the old figures again
+    transaction.on_commit(lambda: invalidate_dashboards(user_ids))
+
+def connect_dashboard_signals():
+    for label, attributes in DASHBOARD_SOURCES.items():
+        app_label, model_name = label.split('.')
+        try:
+            model = apps.get_model(app_label, model_name)
+        except LookupError:
+            continue # App not installed (e.g. the token system)
+
+        def receiver(sender, instance, attributes=attributes, **kwargs):
+            _invalidate_for(instance, attributes)
+
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'miniapp_dashboard_save_{label}')
+        post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=f'miniapp_dashboard_delete_{label}')
+
+
+def _deposit_event(instance, created):
+    return instance.user_id, 'deposit', {'id': instance.pk, 'status': instance.status, 'amount': str(instance.amount)}
+
+def _commission_event(instance, created):
+    if not created:
+        return None
+    return instance.receiver_id, 'commission', {'id': instance.pk, 'amount': str(instance.amount), 'tier': instance.tier}
+
+def _kyc_event(instance, created):
+    return instance.user_id, 'kyc', {'status': instance.status}
+
+# model label -> function turning a saved row into (custom user id, event type, event data), or None
+PUSHED_EVENTS = {
+    'payments.Transaction': _deposit_event,
+    'shares.Commission': _commission_event,
+    'kyc.KYCProfile': _kyc_event,
+}
+
+def connect_event_signals():
+    for label, make_event in PUSHED_EVENTS.items():
+        model = apps.get_model(label)
+
+        def receiver(sender, instance, created, make_event=make_event, **kwargs):
+            event = make_event(instance, created)
+            if event is not None:
+                user_id, event_type, data = event
+                transaction.on_commit(lambda: publish_event(user_id, event_type, **data))
+
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'miniapp_event_{label}')
@@ -28,12 +28,75 @@ const phoneNumberInput = document.getElementById('phone-number-input');
 const referralCodeInput = document.getElementById('referral-code-input');
 const registerButton = document.getElementById('register-button');
 
+// Mini App session: initData is exchanged once for a short-lived token that
+// the API calls send instead (see apps/miniapp/session.py)
+let sessionToken = null;
+let sessionExpiresAt = 0;
+
+function storeSession(session) {
+    sessionToken = session.token;
+    sessionExpiresAt = Date.now() + (session.expires_in - 30) * 1000; // Renew a little early
+}
+
+async function getSessionToken() {
+    if (sessionToken && Date.now() < sessionExpiresAt) {
+        return sessionToken;
+    }
+    const response = await fetch(`${BACKEND_BASE_URL}/miniapp/api/session/`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'microfinance_backend-Telegram-Init-Data': window.Telegram.WebApp.initData,
+        },
+        body: JSON.stringify({}),
+    });
+    if (!response.ok) {
+        throw new Error(`Session request failed with ${response.status}: ${await response.text()}`);
+    }
+    storeSession(await response.json());
+    return sessionToken;
+}
+
+// Last status response and its ETag: unchanged dashboards come back as 304 with no body
+let lastStatusEtag = null;
+let lastStatusData = null;
+
+/**
+ * GETs the status endpoint conditionally; returns the fresh or the previously received data.
+ */
+async function getStatus() {
+    const send = async () => {
+        const headers = { 'Authorization': `Bearer ${await getSessionToken()}` };
+        if (lastStatusEtag) headers['If-None-Match'] = lastStatusEtag;
+        return fetch(`${BACKEND_BASE_URL}/miniapp/api/status/`, { method: 'GET', headers: headers, cache: 'no-store' });
+    };
+    let response = await send();
+    if (response.status === 401) {
+        sessionToken = null;
+        response = await send();
+    }
+    if (response.status === 304 && lastStatusData) {
+        return lastStatusData;
+    }
+    if (!response.ok) {
+        const errorText = await response.text(); // Read as plain text
+        console.error(`HTTP error! Status: ${response.status}`, errorText);
+        throw new Error(`Server responded with ${response.status}: ${errorText}`);
+    }
+    lastStatusData = await response.json();
+    lastStatusEtag = response.headers.get('ETag');
+    return lastStatusData;
+}
+
 // Dashboard Elements
 const dashboardUsername = document.getElementById('dashboard-username');
 const dashboardPhoneNumber = document.getElementById('dashboard-phone-number');
 const dashboardTelegramUsername = document.getElementById('dashboard-telegram-username');
 const dashboardShareBalance = document.getElementById('dashboard-share-balance');
-const dashboardReferralCount = document.getElementById('dashboard-referral-count');
+const dashboardCommissionTotal = document.getElementById('dashboard-commission-total');
+const dashboardTokenBalance = document.getElementById('dashboard-token-balance');
+const dashboardPendingDeposits = document.getElementById('dashboard-pending-deposits');
+const dashboardKycStatus = document.getElementById('dashboard-kyc-status');
 const response = await fetch("https://e7d8-102-218-50-67.ngrok-free.app/miniapp/api/register/", {
   method: "POST",
   headers: {
@@ -113,38 +176,16 @@ async function fetchUserStatus() {
     
     displayMessage(null); // Clear previous messages
 
-    const initData = window.Telegram.WebApp.initData;
-    console.log("Fetching status with InitData:", initData);
-
     try {
         console.log(`Attempting to fetch from backend URL: ${BACKEND_BASE_URL}/miniapp/api/status/`); // <<< ADDED LOG
-        const response = await fetch(`${BACKEND_BASE_URL}/miniapp/api/status/`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'microfinance_backend-Telegram-Init-Data': initData, 
-            },
-            body: JSON.stringify({ initData: initData }) 
-        });
-
-        if (!response.ok) {
-            const errorText = await response.text(); // Read as plain text
-            console.error(`HTTP error! Status: ${response.status}`, errorText);
-            throw new Error(`Server responded with ${response.status}: ${errorText}`);
-        }
-
-        const data = await response.json(); // Try to parse as JSON only if response.ok is true
+        const data = await getStatus();
         console.log("User Status Response:", data);
 
         if (data.is_registered) {
             // User is registered, show dashboard
-            if (dashboardUsername) dashboardUsername.textContent = data.username || 'N/A';
-            if (dashboardPhoneNumber) dashboardPhoneNumber.textContent = data.phone_number || 'N/A';
-            if (dashboardTelegramUsername) dashboardTelegramUsername.textContent = data.telegram_username || 'N/A';
-            if (dashboardShareBalance) dashboardShareBalance.textContent = data.share_balance || '0.00 ETB';
-            if (dashboardReferralCount) dashboardReferralCount.textContent = data.referral_count !== undefined ? data.referral_count : '0';
-            
+            renderDashboard(data);
             showView(dashboardView);
+            subscribeToUpdates();
             window.Telegram.WebApp.ready(); // Signal WebApp is ready and fully loaded
             window.Telegram.WebApp.expand(); // Expand mini app to full height
         } else {
@@ -164,6 +205,120 @@ async function fetchUserStatus() {
     }
 }
 
+// Human-readable KYC states; kyc_status is NOT_SUBMITTED until a KYC profile exists
+const KYC_STATUS_LABELS = {
+    NOT_SUBMITTED: 'Not submitted',
+    PENDING: 'Pending review',
+    APPROVED: 'Approved',
+    REJECTED: 'Rejected',
+};
+
+/**
+ * Fills the dashboard from the status payload (see build_dashboard() in apps/miniapp/dashboard.py).
+ */
+function renderDashboard(data) {
+    if (dashboardUsername) dashboardUsername.textContent = data.username || 'N/A';
+    if (dashboardPhoneNumber) dashboardPhoneNumber.textContent = data.phone_number || 'N/A';
+    if (dashboardTelegramUsername) dashboardTelegramUsername.textContent = data.telegram_username || 'N/A';
+    if (dashboardShareBalance) dashboardShareBalance.textContent = data.share_balance || '0.00 ETB';
+    if (dashboardCommissionTotal) dashboardCommissionTotal.textContent = data.commission_total || '0.00 ETB';
+    if (dashboardTokenBalance) dashboardTokenBalance.textContent = data.token_balance ?? 0;
+    if (dashboardPendingDeposits) dashboardPendingDeposits.textContent = data.pending_deposits ?? 0;
+    if (dashboardKycStatus) dashboardKycStatus.textContent = KYC_STATUS_LABELS[data.kyc_status] || data.kyc_status || 'N/A';
+}
+
+// Server-pushed updates (deposit, commission, kyc) replace polling; see apps/miniapp/events.py.
+// Servers without event streams answer the token request with 404 and the dashboard is polled instead.
+const EVENTS_RETRY_BASE_MS = 2000;
+const EVENTS_RETRY_MAX_MS = 60000;
+const STATUS_POLL_INTERVAL_MS = 30000;
+let updatesSource = null;
+let updatesRetries = 0;
+let statusPollTimer = null;
+
+async function refreshDashboard() {
+    try {
+        renderDashboard(await getStatus()); // Conditional GET, so only changed dashboards are downloaded
+    } catch (error) {
+        console.error("Error refreshing dashboard:", error);
+    }
+}
+
+/**
+ * Fetches a short-lived token that only opens the event stream; it goes in the
+ * stream URL, so it must not be the session token. Returns null when streams are disabled.
+ */
+async function getStreamToken() {
+    const send = async () => fetch(`${BACKEND_BASE_URL}/miniapp/api/events/token/`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${await getSessionToken()}` },
+    });
+    let response = await send();
+    if (response.status === 401) {
+        sessionToken = null;
+        response = await send();
+    }
+    if (response.status === 404) {
+        return null;
+    }
+    if (!response.ok) {
+        throw new Error(`Stream token request failed with ${response.status}`);
+    }
+    return (await response.json()).token;
+}
+
+function pollForUpdates() {
+    if (!statusPollTimer) {
+        statusPollTimer = setInterval(refreshDashboard, STATUS_POLL_INTERVAL_MS);
+    }
+}
+
+// Exponential backoff with jitter, so clients cut off together do not all reconnect together
+function reconnectDelay(attempt) {
+    const ceiling = Math.min(EVENTS_RETRY_MAX_MS, EVENTS_RETRY_BASE_MS * 2 ** attempt);
+    return ceiling / 2 + Math.random() * ceiling / 2;
+}
+
+function scheduleReconnect() {
+    setTimeout(subscribeToUpdates, reconnectDelay(updatesRetries));
+    updatesRetries += 1;
+}
+
+async function subscribeToUpdates() {
+    if (updatesSource) return;
+    if (!window.EventSource) {
+        pollForUpdates();
+        return;
+    }
+    let token;
+    try {
+        token = await getStreamToken();
+    } catch (error) {
+        console.error("Error opening the update stream:", error);
+        scheduleReconnect();
+        return;
+    }
+    if (!token) {
+        pollForUpdates();
+        return;
+    }
+    updatesSource = new EventSource(`${BACKEND_BASE_URL}/miniapp/api/events/?token=${encodeURIComponent(token)}`);
+    updatesSource.onopen = () => {
+        if (updatesRetries > 0) refreshDashboard(); // Catch up on anything pushed while disconnected
+        updatesRetries = 0;
+    };
+    ['deposit', 'commission', 'kyc'].forEach((type) => updatesSource.addEventListener(type, (event) => {
+        console.log("Dashboard update pushed:", event.type, event.data);
+        refreshDashboard();
+    }));
+    updatesSource.onerror = () => {
+        // Stream tokens are short-lived: reopen with a fresh one instead of letting EventSource retry it
+        updatesSource.close();
+        updatesSource = null;
+        scheduleReconnect();
+    };
+}
+
 /**
  * Handles the user registration process.
  */
@@ -218,6 +373,7 @@ async function registerUser() {
         console.log("Registration Response:", data);
 
         if (data.success) {
+            if (data.session) storeSession(data.session); // Carries the new account link
             displayMessage('success', data.message);
             // After successful registration, re-fetch status to show dashboard
             await fetchUserStatus(); 
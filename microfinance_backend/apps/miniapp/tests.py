@@ -1,3 +1,286 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.CustomUser.models import CustomUser
+from apps.telegram.models import TelegramUser
+from apps.telegram.tests import sign_init_data
+
+BOT_TOKEN = '123:TOKEN'
+
+
+@override_settings(TELEGRAM_BOT_TOKEN=BOT_TOKEN)
+class MiniAppTestCase(TestCase):
+    def setUp(self):
+        cache.clear() # Dashboards and their versions are cached
+
+    def link(self, telegram_id=5, username='abebe'):
+        custom_user = CustomUser.objects.create_user(username, str(telegram_id), f'09110000{telegram_id:02d}')
+        TelegramUser.objects.create(user_id=telegram_id, first_name='Abebe', linked_custom_user=custom_user)
+        return custom_user
+
+    def init_data(self, telegram_id=5):
+        return sign_init_data(BOT_TOKEN, user={'id': telegram_id, 'first_name': 'Abebe'})
+
+    def token(self, telegram_id=5):
+        response = self.client.post('/miniapp/api/session/', data=json.dumps({'initData': self.init_data(telegram_id)}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['token']
+
+
+# --- Session tokens (session.py) ---
+
+class SessionTokenTests(MiniAppTestCase):
+    def test_token_round_trip(self):
+        from .session import MiniAppSession, issue_session_token, read_session_token
+
+        session = read_session_token(issue_session_token(MiniAppSession(5, 42, 'CUSTOMER')))
+        self.assertEqual((session.telegram_id, session.custom_user_id, session.role), (5, 42, 'CUSTOMER'))
+        self.assertTrue(session.is_registered)
+
+    def test_forged_and_expired_tokens_are_refused(self):
+        import time
+        from .session import MiniAppSession, issue_session_token, read_session_token
+
+        token = issue_session_token(MiniAppSession(5, 42, 'CUSTOMER'))
+        self.assertIsNone(read_session_token(token[:-2] + 'xx'))
+        self.assertIsNone(read_session_token('not a token'))
+        with override_settings(TELEGRAM_MINIAPP_SESSION_TTL=60), \
+                mock.patch('django.core.signing.time.time', return_value=time.time() + 120):
+            self.assertIsNone(read_session_token(token))
+
+    def test_session_endpoint_carries_the_account_link(self):
+        from .session import read_session_token
+
+        custom_user = self.link()
+        response = self.client.post('/miniapp/api/session/', HTTP_MICROFINANCE_BACKEND_TELEGRAM_INIT_DATA=self.init_data())
+        body = response.json()
+        self.assertTrue(body['is_registered'])
+        self.assertEqual(body['expires_in'], 900)
+        session = read_session_token(body['token'])
+        self.assertEqual((session.telegram_id, session.custom_user_id, session.role), (5, custom_user.pk, custom_user.role))
+
+    def test_session_endpoint_needs_valid_init_data(self):
+        self.assertEqual(self.client.post('/miniapp/api/session/', data='{}', content_type='application/json').status_code, 400)
+        forged = sign_init_data('999:OTHER', user={'id': 5})
+        with self.assertLogs('apps.telegram.init_data', 'WARNING'):
+            response = self.client.post('/miniapp/api/session/', data=json.dumps({'initData': forged}), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bearer_token_skips_init_data_and_the_database(self):
+        token = self.token(telegram_id=7) # Not linked
+        with self.assertNumQueries(0):
+            response = self.client.get('/miniapp/api/status/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.json(), {'is_registered': False})
+
+    def test_invalid_bearer_token_is_401(self):
+        response = self.client.get('/miniapp/api/status/', HTTP_AUTHORIZATION='Bearer nope')
+        self.assertEqual(response.status_code, 401)
+
+    def test_init_data_still_works_without_a_token(self):
+        self.link()
+        response = self.client.post('/miniapp/api/status/', data=json.dumps({'initData': self.init_data()}), content_type='application/json')
+        self.assertTrue(response.json()['is_registered'])
+
+
+# --- Dashboard read model (dashboard.py) ---
+
+class DashboardTests(MiniAppTestCase):
+    def purchase(self, user, amount, reference):
+        from apps.payments.models import Transaction
+        from apps.shares.models import SharePurchase
+
+        transaction = Transaction.objects.create(user=user, amount=amount, method='telebirr', reference=reference, status='approved')
+        return SharePurchase.objects.create(user=user, amount=amount, transaction=transaction)
+
+    def test_dashboard_is_read_in_one_query(self):
+        from apps.kyc.models import KYCProfile
+        from apps.payments.models import Transaction
+        from apps.shares.models import Commission
+        from .dashboard import build_dashboard
+
+        custom_user = self.link()
+        referred = CustomUser.objects.create_user('kebede', '6', '0911000006')
+        self.purchase(custom_user, '150.00', 'ref-1')
+        self.purchase(custom_user, '50.50', 'ref-2')
+        purchase = self.purchase(referred, '100.00', 'ref-3')
+        Commission.objects.create(payer=referred, receiver=custom_user, share_purchase=purchase, amount='10.00', tier=1)
+        Transaction.objects.create(user=custom_user, amount='20.00', method='cbe', reference='ref-4')
+        KYCProfile.objects.create(user=custom_user, national_id_number='ET-1', id_document='')
+
+        with self.assertNumQueries(1):
+            dashboard = build_dashboard(custom_user.pk)
+        self.assertEqual(dashboard, {
+            'username': 'abebe',
+            'phone_number': custom_user.phone_number,
+            'telegram_username': None,
+            'share_balance': '200.50 ETB',
+            'commission_total': '10.00 ETB',
+            'token_balance': 0,
+            'pending_deposits': 1,
+            'kyc_status': 'PENDING',
+        })
+
+    def test_new_user_has_empty_figures(self):
+        from .dashboard import build_dashboard
+
+        dashboard = build_dashboard(self.link().pk)
+        self.assertEqual((dashboard['share_balance'], dashboard['commission_total']), ('0.00 ETB', '0.00 ETB'))
+        self.assertEqual((dashboard['pending_deposits'], dashboard['kyc_status']), (0, 'NOT_SUBMITTED'))
+        self.assertIsNone(build_dashboard(10 ** 6))
+
+    def test_status_returns_the_dashboard(self):
+        custom_user = self.link()
+        self.purchase(custom_user, '75.00', 'ref-1')
+        response = self.client.get('/miniapp/api/status/', HTTP_AUTHORIZATION=f'Bearer {self.token()}')
+        body = response.json()
+        self.assertTrue(body['is_registered'])
+        self.assertEqual(body['share_balance'], '75.00 ETB')
+        self.assertNotIn('referral_count', body)
+
+
+# --- Conditional dashboard requests (dashboard.py, views.py) ---
+
+class DashboardETagTests(MiniAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.custom_user = self.link()
+        self.bearer = f'Bearer {self.token()}'
+
+    def status(self, etag=None, method='get'):
+        headers = {'HTTP_AUTHORIZATION': self.bearer}
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return getattr(self.client, method)('/miniapp/api/status/', **headers)
+
+    def test_unchanged_dashboard_is_304_from_the_cache(self):
+        etag = self.status()['ETag']
+        with self.assertNumQueries(0):
+            response = self.status(etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_saved_row_changes_the_etag_at_once(self):
+        from apps.kyc.models import KYCProfile
+
+        etag = self.status()['ETag']
+        with self.captureOnCommitCallbacks(execute=True): # Dashboards are dropped after commit
+            KYCProfile.objects.create(user=self.custom_user, national_id_number='ET-1', id_document='')
+        response = self.status(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['kyc_status'], 'PENDING')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_update_changes_the_etag_once_the_cached_dashboard_expires(self):
+        import time
+
+        etag = self.status()['ETag']
+        CustomUser.objects.filter(pk=self.custom_user.pk).update(username='abebe_k') # No signals
+        self.assertEqual(self.status(etag).status_code, 304) # Still the cached dashboard
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 301):
+            response = self.status(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'abebe_k')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_only_on_the_content(self):
+        etag = self.status()['ETag']
+        cache.clear() # Another process, or a restart, rebuilds the same dashboard
+        self.assertEqual(self.status(etag).status_code, 304)
+
+    def test_invalidation_between_build_and_store_is_not_lost(self):
+        from . import dashboard
+        from apps.kyc.models import KYCProfile
+
+        build = dashboard.build_dashboard
+
+        def build_then_write(custom_user_id):
+            # The read's query ran first; the write commits before it stores the old figures
+            built = build(custom_user_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                KYCProfile.objects.create(user=self.custom_user, national_id_number='ET-1', id_document='')
+            return built
+
+        with mock.patch.object(dashboard, 'build_dashboard', side_effect=build_then_write):
+            self.assertEqual(dashboard.get_dashboard(self.custom_user.pk)['kyc_status'], 'NOT_SUBMITTED')
+        self.assertEqual(dashboard.get_dashboard(self.custom_user.pk)['kyc_status'], 'PENDING')
+
+    def test_post_is_never_conditional(self):
+        etag = self.status()['ETag']
+        response = self.status(etag, method='post')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_registered'])
+        response = self.status('"something-else"', method='post')
+        self.assertEqual(response.status_code, 200)
+
+
+# --- Server-pushed updates (events.py, views.py) ---
+
+class EventStreamTests(MiniAppTestCase):
+    def setUp(self):
+        from .events import close_event_broker
+
+        super().setUp()
+        self.addCleanup(close_event_broker) # Fresh in-process broker per test
+        self.custom_user = self.link()
+        self.bearer = f'Bearer {self.token()}'
+
+    def stream_token(self):
+        response = self.client.post('/miniapp/api/events/token/', HTTP_AUTHORIZATION=self.bearer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['expires_in'], 60)
+        return response.json()['token']
+
+    def test_stream_token_and_session_token_are_not_interchangeable(self):
+        from .session import read_session_token, read_stream_token
+
+        stream_token = self.stream_token()
+        self.assertEqual(read_stream_token(stream_token), self.custom_user.pk)
+        self.assertIsNone(read_session_token(stream_token))
+        self.assertIsNone(read_stream_token(self.bearer[len('Bearer '):]))
+        response = self.client.get('/miniapp/api/status/', HTTP_AUTHORIZATION=f'Bearer {stream_token}')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/miniapp/api/events/', {'token': self.bearer[len('Bearer '):]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_token_expires_quickly(self):
+        import time
+        from .session import read_stream_token
+
+        stream_token = self.stream_token()
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            self.assertIsNone(read_stream_token(stream_token))
+
+    def test_unregistered_users_get_no_stream(self):
+        response = self.client.post('/miniapp/api/events/token/', HTTP_AUTHORIZATION=f'Bearer {self.token(telegram_id=7)}')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(TELEGRAM_MINIAPP_EVENTS_ENABLED=False)
+    def test_disabled_streams_send_the_client_to_polling(self):
+        from .session import MiniAppSession, issue_stream_token
+
+        response = self.client.post('/miniapp/api/events/token/', HTTP_AUTHORIZATION=self.bearer)
+        self.assertEqual(response.status_code, 404)
+        token = issue_stream_token(MiniAppSession(5, self.custom_user.pk))
+        self.assertEqual(self.client.get('/miniapp/api/events/', {'token': token}).status_code, 204)
+
+    def test_published_event_reaches_the_open_stream(self):
+        from asgiref.sync import async_to_sync
+        from .events import publish_event
+
+        token = self.stream_token()
+
+        async def read_first_event():
+            response = await self.async_client.get('/miniapp/api/events/', {'token': token})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response.streaming_content)
+            self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+            publish_event(self.custom_user.pk, 'kyc', status='APPROVED')
+            event = await anext(chunks)
+            await chunks.aclose()
+            return event
+
+        event = async_to_sync(read_first_event)()
+        self.assertTrue(event.startswith(b'event: kyc\n'))
+        self.assertIn(b'"status": "APPROVED"', event)
@@ -9,8 +9,17 @@ urlpatterns = [
     # API endpoint for Mini App registration (e.g., yourdomain.com/miniapp/api/register/)
     path('api/register/', views.miniapp_api_register, name='miniapp_api_register'),
 
+    # Exchanges initData for a short-lived session token (e.g. yourdomain.com/miniapp/api/session/)
+    path('api/session/', views.miniapp_api_session, name='miniapp_api_session'),
+
     # API endpoint for Mini App status/dashboard data (e.g., yourdomain.com/miniapp/api/status/)
     path('api/status/', views.miniapp_api_status, name='miniapp_api_status'), # Corrected typo here
 
+    # Short-lived token that opens the event stream (e.g. yourdomain.com/miniapp/api/events/token/)
+    path('api/events/token/', views.miniapp_api_events_token, name='miniapp_api_events_token'),
+
+    # Server-Sent Events stream of dashboard changes (e.g. yourdomain.com/miniapp/api/events/?token=...)
+    path('api/events/', views.miniapp_api_events, name='miniapp_api_events'),
+
     # Add more API endpoints here as your Mini App grows (e.g., /api/shares/buy, /api/kyc/submit)
 ]
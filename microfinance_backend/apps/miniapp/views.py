@@ -1,118 +1,39 @@
 # apps/miniapp/views.py
+import asyncio
 import json
 import logging
-import hmac
-import hashlib
-from urllib.parse import parse_qs, unquote
 
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, conditional_page, require_http_methods
 from django.conf import settings
 from django.db import transaction
 
 from apps.CustomUser.models import CustomUser
+from apps.telegram.init_data import validate_telegram_init_data
 from apps.telegram.models import TelegramUser # Assuming TelegramUser model is in apps.telegram
+from apps.telegram.user_cache import upsert_telegram_user
 
-logger = logging.getLogger(__name__)
-
-def validate_telegram_init_data(init_data_raw: str, bot_token: str) -> tuple[bool, dict | None]:
-    """
-    Validates Telegram WebApp initData using HMAC-SHA256.
-    Returns (is_valid, parsed_data_dict)
-    """
-    logger.info(f"--- validate_telegram_init_data START ---")
-    logger.info(f"Raw InitData received by validator (first 200 chars): {init_data_raw[:200]}...")
-    # For debugging, showing part of the token is useful. In production, avoid logging full tokens.
-    logger.info(f"Using bot_token for validation (first 10 chars): {bot_token[:10]}...") 
-
-    if not init_data_raw:
-        logger.warning("InitData validation failed: init_data_raw is empty.")
-        return False, None
-
-    # parse_qs returns a dictionary where values are lists (even for single values).
-    # We convert them to single strings here.
-    parsed_params_lists = parse_qs(init_data_raw)
-    parsed_params = {k: v[0] for k, v in parsed_params_lists.items()}
-
-    if 'hash' not in parsed_params:
-        logger.warning("InitData validation failed: 'hash' parameter missing.")
-        return False, None
-
-    received_hash = parsed_params.pop('hash') # Remove hash from params for validation
-
-    # Collect parameters for hash calculation, excluding 'hash' itself and 'query_id'
-    # Parameters must be sorted alphabetically by key
-    data_check_string_parts = []
-    for key in sorted(parsed_params.keys()):
-        # Values from parse_qs are already URL-decoded.
-        # No need to call unquote again here.
-        data_check_string_parts.append(f"{key}={parsed_params[key]}") 
-    
-    data_check_string = "\n".join(data_check_string_parts)
-
-    logger.info(f"Backend constructed data_check_string: '{data_check_string}'")
-    logger.info(f"Backend received hash from client: {received_hash}")
-
-    # --- CRITICAL CORRECTION: Secret Key Derivation ---
-    # The secret_key is HMAC-SHA256 of "WebAppData" using the bot_token as the key.
-    try:
-        secret_key = hmac.new(
-            key="WebAppData".encode('utf-8'),
-            msg=bot_token.encode('utf-8'),
-            digestmod=hashlib.sha256
-        ).digest()
-        logger.info("Secret key derived successfully.")
-    except Exception as e:
-        logger.error(f"Error deriving secret key: {e}")
-        return False, None
-
-    # Calculate HMAC-SHA256 hash of the data_check_string using the derived secret_key
-    calculated_hash = hmac.new(
-        key=secret_key, # Use the correctly derived secret_key (bytes)
-        msg=data_check_string.encode('utf-8'), # The string to hash
-        digestmod=hashlib.sha256
-    ).hexdigest() # Convert to hexadecimal string for comparison
-
-    logger.info(f"Backend calculated hash: {calculated_hash}")
-
-    if calculated_hash == received_hash:
-        logger.info("Telegram InitData validated successfully. Hashes Match!")
-        
-        # Prepare the data to return
-        validated_data_for_return = parsed_params.copy() 
-
-        # Parse 'user' field if present and valid JSON
-        if 'user' in validated_data_for_return:
-            try:
-                # The 'user' value is a JSON string which needs to be parsed into a Python dict.
-                user_data = json.loads(validated_data_for_return['user'])
-                validated_data_for_return['user_data'] = user_data 
-                # Optionally remove the original 'user' string key after parsing to avoid redundancy
-                # del validated_data_for_return['user'] 
-                logger.info(f"Successfully parsed 'user' data: {user_data.get('id')}")
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse 'user' data from initData as JSON: {validated_data_for_return['user']}")
-                validated_data_for_return['user_data'] = None # Explicitly set to None on error
-        else:
-            validated_data_for_return['user_data'] = None # Ensure user_data is always present as None if no 'user' field
-
-        logger.info(f"Validated InitData user ID: {validated_data_for_return.get('user_data', {}).get('id', 'N/A')}")
-        logger.info(f"--- validate_telegram_init_data END (Valid) ---")
-        return True, validated_data_for_return
-    else:
-        logger.warning(f"InitData validation failed: Hashes do not match. Calculated: {calculated_hash}, Received: {received_hash}")
-        logger.warning(f"Check string used for calculation: '{data_check_string}'")
-        logger.warning(f"--- validate_telegram_init_data END (Invalid) ---")
-        return False, None
+from .dashboard import get_dashboard_entry
+from .events import format_sse, get_event_broker
+from .session import (
+    MiniAppSession, issue_stream_token, miniapp_auth, read_stream_token, session_from_init_data, session_response,
+    stream_token_ttl,
+)
 
+logger = logging.getLogger(__name__)
 
 # --- Django Views ---
 
+@gzip_page
+@conditional_page
 def miniapp_view(request):
     """
     Serves the main HTML file for the Telegram Mini App.
+    Script URLs come from {% static %}, so each deploy's page points at that deploy's assets.
     """
     return render(request, 'miniapp/index.html')
 
@@ -196,7 +117,7 @@ def miniapp_api_register(request):
                 # If user already exists, ensure their telegram_id is linked
                 if not custom_user.telegram_id:
                     custom_user.telegram_id = telegram_id_from_body
-                    custom_user.save()
+                    custom_user.save(update_fields=['telegram_id'])
                 logger.info(f"Existing CustomUser {custom_user.id} linked/updated with Telegram ID {telegram_id_from_body}")
             
             message = "Registration successful! Your account is linked." # Default success message
@@ -217,9 +138,10 @@ def miniapp_api_register(request):
                     message = "Registration successful! Your account is linked, but referral code was invalid."
             
             # Ensure TelegramUser exists and is linked to the CustomUser
-            telegram_user, telegram_user_created = TelegramUser.objects.update_or_create(
-                user_id=telegram_id_from_body, # Telegram's user ID as the identifier
-                defaults={
+            # Skips the write when the profile and link are unchanged (see apps/telegram/user_cache.py)
+            telegram_user, telegram_user_created = upsert_telegram_user(
+                telegram_id_from_body, # Telegram's user ID as the identifier
+                {
                     'first_name': validated_init_data.get('user_data', {}).get('first_name'),
                     'last_name': validated_init_data.get('user_data', {}).get('last_name'),
                     'username': validated_init_data.get('user_data', {}).get('username'),
@@ -237,6 +159,8 @@ def miniapp_api_register(request):
                 "custom_user_id": custom_user.id,
                 "telegram_user_id": telegram_user.user_id, 
                 "created": custom_user_created, # True if new CustomUser was created
+                # The account link just changed, so hand out a session that carries it
+                "session": session_response(MiniAppSession(telegram_user.user_id, custom_user.id, custom_user.role)),
             })
                 
     except json.JSONDecodeError:
@@ -249,82 +173,112 @@ def miniapp_api_register(request):
 
 @csrf_exempt # API endpoint for Mini App, needs csrf_exempt for external calls
 @require_http_methods(["POST"])
-def miniapp_api_status(request):
+def miniapp_api_session(request):
     """
-    Provides the registration status and dashboard data for the Mini App.
+    Exchanges verified initData for a short-lived session token that the
+    other Mini App API calls accept instead of initData (see session.py).
     """
-    logger.info("--- miniapp_api_status START ---")
-    
-    # Assuming InitData is sent in the 'X-Telegram-Init-Data' header
-    init_data_raw = request.headers.get('microfinance_backend-Telegram-Init-Data')
-
-    # Fallback: if not in header, check if it's sent in JSON body (common for POST requests)
-    if not init_data_raw:
-        try:
-            data_from_body = json.loads(request.body.decode('utf-8'))
-            init_data_raw = data_from_body.get('initData')
-            logger.info("InitData found in request body for status endpoint.")
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON payload or no InitData in body for status endpoint.")
-            return HttpResponseBadRequest("Invalid JSON payload or InitData missing.")
-    
-    if not init_data_raw:
-        logger.warning("No InitData received for status check.")
-        return HttpResponseBadRequest("InitData is required.")
-
-    # Ensure bot token is available
-    if not settings.TELEGRAM_BOT_TOKEN:
-        logger.error("TELEGRAM_BOT_TOKEN is not configured in Django settings.")
-        return JsonResponse({"error": "Server configuration error"}, status=500)
+    session, error = session_from_init_data(request)
+    if error is not None:
+        return error
+    return JsonResponse(session_response(session))
 
-    is_valid, validated_init_data = validate_telegram_init_data(init_data_raw, settings.TELEGRAM_BOT_TOKEN)
 
-    if not is_valid:
-        logger.warning(f"Status check attempt with invalid Telegram InitData. Validation result: {is_valid}")
-        return HttpResponseForbidden("Unauthorized: Invalid Telegram InitData")
+def _status_etag(request, *args, **kwargs):
+    session = request.miniapp_session
+    # Only GET/HEAD are conditional: a POST carrying If-None-Match must not be answered with 412
+    if request.method not in ('GET', 'HEAD') or not session.is_registered:
+        return None
+    # The view sends the same entry, so the ETag always matches the body it goes out with
+    request.miniapp_dashboard = get_dashboard_entry(session.custom_user_id)
+    return request.miniapp_dashboard[1] if request.miniapp_dashboard is not None else None
 
-    telegram_id_from_init_data = validated_init_data.get('user_data', {}).get('id')
+@csrf_exempt # API endpoint for Mini App, needs csrf_exempt for external calls
+@require_http_methods(["GET", "POST"])
+@miniapp_auth
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_status_etag)
+def miniapp_api_status(request):
+    """
+    Provides the registration status and dashboard data for the Mini App.
+    GET with If-None-Match is answered with 304 while the dashboard is unchanged;
+    POST (initData in the body) is never conditional.
+    """
+    session = request.miniapp_session
 
-    if not telegram_id_from_init_data:
-        logger.warning("Telegram User ID not found in validated InitData for status check.")
-        return JsonResponse({"error": "Telegram User ID missing from InitData."}, status=400)
+    # The session says whether the Telegram user is linked, so unregistered users cost no query
+    if not session.is_registered:
+        logger.debug(f"Telegram user {session.telegram_id} is not linked to a CustomUser.")
+        return JsonResponse({"is_registered": False})
 
     try:
-        telegram_user = TelegramUser.objects.get(user_id=telegram_id_from_init_data)
-        
-        # Check if linked to CustomUser
-        if telegram_user.linked_custom_user:
-            custom_user = telegram_user.linked_custom_user
-            logger.info(f"CustomUser {custom_user.id} found for Telegram ID {telegram_id_from_init_data}.")
-            
-            # --- Fetch dashboard data ---
-            # Implement actual logic to fetch real share balance, referral count, KYC status etc.
-            # Example placeholders:
-            share_balance = "0.00 ETB" 
-            referral_count = custom_user.referrals.count() # Count direct referrals
-            is_registered = True # True because a linked_custom_user exists
-            # kyc_status = get_user_kyc_status(custom_user) # If you have a KYC app/function
-
-            return JsonResponse({
-                "is_registered": is_registered,
-                "share_balance": share_balance,
-                "referral_count": referral_count,
-                # "kyc_status": kyc_status, 
-                "username": custom_user.username, # Example of data to return
-                "phone_number": custom_user.phone_number,
-                "telegram_username": telegram_user.username,
-            })
+        # One cache hit, or a single query when the dashboard changed (see dashboard.py)
+        if hasattr(request, 'miniapp_dashboard'):
+            entry = request.miniapp_dashboard
         else:
-            logger.info(f"Telegram user {telegram_id_from_init_data} found but not linked to CustomUser.")
-            return JsonResponse({"is_registered": False})
-
-    except TelegramUser.DoesNotExist:
-        logger.info(f"Telegram user {telegram_id_from_init_data} not found in DB during status check (not yet registered).")
-        return JsonResponse({"is_registered": False})
+            entry = get_dashboard_entry(session.custom_user_id)
     except Exception as e:
         logger.exception("Error during Mini App status check:")
         return JsonResponse({"error": "An internal server error occurred during status check."}, status=500)
 
+    if entry is None:
+        logger.info(f"CustomUser {session.custom_user_id} from a Mini App session no longer exists.")
+        return JsonResponse({"is_registered": False})
+    return JsonResponse({"is_registered": True, **entry[0]})
+
+def _events_enabled():
+    return getattr(settings, 'TELEGRAM_MINIAPP_EVENTS_ENABLED', True)
+
+@csrf_exempt # API endpoint for Mini App, needs csrf_exempt for external calls
+@require_http_methods(["POST"])
+@miniapp_auth
+def miniapp_api_events_token(request):
+    """
+    Issues the short-lived stream token that opens miniapp_api_events.
+    404 when streams are disabled, which tells the Mini App to poll instead.
+    """
+    if not _events_enabled():
+        return JsonResponse({"error": "Event streams are disabled."}, status=404)
+    session = request.miniapp_session
+    if not session.is_registered:
+        return JsonResponse({"error": "Register to receive updates."}, status=403)
+    return JsonResponse({"token": issue_stream_token(session), "expires_in": stream_token_ttl()})
+
+@require_http_methods(["GET"])
+async def miniapp_api_events(request):
+    """
+    Server-Sent Events stream of changes to the user's deposits, commissions
+    and KYC status (see events.py). EventSource cannot send headers, so a
+    single-purpose stream token from miniapp_api_events_token comes in the
+    `token` query parameter. Needs the ASGI server.
+    """
+    if not _events_enabled():
+        return HttpResponse(status=204) # EventSource does not reconnect after a 204
+    custom_user_id = read_stream_token(request.GET.get('token', ''))
+    if custom_user_id is None:
+        return JsonResponse({"error": "Stream token expired or invalid."}, status=401)
+
+    keepalive = getattr(settings, 'TELEGRAM_MINIAPP_EVENTS_KEEPALIVE', 25)
+    subscription = get_event_broker().subscribe(custom_user_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n" # Reconnect delay for the browser, in milliseconds
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n" # Keeps proxies from closing an idle stream
+                    continue
+                yield format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+    return response
+
 # This `status_view` seems to be a duplicate or an old version.
 # You likely only need `miniapp_api_status`. Consider removing this if it's redundant.
 @csrf_exempt
@@ -343,8 +297,3 @@ def status_view(request):
     # For now, I'll use a placeholder `settings.TELEGRAM_BOT_TOKEN`.
     if not validate_telegram_init_data(init_data, settings.TELEGRAM_BOT_TOKEN)[0]: # Only check is_valid bool
         return JsonResponse({'error': 'Unauthorized'}, status=403)
-
-from django.shortcuts import render
-
-def miniapp_view(request):
-    return render(request, 'miniapp/index.html')
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import TelegramUser, BotInteractionLog # Only import models defined in this app's models.py
+from django.db import transaction
+
+from .broadcast import enqueue_broadcast
+from .outbox import requeue_dead_messages
+from .models import TelegramUser, BotInteractionLog, ConversationState, BroadcastJob, BroadcastRecipient, InteractionRollup, TelegramFile, OutboxMessage # Only import models defined in this app's models.py
 
 @admin.register(TelegramUser)
 class TelegramUserAdmin(admin.ModelAdmin):
@@ -14,8 +18,79 @@ class BotInteractionLogAdmin(admin.ModelAdmin):
     list_filter = ('command_used', 'timestamp')
     search_fields = ('telegram_user__username', 'telegram_user__first_name', 'message_text', 'command_used')
     readonly_fields = ('telegram_user', 'message_text', 'command_used', 'response_text', 'timestamp') # Logs should be read-only
+    list_select_related = ('telegram_user',) # One query per page instead of one per row
+    show_full_result_count = False # Skip the extra COUNT(*) over the whole table
 
     def message_text_snippet(self, obj):
         return obj.message_text[:50] + '...' if obj.message_text and len(obj.message_text) > 50 else obj.message_text
     message_text_snippet.short_description = "Message"
-    message_text_snippet.admin_order_field = 'message_text' # Allow sorting by message text snippet 
\ No newline at end of file
+    message_text_snippet.admin_order_field = 'message_text' # Allow sorting by message text snippet 
+@admin.register(ConversationState)
+class ConversationStateAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'state', 'updated_at', 'expires_at')
+    list_filter = ('state',)
+    search_fields = ('user_id',)
+
+@admin.register(BroadcastJob)
+class BroadcastJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'segment', 'status', 'total_recipients', 'sent_count', 'failed_count', 'throughput', 'last_checkpoint_at')
+    list_filter = ('status', 'segment')
+    search_fields = ('name',)
+    readonly_fields = ('status', 'cursor', 'total_recipients', 'sent_count', 'failed_count', 'throughput',
+                       'lease_expires_at', 'lease_owner', 'started_at', 'finished_at', 'last_checkpoint_at', 'created_by')
+    actions = ['start_or_resume', 'pause', 'cancel']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Start / resume selected broadcasts")
+    def start_or_resume(self, request, queryset):
+        jobs = list(queryset.filter(status__in=[BroadcastJob.STATUS_PENDING, BroadcastJob.STATUS_PAUSED]))
+        BroadcastJob.objects.filter(pk__in=[job.pk for job in jobs]).update(status=BroadcastJob.STATUS_PENDING)
+        for job in jobs:
+            transaction.on_commit(lambda job=job: enqueue_broadcast(job))
+        self.message_user(request, f"{len(jobs)} broadcast(s) queued.")
+
+    @admin.action(description="Pause selected broadcasts")
+    def pause(self, request, queryset):
+        paused = queryset.filter(status__in=[BroadcastJob.STATUS_PENDING, BroadcastJob.STATUS_RUNNING]).update(status=BroadcastJob.STATUS_PAUSED)
+        self.message_user(request, f"{paused} broadcast(s) paused after their current page.")
+
+    @admin.action(description="Cancel selected broadcasts")
+    def cancel(self, request, queryset):
+        cancelled = queryset.exclude(status=BroadcastJob.STATUS_COMPLETED).update(status=BroadcastJob.STATUS_CANCELLED)
+        self.message_user(request, f"{cancelled} broadcast(s) cancelled.")
+
+@admin.register(BroadcastRecipient)
+class BroadcastRecipientAdmin(admin.ModelAdmin):
+    list_display = ('job', 'telegram_user_id', 'delivered', 'error', 'sent_at')
+    list_filter = ('delivered', 'job')
+    search_fields = ('telegram_user_id',)
+
+@admin.register(InteractionRollup)
+class InteractionRollupAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'command_used', 'language', 'is_new_user', 'count')
+    list_filter = ('period', 'language', 'is_new_user', 'command_used')
+    date_hierarchy = 'period_start'
+    readonly_fields = ('period', 'period_start', 'command_used', 'language', 'is_new_user', 'count') # Maintained by rollups.py
+
+@admin.register(TelegramFile)
+class TelegramFileAdmin(admin.ModelAdmin):
+    list_display = ('file_unique_id', 'stored_name', 'file_size', 'mime_type', 'created_at')
+    search_fields = ('file_unique_id', 'stored_name')
+    readonly_fields = ('file_unique_id', 'file_id', 'file_size', 'mime_type', 'stored_name', 'created_at')
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chat_id', 'status', 'priority', 'attempts', 'next_attempt_at', 'last_error', 'created_at', 'sent_at')
+    list_filter = ('status', 'priority')
+    search_fields = ('chat_id', 'text')
+    readonly_fields = ('telegram_message_id', 'created_at', 'sent_at')
+    actions = ['requeue']
+
+    @admin.action(description="Re-queue selected dead-lettered messages")
+    def requeue(self, request, queryset):
+        requeued = requeue_dead_messages(queryset)
+        self.message_user(request, f"{requeued} message(s) re-queued.")
@@ -32,6 +32,9 @@ class TelegramConfig(AppConfig):
         # We will not perform any complex initialization here to avoid AppRegistryNotReady.
         # Any necessary setup related to python-telegram-bot (like setting webhook)
         # will be handled by a separate management command or view, ensuring Django is fully ready.
+        # Cached reply languages are dropped when an account's preferred_language changes
+        from .signals import connect_language_signals
+        connect_language_signals()
         logger.info("Telegram app is ready. AppConfig.ready() executed. No early PTB initialization.")
 
 # Note: If you need to perform any specific setup that requires the Django app registry,
@@ -0,0 +1,179 @@
+# apps/telegram/bot_api.py
+"""
+Shared Telegram Bot API client.
+
+All outbound Bot API calls go through a single pooled, keep-alive client per
+process so that sending a message reuses an open TLS connection instead of
+paying a new handshake every time. A synchronous client (requests) is used by
+views, Celery tasks and management commands; an asyncio client (httpx, with
+optional HTTP/2) is available for async code paths.
+"""
+import logging
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+
+class BotAPIError(Exception):
+    """
+    Raised when a Bot API call fails, either at the network level or because
+    Telegram answered with ok=false. `retry_after` is set on 429 responses.
+    """
+    def __init__(self, method, description, error_code=None, retry_after=None):
+        self.method = method
+        self.description = description
+        self.error_code = error_code
+        self.retry_after = retry_after
+        super().__init__(f"{method} failed ({error_code}): {description}")
+
+
+def _client_settings():
+    return {
+        'token': settings.TELEGRAM_BOT_TOKEN,
+        'api_base': getattr(settings, 'TELEGRAM_API_BASE_URL', TELEGRAM_API_BASE),
+        'connect_timeout': getattr(settings, 'TELEGRAM_API_CONNECT_TIMEOUT', 3.05),
+        'read_timeout': getattr(settings, 'TELEGRAM_API_READ_TIMEOUT', 10),
+        'pool_size': getattr(settings, 'TELEGRAM_API_POOL_SIZE', 20),
+    }
+
+
+def _parse_response(method, status_code, body):
+    """Turns a Bot API response body into its result or raises BotAPIError."""
+    if not isinstance(body, dict):
+        raise BotAPIError(method, f"Unexpected response (HTTP {status_code})", error_code=status_code)
+    if not body.get('ok'):
+        parameters = body.get('parameters') or {}
+        raise BotAPIError(
+            method,
+            body.get('description', 'Unknown error'),
+            error_code=body.get('error_code', status_code),
+            retry_after=parameters.get('retry_after'),
+        )
+    return body
+
+
+class BotAPIClient:
+    """Synchronous Bot API client backed by a pooled requests.Session."""
+
+    def __init__(self, token, api_base=TELEGRAM_API_BASE, connect_timeout=3.05, read_timeout=10, pool_size=20):
+        self.base_url = f"{api_base}/bot{token}/"
+        self.file_url = f"{api_base}/file/bot{token}/"
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)  # Local Bot API server / test stubs
+
+    def call(self, method, params=None, timeout=None):
+        """Calls a Bot API method and returns the decoded response (ok=True)."""
+        try:
+            response = self.session.post(self.base_url + method, json=params or {}, timeout=timeout or self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise BotAPIError(method, str(e)) from e
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return _parse_response(method, response.status_code, body)
+
+    def download(self, file_path, timeout=None):
+        """
+        Opens a streamed download of a file returned by getFile. Use it as a
+        context manager and read it with iter_content(); the body is never
+        loaded into memory as a whole.
+        """
+        try:
+            response = self.session.get(self.file_url + file_path, stream=True, timeout=timeout or self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise BotAPIError('download', str(e)) from e
+        if response.status_code != 200:
+            response.close()
+            raise BotAPIError('download', f"HTTP {response.status_code} for {file_path}", error_code=response.status_code)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncBotAPIClient:
+    """
+    asyncio Bot API client backed by a pooled httpx.AsyncClient.
+    Set TELEGRAM_API_HTTP2 = True (requires `httpx[http2]`) to multiplex calls over one connection.
+    """
+
+    def __init__(self, token, api_base=TELEGRAM_API_BASE, connect_timeout=3.05, read_timeout=10, pool_size=20, http2=False):
+        import httpx  # Only needed by async code paths
+
+        self.base_url = f"{api_base}/bot{token}/"
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        self._httpx = httpx
+
+    async def call(self, method, params=None, timeout=None):
+        """Calls a Bot API method and returns the decoded response (ok=True)."""
+        try:
+            response = await self.client.post(
+                self.base_url + method,
+                json=params or {},
+                timeout=timeout if timeout is not None else self._httpx.USE_CLIENT_DEFAULT,
+            )
+        except self._httpx.HTTPError as e:
+            raise BotAPIError(method, str(e)) from e
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return _parse_response(method, response.status_code, body)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_sync_client = None
+_sync_client_lock = threading.Lock()
+
+def get_bot_api():
+    """Returns the process-wide synchronous Bot API client, creating it on first use."""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_client_lock:
+            if _sync_client is None:
+                _sync_client = BotAPIClient(**_client_settings())
+    return _sync_client
+
+def reset_bot_api():
+    """Closes the synchronous client so the next call rebuilds it from current settings."""
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+        _sync_client = None
+
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_bot_api():
+    """
+    Returns the asyncio Bot API client for the running event loop.
+    httpx connections are bound to a loop, so one client is kept per loop.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncBotAPIClient(
+            http2=getattr(settings, 'TELEGRAM_API_HTTP2', False),
+            **_client_settings(),
+        )
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,229 @@
+# apps/telegram/broadcast.py
+"""
+Resumable broadcasts to a segment of TelegramUsers.
+
+A BroadcastJob walks its recipients in user_id order, one page at a time
+(keyset pagination on `user_id > cursor`, so every page is an index range
+scan however far into the job we are). Each page is split across several
+OutboundDispatchers running in threads that share the process rate limiter,
+so sends overlap their network latency while staying within Telegram's
+limits. After a page, its per-recipient results, the job counters and the
+cursor are written in one transaction (the checkpoint); a restarted job
+resumes from there and re-sends at most one page. The counters only grow
+by the BroadcastRecipient rows the checkpoint actually inserts, so a page
+that is checkpointed twice is counted once.
+
+A worker owns a job through a short lease identified by a random
+`lease_owner` token. The lease is renewed while a page is being sent and
+at every checkpoint; a worker whose lease was taken over by another cannot
+renew it or checkpoint. The Celery task gives up the job after
+TELEGRAM_BROADCAST_TIME_BUDGET seconds and re-enqueues itself, and
+resume_stalled_broadcasts_task picks up jobs whose worker died.
+"""
+import datetime
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BroadcastJob, BroadcastRecipient, TelegramUser
+from .outbound import OutboundDispatcher, OutboundMessage, PRIORITY_MARKETING, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# BroadcastRunner.run() outcomes
+RUN_FINISHED = 'finished' # No recipients left
+RUN_YIELDED = 'yielded' # Time budget used up, more to send
+RUN_STOPPED = 'stopped' # Paused or cancelled while running
+RUN_BUSY = 'busy' # Another worker holds the lease, or the job is not runnable
+RUN_LOST_LEASE = 'lost_lease' # Another worker took the job over mid-run
+
+
+def segment_queryset(job):
+    """TelegramUsers targeted by a job's segment."""
+    recipients = TelegramUser.objects.filter(is_bot=False)
+    if job.segment == BroadcastJob.SEGMENT_UNREGISTERED:
+        recipients = recipients.filter(linked_custom_user__isnull=True)
+    elif job.segment == BroadcastJob.SEGMENT_NOT_KYC_VERIFIED:
+        recipients = recipients.filter(Q(linked_custom_user__isnull=True) | Q(linked_custom_user__is_kyc_verified=False))
+    elif job.segment == BroadcastJob.SEGMENT_ROLE:
+        recipients = recipients.filter(linked_custom_user__role=job.segment_role)
+    return recipients
+
+
+class BroadcastRunner:
+    """Sends one BroadcastJob page by page, checkpointing after each page."""
+
+    def __init__(self, job, page_size=None, concurrency=None, lease_seconds=None, limiter=None, api=None):
+        self.job = job
+        self.page_size = page_size or getattr(settings, 'TELEGRAM_BROADCAST_PAGE_SIZE', 200)
+        self.concurrency = max(1, concurrency or getattr(settings, 'TELEGRAM_BROADCAST_CONCURRENCY', 8))
+        self.lease_seconds = lease_seconds or getattr(settings, 'TELEGRAM_BROADCAST_LEASE', 120)
+        self.limiter = limiter or get_rate_limiter()
+        self.api = api
+        self.lease_owner = uuid.uuid4().hex
+
+    def _lease_until(self):
+        return timezone.now() + datetime.timedelta(seconds=self.lease_seconds)
+
+    def _owned(self):
+        return BroadcastJob.objects.filter(pk=self.job.pk, lease_owner=self.lease_owner)
+
+    def claim(self):
+        """Takes the job's lease if it is runnable and nobody else holds it."""
+        now = timezone.now()
+        claimed = BroadcastJob.objects.filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now),
+            pk=self.job.pk,
+            status__in=[BroadcastJob.STATUS_PENDING, BroadcastJob.STATUS_RUNNING],
+        ).update(
+            status=BroadcastJob.STATUS_RUNNING, lease_owner=self.lease_owner, lease_expires_at=self._lease_until(),
+            started_at=Coalesce('started_at', now),
+        )
+        self.job.refresh_from_db()
+        if claimed and not self.job.total_recipients:
+            self.job.total_recipients = segment_queryset(self.job).count()
+            BroadcastJob.objects.filter(pk=self.job.pk).update(total_recipients=self.job.total_recipients)
+        return bool(claimed)
+
+    def renew_lease(self):
+        """Extends the lease; returns False if another worker has taken the job over."""
+        return bool(self._owned().update(lease_expires_at=self._lease_until()))
+
+    def next_page(self):
+        return list(
+            segment_queryset(self.job)
+            .filter(user_id__gt=self.job.cursor)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)[:self.page_size]
+        )
+
+    def _send_shard(self, user_ids):
+        results = []
+        dispatcher = OutboundDispatcher(
+            limiter=self.limiter,
+            api=self.api,
+            on_result=lambda message, ok, result: results.append((message.reference, ok, result)),
+        )
+        for user_id in user_ids:
+            dispatcher.submit(OutboundMessage(
+                user_id, self.job.text, reply_markup=self.job.reply_markup, priority=PRIORITY_MARKETING, reference=user_id,
+            ))
+        dispatcher.run()
+        return results
+
+    def send_page(self, executor, user_ids):
+        """
+        Sends one page across `concurrency` dispatchers, renewing the lease
+        while they run. Returns [(user_id, ok, result_or_error)].
+        """
+        shards = [user_ids[index::self.concurrency] for index in range(self.concurrency)]
+        futures = [executor.submit(self._send_shard, shard) for shard in shards if shard]
+        while wait(futures, timeout=self.lease_seconds / 3).not_done:
+            if not self.renew_lease():
+                logger.warning(f"Broadcast {self.job.pk}: lease taken over while sending a page; it will not be checkpointed here.")
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def checkpoint(self, user_ids, results, run_started, run_processed):
+        """
+        Records a page's results and moves the cursor past it. Returns False,
+        writing nothing, if this worker no longer owns the job.
+        """
+        throughput = round(run_processed / max(time.monotonic() - run_started, 0.001), 2)
+        with transaction.atomic():
+            # Locking the job row serializes checkpoints, so the recipients seen below cannot change under us
+            if self._owned().select_for_update().values_list('pk', flat=True).first() is None:
+                return False
+            recorded = set(
+                BroadcastRecipient.objects.filter(job=self.job, telegram_user_id__in=user_ids)
+                .values_list('telegram_user_id', flat=True)
+            )
+            rows = []
+            for user_id, ok, result in results:
+                if user_id in recorded:
+                    continue # Replayed page: already recorded and counted
+                if ok:
+                    rows.append(BroadcastRecipient(
+                        job=self.job, telegram_user_id=user_id, delivered=True,
+                        message_id=(result.get('result') or {}).get('message_id'),
+                    ))
+                else:
+                    rows.append(BroadcastRecipient(job=self.job, telegram_user_id=user_id, delivered=False, error=str(result)[:255]))
+            BroadcastRecipient.objects.bulk_create(rows)
+            sent = sum(1 for row in rows if row.delivered)
+            self._owned().update(
+                cursor=max(self.job.cursor, user_ids[-1]),
+                sent_count=F('sent_count') + sent,
+                failed_count=F('failed_count') + len(rows) - sent,
+                throughput=throughput,
+                last_checkpoint_at=timezone.now(),
+                lease_expires_at=self._lease_until(),
+            )
+        self.job.refresh_from_db()
+        logger.info(
+            f"Broadcast {self.job.pk}: {self.job.processed_count}/{self.job.total_recipients} processed, "
+            f"{self.job.failed_count} failed, {throughput} msg/s."
+        )
+        return True
+
+    def run(self, time_budget=None):
+        """Sends pages until the job is done, stopped, or `time_budget` seconds have passed."""
+        if not self.claim():
+            return RUN_BUSY
+        run_started = time.monotonic()
+        run_processed = 0
+        outcome = RUN_YIELDED
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='tg-broadcast') as executor:
+                while True:
+                    if self.job.status != BroadcastJob.STATUS_RUNNING:
+                        outcome = RUN_STOPPED
+                        break
+                    if time_budget is not None and time.monotonic() - run_started >= time_budget:
+                        break
+                    user_ids = self.next_page()
+                    if not user_ids:
+                        outcome = RUN_FINISHED
+                        break
+                    results = self.send_page(executor, user_ids)
+                    run_processed += len(results)
+                    if not self.checkpoint(user_ids, results, run_started, run_processed):
+                        logger.warning(f"Broadcast {self.job.pk} was taken over by another worker; stopping.")
+                        outcome = RUN_LOST_LEASE
+                        break
+        finally:
+            updates = {'lease_expires_at': None, 'lease_owner': None}
+            if outcome == RUN_FINISHED:
+                updates.update(status=BroadcastJob.STATUS_COMPLETED, finished_at=timezone.now())
+            self._owned().update(**updates) # Never releases a lease another worker now holds
+        if outcome == RUN_FINISHED:
+            logger.info(f"Broadcast {self.job.pk} completed: {self.job.sent_count} sent, {self.job.failed_count} failed.")
+        return outcome
+
+
+def enqueue_broadcast(job):
+    from .tasks import run_broadcast_task
+
+    run_broadcast_task.apply_async(
+        args=(job.pk,),
+        queue=getattr(settings, 'TELEGRAM_OUTBOUND_QUEUE', 'telegram_outbound'),
+        priority=PRIORITY_MARKETING,
+    )
+
+def start_broadcast(name, text, segment=BroadcastJob.SEGMENT_ALL, segment_role=None, reply_markup=None, created_by=None):
+    """Creates a BroadcastJob and hands it to the outbound worker once the transaction commits."""
+    job = BroadcastJob.objects.create(
+        name=name, text=text, segment=segment, segment_role=segment_role,
+        reply_markup=reply_markup, created_by=created_by,
+    )
+    transaction.on_commit(lambda: enqueue_broadcast(job))
+    return job
@@ -0,0 +1,159 @@
+# apps/telegram/catalog.py
+"""
+Multi-language message catalog for bot replies.
+
+English lives in localization.py and each translation in
+apps/telegram/locales/<code>.py, using the same constant names. A language's
+bundle is imported the first time it is needed, merged over English so
+missing translations fall back, and every message is parsed once into a
+CompiledTemplate. Rendering a reply is then a dict lookup plus a join.
+
+A user's language comes from their linked account's preferred_language,
+falling back to the Telegram client's language_code. The account lookup is
+cached per Telegram user for TELEGRAM_LANGUAGE_CACHE_TTL seconds, so it costs
+at most one query per user per TTL rather than one per message.
+"""
+import collections
+import importlib
+import logging
+import string
+import threading
+import time
+
+from django.conf import settings
+
+from . import localization
+
+logger = logging.getLogger(__name__)
+
+_formatter = string.Formatter()
+
+
+class CompiledTemplate:
+    """A message template parsed once into literal text and named fields."""
+
+    __slots__ = ('text', 'parts', 'static', 'simple')
+
+    def __init__(self, text):
+        self.text = text
+        parsed = list(_formatter.parse(text))
+        self.parts = [(literal, field) for literal, field, _, _ in parsed]
+        fields = [(field, spec, conversion) for _, field, spec, conversion in parsed if field is not None]
+        # Plain '{name}' fields are joined directly; anything fancier goes through str.format
+        self.simple = all(field.isidentifier() and not spec and conversion is None for field, spec, conversion in fields)
+        self.static = ''.join(literal for literal, _ in self.parts) if not fields else None
+
+    def render(self, **kwargs):
+        if self.static is not None:
+            return self.static
+        if not self.simple:
+            return self.text.format(**kwargs)
+        return ''.join(literal if field is None else literal + str(kwargs[field]) for literal, field in self.parts)
+
+
+def _module_messages(module):
+    return {name: value for name, value in vars(module).items() if name.isupper() and isinstance(value, str)}
+
+
+class MessageCatalog:
+    """Lazily loaded, pre-compiled message bundles per language."""
+
+    def __init__(self, languages=('en',), default_language='en'):
+        self.languages = tuple(languages)
+        self.default_language = default_language
+        self.bundles = {}
+        self.lock = threading.Lock()
+
+    def match(self, language):
+        """Maps 'am', 'AM', 'om-ET' etc. to a supported language code, or None."""
+        if language:
+            code = language.replace('_', '-').split('-', 1)[0].lower()
+            if code in self.languages:
+                return code
+        return None
+
+    def normalize(self, language):
+        return self.match(language) or self.default_language
+
+    def bundle(self, language):
+        language = self.normalize(language)
+        bundle = self.bundles.get(language)
+        if bundle is None:
+            with self.lock:
+                bundle = self.bundles.get(language)
+                if bundle is None:
+                    bundle = self.bundles[language] = self._load(language)
+        return bundle
+
+    def _load(self, language):
+        messages = _module_messages(localization)
+        if language != 'en':
+            try:
+                messages.update(_module_messages(importlib.import_module(f'apps.telegram.locales.{language}')))
+            except ImportError:
+                logger.warning(f"No message bundle for language '{language}', using English.")
+        return {name: CompiledTemplate(text) for name, text in messages.items()}
+
+    def get(self, key, language=None):
+        """Returns the raw message text for `key`."""
+        return self.bundle(language)[key].text
+
+    def format(self, key, language=None, **kwargs):
+        """Returns message `key` in `language` with its fields filled in."""
+        return self.bundle(language)[key].render(**kwargs)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """Returns the process-wide message catalog configured from settings."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = MessageCatalog(
+                    languages=getattr(settings, 'TELEGRAM_LANGUAGES', ('en',)),
+                    default_language=getattr(settings, 'TELEGRAM_DEFAULT_LANGUAGE', 'en'),
+                )
+    return _catalog
+
+def translate(key, language=None, **kwargs):
+    """Shortcut for get_catalog().format(); the usual way handlers build reply text."""
+    return get_catalog().format(key, language, **kwargs)
+
+
+# --- Per-user language ---
+
+_language_cache = collections.OrderedDict() # telegram user_id -> (preferred_language or None, expires_at)
+_language_cache_lock = threading.Lock()
+
+def _preferred_language(telegram_user_id):
+    now = time.monotonic()
+    with _language_cache_lock:
+        entry = _language_cache.get(telegram_user_id)
+        if entry is not None and entry[1] > now:
+            _language_cache.move_to_end(telegram_user_id)
+            return entry[0]
+
+    from .models import TelegramUser
+    preferred = TelegramUser.objects.filter(user_id=telegram_user_id).values_list(
+        'linked_custom_user__preferred_language', flat=True
+    ).first()
+
+    with _language_cache_lock:
+        _language_cache[telegram_user_id] = (preferred, now + getattr(settings, 'TELEGRAM_LANGUAGE_CACHE_TTL', 600))
+        _language_cache.move_to_end(telegram_user_id)
+        while len(_language_cache) > getattr(settings, 'TELEGRAM_USER_CACHE_SIZE', 50000):
+            _language_cache.popitem(last=False)
+    return preferred
+
+def resolve_language(telegram_user_id, client_language_code=None):
+    """Language to reply in: the account's preferred_language, else the Telegram client's language."""
+    catalog = get_catalog()
+    return catalog.match(_preferred_language(telegram_user_id)) or catalog.normalize(client_language_code)
+
+def forget_user_language(telegram_user_id):
+    """Drops a cached preference, e.g. right after the user changes preferred_language."""
+    with _language_cache_lock:
+        _language_cache.pop(telegram_user_id, None)
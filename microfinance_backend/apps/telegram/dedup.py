@@ -0,0 +1,53 @@
+# apps/telegram/dedup.py
+"""
+update_id deduplication for idempotent webhook processing.
+
+Telegram redelivers an update whenever the webhook is slow or does not answer
+200. Each accepted update_id is recorded with an atomic cache.add() that
+expires after TELEGRAM_DEDUP_TTL seconds, so a redelivery is recognised with
+a single cache round trip and dropped before the body is decoded or the
+database is touched. TELEGRAM_DEDUP_CACHE_ALIAS names the Redis-backed
+'shared' cache, so every worker sees the same ids and they survive a
+restart; if it cannot be reached, updates are processed rather than lost.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'tg_update:'
+
+# Telegram always serialises update_id as the first key of the Update object
+UPDATE_ID_RE = re.compile(rb'^\s*\{\s*"update_id"\s*:\s*(\d+)')
+
+
+def peek_update_id(raw_body):
+    """Extracts update_id from the start of a raw webhook body without decoding the JSON."""
+    match = UPDATE_ID_RE.match(raw_body[:64])
+    return int(match.group(1)) if match else None
+
+def _cache():
+    return caches[getattr(settings, 'TELEGRAM_DEDUP_CACHE_ALIAS', 'default')]
+
+def mark_update_seen(update_id):
+    """
+    Records update_id as accepted. Returns False if it was already recorded,
+    i.e. the update is a redelivery that should be dropped.
+    """
+    ttl = getattr(settings, 'TELEGRAM_DEDUP_TTL', 86400)
+    try:
+        return _cache().add(f"{CACHE_KEY_PREFIX}{update_id}", 1, ttl)
+    except Exception as e:
+        # A redelivery handled twice beats an update never handled
+        logger.warning(f"Update dedup cache unavailable, accepting update {update_id}: {e}")
+        return True
+
+def forget_update(update_id):
+    """Removes update_id so Telegram's next redelivery is processed (used when processing fails)."""
+    try:
+        _cache().delete(f"{CACHE_KEY_PREFIX}{update_id}")
+    except Exception as e:
+        logger.warning(f"Update dedup cache unavailable, could not forget update {update_id}: {e}")
@@ -0,0 +1,126 @@
+# apps/telegram/files.py
+"""
+Files sent to the bot (e.g. KYC ID photos), copied into Django storage.
+
+download_telegram_file() resolves a file_id with getFile and streams the
+file from Telegram straight into the default storage in
+TELEGRAM_FILE_CHUNK_SIZE chunks, so memory use does not grow with the file.
+Each stored copy is recorded as a TelegramFile keyed by file_unique_id; a
+file that was already downloaded is returned from that table without
+touching the Bot API again.
+
+Downloads run in a Celery task (queue_kyc_document_download), never on the
+thread handling the update.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .bot_api import get_bot_api
+from .models import TelegramFile
+
+logger = logging.getLogger(__name__)
+
+KYC_UPLOAD_TO = 'kyc_docs/' # Same directory as KYCProfile.id_document
+
+
+class TelegramFileTooLarge(Exception):
+    """Raised for files above TELEGRAM_FILE_MAX_SIZE (the Bot API serves at most 20 MB)."""
+
+
+def message_attachment(message):
+    """
+    Returns {'file_id', 'file_unique_id', 'file_size', 'mime_type'} for the
+    photo (largest size) or document in a message, or None.
+    """
+    if message.get('photo'):
+        photo = message['photo'][-1] # Sizes are sent smallest first
+        return {
+            'file_id': photo['file_id'], 'file_unique_id': photo.get('file_unique_id'),
+            'file_size': photo.get('file_size'), 'mime_type': 'image/jpeg',
+        }
+    document = message.get('document')
+    if document:
+        return {
+            'file_id': document['file_id'], 'file_unique_id': document.get('file_unique_id'),
+            'file_size': document.get('file_size'), 'mime_type': document.get('mime_type'),
+        }
+    return None
+
+
+class StreamedDownload(File):
+    """Wraps a streamed Bot API download so storage backends read it chunk by chunk."""
+
+    def __init__(self, response, name, size=None, chunk_size=None):
+        response.raw.decode_content = True
+        super().__init__(response.raw, name)
+        self.response = response
+        self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        if size is not None:
+            self.size = size
+
+    def chunks(self, chunk_size=None):
+        yield from self.response.iter_content(chunk_size or self.chunk_size)
+
+    def multiple_chunks(self, chunk_size=None):
+        return True
+
+
+def _max_size():
+    return getattr(settings, 'TELEGRAM_FILE_MAX_SIZE', 20 * 1024 * 1024)
+
+def download_telegram_file(file_id, file_unique_id=None, mime_type=None, upload_to=KYC_UPLOAD_TO):
+    """
+    Returns the TelegramFile for `file_id`, downloading it into storage
+    first unless the same file was stored before.
+    """
+    if file_unique_id:
+        existing = TelegramFile.objects.filter(file_unique_id=file_unique_id).first()
+        if existing is not None:
+            return existing
+
+    api = get_bot_api()
+    info = api.call('getFile', {'file_id': file_id})['result']
+    file_unique_id = info['file_unique_id']
+    existing = TelegramFile.objects.filter(file_unique_id=file_unique_id).first()
+    if existing is not None:
+        return existing
+    if (info.get('file_size') or 0) > _max_size():
+        raise TelegramFileTooLarge(f"File {file_unique_id} is {info['file_size']} bytes.")
+
+    extension = os.path.splitext(info.get('file_path', ''))[1].lower()
+    name = f"{upload_to}{file_unique_id}{extension}"
+    chunk_size = getattr(settings, 'TELEGRAM_FILE_CHUNK_SIZE', 64 * 1024)
+    with api.download(info['file_path']) as response:
+        stored_name = default_storage.save(name, StreamedDownload(response, name, info.get('file_size'), chunk_size))
+
+    telegram_file, created = TelegramFile.objects.get_or_create(file_unique_id=file_unique_id, defaults={
+        'file_id': file_id, 'file_size': info.get('file_size'), 'mime_type': mime_type, 'stored_name': stored_name,
+    })
+    if not created:
+        default_storage.delete(stored_name) # Another worker stored the same file meanwhile
+    else:
+        logger.info(f"Stored Telegram file {file_unique_id} as {stored_name} ({info.get('file_size')} bytes).")
+    return telegram_file
+
+
+def attach_kyc_document(kyc_profile_id, telegram_file):
+    """Points KYCProfile.id_document at a stored Telegram file."""
+    from apps.kyc.models import KYCProfile
+
+    return KYCProfile.objects.filter(pk=kyc_profile_id).update(id_document=telegram_file.stored_name)
+
+def queue_kyc_document_download(kyc_profile, attachment):
+    """Downloads an ID document sent to the bot in the background, once the current transaction commits."""
+    from .tasks import download_kyc_document_task
+
+    if (attachment.get('file_size') or 0) > _max_size():
+        raise TelegramFileTooLarge(f"File {attachment.get('file_unique_id')} is {attachment['file_size']} bytes.")
+    transaction.on_commit(lambda: download_kyc_document_task.apply_async(
+        args=(kyc_profile.pk, attachment['file_id'], attachment.get('file_unique_id'), attachment.get('mime_type')),
+        queue=getattr(settings, 'TELEGRAM_FILE_QUEUE', 'default'),
+    ))
@@ -0,0 +1,131 @@
+# apps/telegram/init_data.py
+"""
+Validation of Telegram Mini App (WebApp) initData.
+
+Telegram signs initData with HMAC-SHA256(data_check_string, secret_key),
+where secret_key = HMAC-SHA256(key="WebAppData", msg=bot_token). The secret
+key depends only on the bot token, so InitDataValidator derives it once.
+Hashes are compared in constant time, and auth_date must be within
+TELEGRAM_INIT_DATA_MAX_AGE seconds.
+
+An open Mini App sends the same initData string with every request, so
+verified strings are kept in a small LRU for TELEGRAM_INIT_DATA_CACHE_TTL
+seconds; a repeat request is a dict lookup with no parsing or hashing.
+Only successful validations are cached.
+"""
+import collections
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def derive_secret_key(bot_token):
+    return hmac.new(key=b"WebAppData", msg=bot_token.encode('utf-8'), digestmod=hashlib.sha256).digest()
+
+
+class InitDataValidator:
+    """Checks initData signed for one bot token."""
+
+    def __init__(self, bot_token, max_age=86400, cache_size=10000, cache_ttl=300):
+        self.bot_token = bot_token
+        self.secret_key = derive_secret_key(bot_token)
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = collections.OrderedDict() # raw initData -> (parsed data, expires_at)
+        self.lock = threading.Lock()
+
+    def _verify(self, init_data_raw, now):
+        """Parses and checks a raw initData string. Returns the parsed dict or None."""
+        params = dict(parse_qsl(init_data_raw, keep_blank_values=True)) # Values come back URL-decoded
+        received_hash = params.pop('hash', None)
+        if not received_hash:
+            logger.warning("InitData validation failed: 'hash' parameter missing.")
+            return None
+
+        data_check_string = '\n'.join(f"{key}={params[key]}" for key in sorted(params))
+        calculated_hash = hmac.new(self.secret_key, data_check_string.encode('utf-8'), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(calculated_hash, received_hash):
+            logger.warning("InitData validation failed: hash mismatch.")
+            return None
+
+        try:
+            auth_date = int(params['auth_date'])
+        except (KeyError, ValueError):
+            logger.warning("InitData validation failed: 'auth_date' missing or invalid.")
+            return None
+        if self.max_age and now - auth_date > self.max_age:
+            logger.info(f"InitData validation failed: auth_date is {int(now - auth_date)}s old.")
+            return None
+
+        user_data = None
+        if 'user' in params:
+            try:
+                user_data = json.loads(params['user'])
+            except json.JSONDecodeError:
+                logger.error("Failed to parse 'user' data from initData as JSON.")
+        params['user_data'] = user_data
+        return params
+
+    def validate(self, init_data_raw):
+        """Returns (is_valid, parsed_data_dict); the dict has the decoded 'user' as 'user_data'."""
+        if not init_data_raw:
+            return False, None
+        now = time.time()
+        with self.lock:
+            entry = self.cache.get(init_data_raw)
+            if entry is not None:
+                if entry[1] > now:
+                    self.cache.move_to_end(init_data_raw)
+                    return True, dict(entry[0])
+                del self.cache[init_data_raw]
+
+        parsed = self._verify(init_data_raw, now)
+        if parsed is None:
+            return False, None
+
+        expires_at = now + self.cache_ttl
+        if self.max_age:
+            expires_at = min(expires_at, int(parsed['auth_date']) + self.max_age) # Never outlive the freshness window
+        with self.lock:
+            self.cache[init_data_raw] = (parsed, expires_at)
+            self.cache.move_to_end(init_data_raw)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return True, dict(parsed)
+
+
+_validator = None
+_validator_lock = threading.Lock()
+
+def get_init_data_validator(bot_token=None):
+    """Returns the process-wide validator for `bot_token` (default: TELEGRAM_BOT_TOKEN), rebuilt if the token changes."""
+    global _validator
+    bot_token = bot_token or settings.TELEGRAM_BOT_TOKEN
+    validator = _validator
+    if validator is None or validator.bot_token != bot_token:
+        with _validator_lock:
+            validator = _validator
+            if validator is None or validator.bot_token != bot_token:
+                validator = _validator = InitDataValidator(
+                    bot_token,
+                    max_age=getattr(settings, 'TELEGRAM_INIT_DATA_MAX_AGE', 86400),
+                    cache_size=getattr(settings, 'TELEGRAM_INIT_DATA_CACHE_SIZE', 10000),
+                    cache_ttl=getattr(settings, 'TELEGRAM_INIT_DATA_CACHE_TTL', 300),
+                )
+    return validator
+
+def validate_telegram_init_data(init_data_raw, bot_token=None):
+    """
+    Validates Telegram WebApp initData.
+    Returns (is_valid, parsed_data_dict)
+    """
+    return get_init_data_validator(bot_token).validate(init_data_raw)
@@ -0,0 +1,107 @@
+# apps/telegram/interaction_log.py
+"""
+Buffered writer for BotInteractionLog.
+
+Handlers build the complete log record (message, command and response) in
+memory and hand it to `log_interaction()`. Records are written with a single
+bulk_create when the buffer reaches TELEGRAM_INTERACTION_LOG_BATCH_SIZE rows
+or its oldest row is TELEGRAM_INTERACTION_LOG_MAX_AGE seconds old, and on
+process shutdown. A batch size of 1 writes every record immediately.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import BotInteractionLog
+
+logger = logging.getLogger(__name__)
+
+
+class InteractionLogBuffer:
+    """Collects unsaved BotInteractionLog instances and writes them in batches."""
+
+    def __init__(self, batch_size=100, max_age=5.0):
+        self.batch_size = max(1, batch_size)
+        self.max_age = max_age
+        self.pending = []
+        self.oldest = None
+        self.lock = threading.Lock()
+        self._timer = None
+
+    def add(self, log_entry):
+        with self.lock:
+            self.pending.append(log_entry)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            full = len(self.pending) >= self.batch_size
+            stale = time.monotonic() - self.oldest >= self.max_age
+        if full or stale:
+            self.flush()
+        else:
+            self._ensure_timer()
+
+    def _ensure_timer(self):
+        """Starts a one-shot timer so a quiet buffer is still written after max_age."""
+        with self.lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(self.max_age, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        self.flush()
+        close_old_connections() # The timer thread has its own DB connection
+
+    def flush(self):
+        """Writes all pending records. Returns the number of rows written."""
+        with self.lock:
+            batch, self.pending, self.oldest = self.pending, [], None
+        if not batch:
+            return 0
+        try:
+            BotInteractionLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception(f"Failed to write {len(batch)} buffered bot interaction log(s).")
+            return 0
+        return len(batch)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_interaction_log_buffer():
+    """Returns the process-wide interaction log buffer configured from settings."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = InteractionLogBuffer(
+                    batch_size=getattr(settings, 'TELEGRAM_INTERACTION_LOG_BATCH_SIZE', 100),
+                    max_age=getattr(settings, 'TELEGRAM_INTERACTION_LOG_MAX_AGE', 5.0),
+                )
+    return _buffer
+
+def log_interaction(telegram_user, message_text, command_used=None, response_text=None):
+    """Queues one complete BotInteractionLog row for writing."""
+    get_interaction_log_buffer().add(BotInteractionLog(
+        telegram_user=telegram_user,
+        message_text=message_text,
+        command_used=command_used,
+        response_text=response_text,
+        timestamp=timezone.now(), # Time of the interaction, not of the flush
+    ))
+
+def flush_interaction_logs(**kwargs):
+    """Writes any buffered logs; registered for interpreter and Celery worker shutdown."""
+    if _buffer is not None:
+        _buffer.flush()
+
+atexit.register(flush_interaction_logs)
+worker_process_shutdown.connect(flush_interaction_logs, weak=False)
@@ -0,0 +1,249 @@
+# apps/telegram/loadtest.py
+"""
+Replay load testing for the webhook endpoint.
+
+Traffic comes from real updates captured by the webhook (set
+TELEGRAM_CAPTURE_UPDATES_FILE and every accepted update is appended to that
+NDJSON file) or from synthesize_updates(), which mixes commands, free text
+and callback queries from new and returning users.
+
+run_replay() posts the updates to the webhook URL through Django's test
+client, in-process, at a fixed rate with a pool of worker threads. The Bot
+API is pointed at StubBotAPIServer, a local HTTP server that answers every
+method with ok=true after an optional artificial latency. Per request it
+records latency, response status and the number of SQL queries run.
+ReplayReport summarizes the results as throughput, latency percentiles,
+queries per update, Bot API calls and error rate.
+
+Used by `python manage.py replay_webhook_load`. Run it against a development
+or staging database: synthetic users and their interaction logs are written.
+"""
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from .bot_api import reset_bot_api
+from .interaction_log import flush_interaction_logs
+
+logger = logging.getLogger(__name__)
+
+_capture_lock = threading.Lock()
+
+def capture_update(raw_body):
+    """Appends one raw webhook body to TELEGRAM_CAPTURE_UPDATES_FILE."""
+    path = getattr(settings, 'TELEGRAM_CAPTURE_UPDATES_FILE', None)
+    if not path:
+        return
+    line = raw_body.replace(b'\n', b'') + b'\n' # One update per line
+    with _capture_lock:
+        with open(path, 'ab') as capture:
+            capture.write(line)
+
+def load_captured_updates(path):
+    with open(path, 'rb') as capture:
+        return [json.loads(line) for line in capture if line.strip()]
+
+
+# --- Synthetic traffic ---
+
+DEFAULT_TRAFFIC_MIX = {
+    'command': 0.45, # /start, /help, /register, unknown commands
+    'text': 0.35, # Free text (conversation state lookup + echo)
+    'callback': 0.20, # Inline button presses
+}
+SYNTHETIC_COMMANDS = ('/start', '/help', '/register', '/balance')
+SYNTHETIC_CALLBACKS = ('some_simple_action', 'approve_kyc_42', 'unknown_action')
+SYNTHETIC_LANGUAGES = ('en', 'am', 'om', None)
+
+def synthesize_updates(count, users=1000, new_user_ratio=0.1, mix=None, seed=None, first_update_id=None, first_user_id=9_000_000_000):
+    """
+    Generates `count` realistic updates. Returning users are drawn from a
+    pool of `users` ids; a `new_user_ratio` share of updates comes from ids
+    never used before. update_ids start at `first_update_id` (default:
+    derived from the clock, so repeated runs do not hit update_id dedup).
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_TRAFFIC_MIX
+    kinds, weights = zip(*mix.items())
+    update_ids = itertools.count(first_update_id or int(time.time() * 1000))
+    new_user_ids = itertools.count(first_user_id + users)
+    updates = []
+    for _ in range(count):
+        user_id = next(new_user_ids) if rng.random() < new_user_ratio else first_user_id + rng.randrange(users)
+        sender = {'id': user_id, 'is_bot': False, 'first_name': f'Load{user_id % 10000}', 'username': f'load_{user_id}'}
+        language = rng.choice(SYNTHETIC_LANGUAGES)
+        if language:
+            sender['language_code'] = language
+        chat = {'id': user_id, 'type': 'private'}
+        update_id = next(update_ids)
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'callback':
+            updates.append({'update_id': update_id, 'callback_query': {
+                'id': str(update_id), 'from': sender, 'data': rng.choice(SYNTHETIC_CALLBACKS),
+                'message': {'message_id': rng.randrange(1, 10000), 'chat': chat, 'date': int(time.time())},
+            }})
+        else:
+            text = rng.choice(SYNTHETIC_COMMANDS) if kind == 'command' else f'hello {rng.randrange(10 ** 6)}'
+            updates.append({'update_id': update_id, 'message': {
+                'message_id': rng.randrange(1, 10000), 'from': sender, 'chat': chat, 'date': int(time.time()), 'text': text,
+            }})
+    return updates
+
+
+# --- Bot API stub ---
+
+class StubBotAPIServer:
+    """Local Bot API stand-in: every method returns ok=true after `latency` seconds."""
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real API
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with stub.calls_lock:
+                    stub.calls += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps({'ok': True, 'result': {'message_id': stub.calls, 'date': int(time.time())}}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- Replay ---
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1)) # Nearest rank
+    return sorted_values[index]
+
+
+class ReplayReport:
+    """Aggregated results of one replay run."""
+
+    def __init__(self, results, elapsed, bot_api_calls):
+        self.results = results # [(latency_seconds, status_code, query_count)]
+        self.elapsed = elapsed
+        self.bot_api_calls = bot_api_calls
+
+    def as_dict(self):
+        latencies = sorted(latency * 1000 for latency, _, _ in self.results)
+        queries = sorted(query_count for _, _, query_count in self.results)
+        total = len(self.results)
+        errors = sum(1 for _, status, _ in self.results if status is None or status >= 400)
+        return {
+            'updates': total,
+            'elapsed_s': round(self.elapsed, 3),
+            'throughput_rps': round(total / self.elapsed, 2) if self.elapsed else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'max': round(latencies[-1], 2) if latencies else 0.0,
+            },
+            'queries_per_update': {
+                'avg': round(sum(queries) / total, 2) if total else 0.0,
+                'p95': percentile(queries, 0.95),
+                'max': queries[-1] if queries else 0,
+            },
+            'bot_api_calls_per_update': round(self.bot_api_calls / total, 2) if total else 0.0,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+        }
+
+
+def _post_update(client, url, update, headers):
+    queries = [0]
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_query): # connection is this worker thread's own
+            response = client.post(url, data=json.dumps(update), content_type='application/json', **headers)
+        status = response.status_code
+    except Exception:
+        logger.exception(f"Replay of update {update.get('update_id')} raised.")
+        status = None
+    return time.perf_counter() - started, status, queries[0]
+
+def run_replay(updates, url='/webhook/', rate=None, concurrency=8, stub_latency=0.0):
+    """
+    Replays `updates` against the webhook. `rate` is the target requests per
+    second (None = as fast as `concurrency` threads allow). Returns a ReplayReport.
+    """
+    headers = {}
+    secret = getattr(settings, 'TELEGRAM_WEBHOOK_SECRET', None)
+    if secret:
+        headers['HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN'] = secret
+
+    local = threading.local()
+
+    def worker(indexed_update):
+        index, update = indexed_update
+        if rate:
+            delay = started + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        try:
+            return _post_update(local.client, url, update, headers)
+        finally:
+            close_old_connections()
+
+    with StubBotAPIServer(latency=stub_latency) as stub:
+        with override_settings(TELEGRAM_API_BASE_URL=stub.base_url):
+            reset_bot_api() # The pooled client was built with the real API URL
+            try:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='tg-replay') as executor:
+                    results = list(executor.map(worker, enumerate(updates)))
+                elapsed = time.perf_counter() - started
+                flush_interaction_logs() # Leave nothing buffered once the run is over
+            finally:
+                reset_bot_api()
+        return ReplayReport(results, elapsed, stub.calls)
@@ -0,0 +1,4 @@
+# apps/telegram/locales/__init__.py
+# One module per language code (am.py, om.py, ...) using the same constant
+# names as apps/telegram/localization.py. Untranslated keys fall back to
+# English. Modules are imported on first use by apps.telegram.catalog.
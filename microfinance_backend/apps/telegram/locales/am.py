@@ -0,0 +1,47 @@
+# apps/telegram/locales/am.py
+# Amharic (አማርኛ)
+
+# General Messages
+START_MESSAGE = "እንኳን ወደ ማይክሮፋይናንስ ቦት በደህና መጡ!"
+WELCOME_BACK = "እንኳን ደህና ተመለሱ፣ {username}!"
+UNAUTHORIZED_ACCESS = "ይህን አገልግሎት ለመጠቀም ፈቃድ የለዎትም።"
+INVALID_INPUT = "ያስገቡት መረጃ ትክክል አይደለም። እባክዎ እንደገና ይሞክሩ።"
+BACK_TO_MAIN_MENU = "ወደ ዋናው ማውጫ በመመለስ ላይ።"
+OPERATION_CANCELLED = "🚫 ተግባሩ ተሰርዟል።"
+
+# Bot command replies
+BOT_START_GREETING = """ሰላም {first_name}! እንኳን ወደ ማይክሮፋይናንስ ቦት በደህና መጡ።
+የማይክሮፋይናንስ ሂሳብዎን እንዲያስተዳድሩ እረዳዎታለሁ።
+ሂሳብዎን ለማገናኘት /register ወይም ያሉትን ትዕዛዞች ለማየት /help ይጠቀሙ።"""
+BOT_HELP_TEXT = """ሊጠቀሙባቸው የሚችሉ ትዕዛዞች፦
+/start - ከቦቱ ጋር መገናኘት ይጀምሩ
+/help - ይህን የእገዛ መልዕክት ያሳያል
+/register - የማይክሮፋይናንስ ሂሳብዎን ያገናኙ እና ሚኒ አፑን ይክፈቱ
+/kyc - KYCን ለማጠናቀቅ የብሔራዊ መታወቂያ ሰነድዎን ይላኩ
+/balance - ቀሪ ሂሳብዎን ይመልከቱ (ምዝገባ ያስፈልጋል)
+/loan_status - የብድርዎን ሁኔታ ይመልከቱ (ምዝገባ ያስፈልጋል)
+/purchase_shares - አክሲዮን ይግዙ (ሚኒ አፑን ይከፍታል)
+/referrals - የሪፈራል አውታረ መረብዎን እና ኮሚሽኖችዎን ይመልከቱ
+/contact - የመገኛ መረጃ ያግኙ"""
+REGISTER_PROMPT = "ለመመዝገብ ወይም የደንበኛ ፖርታልዎን ለመክፈት ከታች ያለውን ቁልፍ ይጫኑ፦"
+REGISTER_BUTTON = "ይመዝገቡ / ፖርታሉን ይክፈቱ"
+UNKNOWN_COMMAND = "ይቅርታ፣ ያንን ትዕዛዝ አልገባኝም። የትዕዛዞችን ዝርዝር ለማየት /help ይጻፉ።"
+ECHO_MESSAGE = 'መልዕክትዎ ደርሶኛል፦ "{text}"። እገዛ ከፈለጉ /help ይጻፉ።'
+
+# Main Menu Options
+MAIN_MENU_TEXT = "እባክዎ ከታች ካለው ማውጫ አንዱን ይምረጡ፦"
+MY_PROFILE = "👤 የእኔ መገለጫ"
+CHECK_BALANCE = "💰 ቀሪ ሂሳብ ይመልከቱ"
+DEPOSIT_MONEY = "💸 ገንዘብ ያስገቡ"
+LOAN_SERVICES = "🏦 የብድር አገልግሎቶች"
+REFERRAL = "🤝 ሪፈራል"
+
+# Profile & Balance Messages
+YOUR_BALANCE = "💰 አሁን ያለዎት ቀሪ ሂሳብ፦ {balance} {currency}"
+NO_BALANCE_RECORD = "እስካሁን የሂሳብ መዝገብ የለዎትም። ቀሪ ሂሳብዎ 0.00 {currency} ነው።"
+
+# Button Labels
+APPROVE_BUTTON = "✅ አጽድቅ"
+REJECT_BUTTON = "❌ ውድቅ አድርግ"
+CONFIRM_BUTTON = "✔️ አረጋግጥ"
+CANCEL_BUTTON = "✖️ ሰርዝ"
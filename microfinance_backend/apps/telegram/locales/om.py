@@ -0,0 +1,47 @@
+# apps/telegram/locales/om.py
+# Oromo (Afaan Oromoo)
+
+# General Messages
+START_MESSAGE = "Gara Boot Maaykiroofaayinaansiitti baga nagaan dhuftan!"
+WELCOME_BACK = "Baga nagaan deebitan, {username}!"
+UNAUTHORIZED_ACCESS = "Tajaajila kana fayyadamuuf hayyama hin qabdan."
+INVALID_INPUT = "Galteen keessan sirrii miti. Maaloo irra deebi'aa yaalaa."
+BACK_TO_MAIN_MENU = "Gara baafata ijootti deebi'aa jira."
+OPERATION_CANCELLED = "🚫 Hojiin haqameera."
+
+# Bot command replies
+BOT_START_GREETING = """Akkam {first_name}! Gara Boot Maaykiroofaayinaansiitti baga nagaan dhuftan.
+Herrega maaykiroofaayinaansii keessan akka bulchitan isin gargaaruu nan danda'a.
+Herrega keessan walqabsiisuuf /register, ajajoota jiran ilaaluuf immoo /help fayyadamaa."""
+BOT_HELP_TEXT = """Ajajoota fayyadamuu dandeessan:
+/start - Boot waliin haasa'uu jalqabi
+/help - Ergaa gargaarsaa kana agarsiisi
+/register - Herrega keessan walqabsiisaa fi Mini App banaa
+/kyc - KYC xumuruuf sanada eenyummaa biyyaalessaa keessanii ergaa
+/balance - Haftee herregaa ilaalaa (galmee barbaada)
+/loan_status - Haala liqii keessanii ilaalaa (galmee barbaada)
+/purchase_shares - Aksiyoona bitaa (Mini App bana)
+/referrals - Networkii affeerraa fi komishinii keessan ilaalaa
+/contact - Odeeffannoo quunnamtii argadhaa"""
+REGISTER_PROMPT = "Galmaa'uuf ykn poortaalii maamilaa keessan banuuf furtuu armaan gadii tuqaa:"
+REGISTER_BUTTON = "Galmaa'i / Poortaalii Bani"
+UNKNOWN_COMMAND = "Dhiifama, ajaja sana hin hubanne. Tarree ajajootaa ilaaluuf /help barreessaa."
+ECHO_MESSAGE = 'Ergaan keessan na ga\'eera: "{text}". Gargaarsa yoo barbaaddan /help barreessaa.'
+
+# Main Menu Options
+MAIN_MENU_TEXT = "Maaloo filannoo armaan gadii keessaa tokko filadhaa:"
+MY_PROFILE = "👤 Piroofaayilii Koo"
+CHECK_BALANCE = "💰 Haftee Herregaa Ilaali"
+DEPOSIT_MONEY = "💸 Maallaqa Galchi"
+LOAN_SERVICES = "🏦 Tajaajila Liqii"
+REFERRAL = "🤝 Affeerraa"
+
+# Profile & Balance Messages
+YOUR_BALANCE = "💰 Haftee herrega keessanii ammaa: {balance} {currency}"
+NO_BALANCE_RECORD = "Ammaaf galmee haftee herregaa hin qabdan. Hafteen keessan 0.00 {currency} dha."
+
+# Button Labels
+APPROVE_BUTTON = "✅ Raggaasisi"
+REJECT_BUTTON = "❌ Didi"
+CONFIRM_BUTTON = "✔️ Mirkaneessi"
+CANCEL_BUTTON = "✖️ Haqi"
@@ -1,4 +1,7 @@
 # apps/telegram/localization.py
+# English messages; also the fallback for any key missing from a translation
+# in apps/telegram/locales/. Look messages up through apps.telegram.catalog so
+# users get their own language.
 
 # Bot-wide
 BOT_USERNAME = "@YourMicrofinanceBot" # REMEMBER TO REPLACE THIS WITH YOUR BOT'S ACTUAL USERNAME
@@ -13,6 +16,26 @@ BACK_TO_MAIN_MENU = "Returning to main menu."
 OPERATION_CANCELLED = "🚫 Operation Cancelled."
 FEATURE_UNDER_DEVELOPMENT = "🚧 This feature is currently under development. Please check back later!"
 
+# Bot command replies
+BOT_START_GREETING = """Hello {first_name}! Welcome to the Microfinance Bot.
+I can help you manage your microfinance account.
+Use /register to link your account or /help to see available commands."""
+BOT_HELP_TEXT = """Here are the commands you can use:
+/start - Start interacting with the bot
+/help - Show this help message
+/register - Link your microfinance account and access the Mini App
+/kyc - Send your National ID document to complete KYC
+/balance - Check your account balance (requires registration)
+/loan_status - Check your loan status (requires registration)
+/purchase_shares - Buy shares (opens Mini App)
+/referrals - View your referral network and commissions
+/contact - Get contact information"""
+REGISTER_PROMPT = "Tap the button below to register or access your customer portal:"
+REGISTER_BUTTON = "Register / Open Portal"
+UNKNOWN_COMMAND = "Sorry, I don't understand that command. Type /help for a list of commands."
+ECHO_MESSAGE = 'I received your message: "{text}". If you need help, type /help.'
+SIMPLE_BUTTON_PRESSED = "You pressed a simple button!"
+
 # Main Menu Options
 MAIN_MENU_TEXT = "Please choose an option from the menu below:"
 CUSTOMER_MENU_TEXT = "Customer Menu" # <--- This line is definitely here
@@ -44,6 +67,9 @@ KYC_APPROVED_SUCCESS = "🎉 Your KYC has been approved! You can now access all
 KYC_REJECTED_MESSAGE = "❌ Your KYC application has been rejected. Please contact support for more details."
 KYC_ALREADY_APPROVED = "Your KYC is already approved! You can use all customer features."
 KYC_PROFILE_EXISTS = "You already have a pending or approved KYC profile."
+REQUEST_ID_DOCUMENT = "Please send a clear photo of your National ID document."
+ID_DOCUMENT_TOO_LARGE = "That file is too large. Please send a photo of your ID under 20 MB."
+KYC_PROFILE_MISSING = "Please submit your KYC details before sending your ID document."
 
 # Staff-Assisted Registration Flow Messages
 STAFF_REGISTER_START = "Initiating new customer registration. Please provide the following details for the new customer."
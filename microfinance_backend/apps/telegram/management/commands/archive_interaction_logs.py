@@ -0,0 +1,28 @@
+# apps/telegram/management/commands/archive_interaction_logs.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.telegram.retention import archive_dir, archive_interaction_logs, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = "Moves BotInteractionLog rows older than the retention period into compressed daily archive files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'TELEGRAM_INTERACTION_LOG_RETENTION_DAYS', 90),
+                            help="Keep this many days of interactions in the database.")
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'TELEGRAM_INTERACTION_ARCHIVE_CHUNK_SIZE', 2000),
+                            help="Rows archived and deleted per batch.")
+        parser.add_argument('--archive-dir', default=None, help="Defaults to settings.TELEGRAM_INTERACTION_ARCHIVE_DIR.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would be archived.")
+
+    def handle(self, *args, **options):
+        root = options['archive_dir'] or archive_dir()
+        cutoff = retention_cutoff(options['days'])
+        count = archive_interaction_logs(
+            days=options['days'], chunk_size=options['chunk_size'], root=root, dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{count} interaction(s) before {cutoff:%Y-%m-%d} would be archived to {root}.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Archived {count} interaction(s) before {cutoff:%Y-%m-%d} to {root}."))
@@ -0,0 +1,48 @@
+# apps/telegram/management/commands/query_interaction_archive.py
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.telegram.retention import archive_dir, iter_archived_interactions
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Searches archived bot interactions (see archive_interaction_logs) without touching the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First UTC day to search (YYYY-MM-DD).")
+        parser.add_argument('--until', help="Last UTC day to search (YYYY-MM-DD).")
+        parser.add_argument('--user', type=int, help="Telegram user ID.")
+        parser.add_argument('--command', help="Command used, e.g. /start.")
+        parser.add_argument('--contains', help="Case-insensitive text in the message or response.")
+        parser.add_argument('--limit', type=int, default=0, help="Stop after this many matches (0 = no limit).")
+        parser.add_argument('--count', action='store_true', help="Only print the number of matches.")
+        parser.add_argument('--archive-dir', default=None, help="Defaults to settings.TELEGRAM_INTERACTION_ARCHIVE_DIR.")
+
+    def handle(self, *args, **options):
+        matches = iter_archived_interactions(
+            since=_date(options['since']) if options['since'] else None,
+            until=_date(options['until']) if options['until'] else None,
+            telegram_user_id=options['user'],
+            command=options['command'],
+            contains=options['contains'],
+            root=options['archive_dir'] or archive_dir(),
+        )
+        found = 0
+        for row in matches:
+            found += 1
+            if not options['count']:
+                row['timestamp'] = row['timestamp'].isoformat()
+                self.stdout.write(json.dumps(row, ensure_ascii=False))
+            if options['limit'] and found >= options['limit']:
+                break
+        if options['count']:
+            self.stdout.write(str(found))
@@ -0,0 +1,61 @@
+# apps/telegram/management/commands/replay_webhook_load.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.telegram.loadtest import load_captured_updates, run_replay, synthesize_updates
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays captured or synthetic Telegram updates against the webhook with the Bot API stubbed out, "
+        "and reports latency percentiles, throughput, SQL queries and errors. Writes to the configured "
+        "database: use a development or staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="NDJSON updates captured via TELEGRAM_CAPTURE_UPDATES_FILE.")
+        parser.add_argument('--keep-update-ids', action='store_true',
+                            help="Replay captured update_ids as-is (they will be dropped as duplicates if seen before).")
+        parser.add_argument('--count', type=int, default=1000, help="Synthetic updates to generate when --file is not given.")
+        parser.add_argument('--users', type=int, default=1000, help="Returning users in the synthetic pool.")
+        parser.add_argument('--new-user-ratio', type=float, default=0.1, help="Share of synthetic updates from first-time users.")
+        parser.add_argument('--seed', type=int, help="Random seed for reproducible synthetic traffic.")
+        parser.add_argument('--rate', type=float, default=None, help="Target requests per second (default: unthrottled).")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent requests in flight.")
+        parser.add_argument('--stub-latency', type=float, default=0.05, help="Seconds the stub Bot API waits per call.")
+        parser.add_argument('--url', default='/webhook/', help="Webhook path.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                updates = load_captured_updates(options['file'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['file']}: {e}")
+            if not options['keep_update_ids']:
+                synthetic_ids = synthesize_updates(len(updates), users=1)
+                for update, synthetic in zip(updates, synthetic_ids):
+                    update['update_id'] = synthetic['update_id']
+        else:
+            updates = synthesize_updates(
+                options['count'], users=options['users'], new_user_ratio=options['new_user_ratio'], seed=options['seed'],
+            )
+        if not updates:
+            raise CommandError("No updates to replay.")
+
+        report = run_replay(
+            updates, url=options['url'], rate=options['rate'],
+            concurrency=options['concurrency'], stub_latency=options['stub_latency'],
+        ).as_dict()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        latency, queries = report['latency_ms'], report['queries_per_update']
+        self.stdout.write(f"Updates:      {report['updates']} in {report['elapsed_s']}s ({report['throughput_rps']} req/s)")
+        self.stdout.write(f"Latency ms:   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+        self.stdout.write(f"SQL/update:   avg {queries['avg']}  p95 {queries['p95']}  max {queries['max']}")
+        self.stdout.write(f"Bot API/upd:  {report['bot_api_calls_per_update']}")
+        style = self.style.ERROR if report['errors'] else self.style.SUCCESS
+        self.stdout.write(style(f"Errors:       {report['errors']} ({report['error_rate']:.2%})"))
@@ -0,0 +1,46 @@
+# apps/telegram/management/commands/run_telegram_polling.py
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.telegram.polling import DEFAULT_ALLOWED_UPDATES, UpdatePoller
+
+
+class Command(BaseCommand):
+    help = (
+        "Receives bot updates with getUpdates long polling instead of the webhook. "
+        "Removes any configured webhook first; run only one instance per bot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'TELEGRAM_POLLING_WORKERS', 4),
+                            help="Threads handling updates concurrently (one user's updates stay in order).")
+        parser.add_argument('--timeout', type=int, default=getattr(settings, 'TELEGRAM_POLLING_TIMEOUT', 30),
+                            help="Long-poll timeout in seconds.")
+        parser.add_argument('--limit', type=int, default=100, help="Updates per getUpdates batch (max 100).")
+        parser.add_argument('--allowed-updates', default=','.join(DEFAULT_ALLOWED_UPDATES),
+                            help="Comma-separated update types to receive.")
+        parser.add_argument('--drop-pending', action='store_true',
+                            help="Discard updates that queued up while the bot was offline.")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the pending backlog and exit instead of polling forever.")
+
+    def handle(self, *args, **options):
+        poller = UpdatePoller(
+            workers=options['workers'],
+            timeout=options['timeout'],
+            limit=options['limit'],
+            allowed_updates=[kind.strip() for kind in options['allowed_updates'].split(',') if kind.strip()],
+        )
+        poller.prepare(drop_pending_updates=options['drop_pending'])
+        # Finish the current batch and confirm its offset before exiting
+        signal.signal(signal.SIGINT, poller.stop)
+        signal.signal(signal.SIGTERM, poller.stop)
+
+        self.stdout.write(f"Polling for updates with {poller.workers} worker(s). Press Ctrl+C to stop.")
+        stats = poller.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped after {stats['batches']} batch(es): {stats['received']} update(s) received, "
+            f"{stats['handled']} handled."
+        ))
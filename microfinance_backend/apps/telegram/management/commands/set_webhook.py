@@ -0,0 +1,51 @@
+# apps/telegram/management/commands/set_webhook.py
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.telegram.bot_api import BotAPIError, get_bot_api
+from apps.telegram.polling import DEFAULT_ALLOWED_UPDATES
+
+
+def webhook_params(url, drop_pending_updates=False, allowed_updates=DEFAULT_ALLOWED_UPDATES):
+    """setWebhook parameters; includes TELEGRAM_WEBHOOK_SECRET so the webhook view accepts the updates."""
+    params = {
+        'url': url,
+        'allowed_updates': json.dumps(list(allowed_updates)),
+        'drop_pending_updates': drop_pending_updates,
+    }
+    secret = getattr(settings, 'TELEGRAM_WEBHOOK_SECRET', None)
+    if secret:
+        params['secret_token'] = secret
+    return params
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers the bot's webhook with Telegram, sending TELEGRAM_WEBHOOK_SECRET as the "
+        "secret token when it is set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?', default=getattr(settings, 'TELEGRAM_WEBHOOK_URL', None),
+                            help="Public HTTPS URL of the webhook view (defaults to TELEGRAM_WEBHOOK_URL).")
+        parser.add_argument('--allowed-updates', default=','.join(DEFAULT_ALLOWED_UPDATES),
+                            help="Comma-separated update types to receive.")
+        parser.add_argument('--drop-pending', action='store_true',
+                            help="Discard updates that queued up while no webhook was set.")
+
+    def handle(self, *args, **options):
+        if not options['url']:
+            raise CommandError("Pass the webhook URL or set TELEGRAM_WEBHOOK_URL.")
+        params = webhook_params(
+            options['url'],
+            drop_pending_updates=options['drop_pending'],
+            allowed_updates=[kind.strip() for kind in options['allowed_updates'].split(',') if kind.strip()],
+        )
+        try:
+            get_bot_api().call('setWebhook', params)
+        except BotAPIError as e:
+            raise CommandError(f"Failed to set webhook: {e}")
+        secured = "with" if 'secret_token' in params else "WITHOUT"
+        self.stdout.write(self.style.SUCCESS(f"Webhook set to {options['url']} {secured} a secret token."))
@@ -1,91 +1,132 @@
 # apps/telegram/menus.py
-from telegram import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from .localization import (
-    MAIN_MENU_TEXT, CUSTOMER_MENU_TEXT, STAFF_MENU_TEXT, AUDITOR_MENU_TEXT,
-    MY_PROFILE, CHECK_BALANCE, DEPOSIT_MONEY, LOAN_SERVICES, REFERRAL,
-    REGISTER_NEW_CUSTOMER, VIEW_PENDING_DEPOSITS, VIEW_CUSTOMER_LIST,
-    REVIEW_PENDING_KYC, REVIEW_PENDING_DEPOSITS, # Make sure these are in localization.py
-    REVIEW_STAFF_REGISTRATIONS, VIEW_ALL_USERS,
-    APPROVE_BUTTON, REJECT_BUTTON, CONFIRM_BUTTON, CANCEL_BUTTON,
-    OPERATION_CANCELLED # Ensure OPERATION_CANCELLED is here
-)
-
-def get_main_menu(user_obj):
+"""
+Keyboards sent with bot replies.
+
+Keyboards are described once as plain data and serialized to the JSON string
+the Bot API expects the first time they are needed; after that every reply
+reuses the cached string, keyed by (menu, role, language), so sending a menu
+costs no object building or json.dumps. Keyboards with a per-message value
+(e.g. the user being reviewed) are cached as a pre-serialized template that
+is filled in with a string join.
+
+The returned strings can be passed as `reply_markup` to send_telegram_message,
+edit_telegram_message and OutboundMessage unchanged.
+"""
+import json
+import threading
+
+from .catalog import get_catalog
+
+# Stands in for the per-message value inside a keyboard template
+PARAM_PLACEHOLDER = '%PARAM%'
+
+# Menu layouts: rows of message catalog keys (reply keyboards) or
+# (label constant, callback_data) pairs (inline keyboards)
+REPLY_MENUS = {
+    'customer': [
+        ['MY_PROFILE', 'CHECK_BALANCE'],
+        ['DEPOSIT_MONEY', 'LOAN_SERVICES'],
+        ['REFERRAL'],
+    ],
+    'staff': [
+        ['REGISTER_NEW_CUSTOMER'],
+        ['VIEW_PENDING_DEPOSITS', 'VIEW_CUSTOMER_LIST'],
+        ['MY_PROFILE', 'CHECK_BALANCE'], # Staff can also use customer features
+    ],
+    'auditor': [
+        ['REVIEW_PENDING_KYC', 'REVIEW_PENDING_DEPOSITS'],
+        ['REVIEW_STAFF_REGISTRATIONS', 'VIEW_ALL_USERS'],
+        ['MY_PROFILE', 'CHECK_BALANCE'], # Auditors can also use customer features
+    ],
+}
+
+INLINE_MENUS = {
+    'yes_no': [[('CONFIRM_BUTTON', 'yes'), ('CANCEL_BUTTON', 'no')]],
+    'confirm_cancel': [[('CONFIRM_BUTTON', 'confirm'), ('CANCEL_BUTTON', 'cancel_operation')]],
+    # Templates: PARAM_PLACEHOLDER is replaced per message
+    'kyc_review': [[('APPROVE_BUTTON', f'approve_kyc_{PARAM_PLACEHOLDER}'), ('REJECT_BUTTON', f'reject_kyc_{PARAM_PLACEHOLDER}')]],
+    'deposit_review': [[('APPROVE_BUTTON', f'approve_deposit_{PARAM_PLACEHOLDER}'), ('REJECT_BUTTON', f'reject_deposit_{PARAM_PLACEHOLDER}')]],
+}
+
+
+def _label(name, language):
+    return get_catalog().get(name, language)
+
+def build_markup(menu, role=None, language=None):
+    """Builds the markup dict for a menu. Only called on a cache miss."""
+    if menu in REPLY_MENUS:
+        keyboard = [[{'text': _label(name, language)} for name in row] for row in REPLY_MENUS[menu]]
+        return {'keyboard': keyboard, 'resize_keyboard': True, 'one_time_keyboard': False}
+    keyboard = [
+        [{'text': _label(name, language), 'callback_data': callback_data} for name, callback_data in row]
+        for row in INLINE_MENUS[menu]
+    ]
+    return {'inline_keyboard': keyboard}
+
+
+_markup_cache = {}
+_markup_cache_lock = threading.Lock()
+
+def get_markup_json(menu, role=None, language=None):
+    """Returns the serialized markup for (menu, role, language), building it once per process."""
+    key = (menu, role, get_catalog().normalize(language))
+    markup = _markup_cache.get(key)
+    if markup is None:
+        with _markup_cache_lock:
+            markup = _markup_cache.get(key)
+            if markup is None:
+                markup = _markup_cache[key] = json.dumps(build_markup(menu, role, language), ensure_ascii=False, separators=(',', ':'))
+    return markup
+
+def render_markup_template(menu, value, role=None, language=None):
+    """Fills a templated keyboard's placeholder with `value`."""
+    key = ('template', menu, role, get_catalog().normalize(language))
+    parts = _markup_cache.get(key)
+    if parts is None:
+        parts = _markup_cache[key] = get_markup_json(menu, role, language).split(PARAM_PLACEHOLDER)
+    return json.dumps(str(value))[1:-1].join(parts) # Escaped as it would be inside a JSON string
+
+def clear_markup_cache():
+    """Drops all cached keyboards, e.g. after changing menu labels."""
+    with _markup_cache_lock:
+        _markup_cache.clear()
+
+
+def get_main_menu(user_obj, language=None):
     """Returns the main menu based on user roles."""
     # Ensure user_obj has these attributes. This is a defensive check.
     if hasattr(user_obj, 'is_auditor') and user_obj.is_auditor:
-        return get_auditor_menu()
+        return get_auditor_menu(language)
     elif hasattr(user_obj, 'is_staff') and user_obj.is_staff:
-        return get_staff_menu()
+        return get_staff_menu(language)
     else:
-        return get_customer_menu()
+        return get_customer_menu(language)
 
-def get_customer_menu():
+def get_customer_menu(language=None):
     """Returns the keyboard for regular customers."""
-    keyboard = [
-        [KeyboardButton(MY_PROFILE), KeyboardButton(CHECK_BALANCE)],
-        [KeyboardButton(DEPOSIT_MONEY), KeyboardButton(LOAN_SERVICES)],
-        [KeyboardButton(REFERRAL)]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
+    return get_markup_json('customer', 'customer', language)
 
-def get_staff_menu():
+def get_staff_menu(language=None):
     """Returns the keyboard for staff members."""
-    keyboard = [
-        [KeyboardButton(REGISTER_NEW_CUSTOMER)],
-        [KeyboardButton(VIEW_PENDING_DEPOSITS), KeyboardButton(VIEW_CUSTOMER_LIST)],
-        [KeyboardButton(MY_PROFILE), KeyboardButton(CHECK_BALANCE)] # Staff can also use customer features
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
+    return get_markup_json('staff', 'staff', language)
 
-def get_auditor_menu():
+def get_auditor_menu(language=None):
     """Returns the keyboard for auditors."""
     # This is the "approve menu" from a main menu perspective
-    keyboard = [
-        [KeyboardButton(REVIEW_PENDING_KYC), KeyboardButton(REVIEW_PENDING_DEPOSITS)],
-        [KeyboardButton(REVIEW_STAFF_REGISTRATIONS), KeyboardButton(VIEW_ALL_USERS)],
-        [KeyboardButton(MY_PROFILE), KeyboardButton(CHECK_BALANCE)] # Auditors can also use customer features
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
+    return get_markup_json('auditor', 'auditor', language)
 
-def get_yes_no_keyboard():
+def get_yes_no_keyboard(language=None):
     """Returns an inline keyboard with Yes/No options for confirmation."""
-    keyboard = [
-        [
-            InlineKeyboardButton(CONFIRM_BUTTON, callback_data='yes'),
-            InlineKeyboardButton(CANCEL_BUTTON, callback_data='no')
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return get_markup_json('yes_no', language=language)
 
-def get_confirm_cancel_keyboard():
+def get_confirm_cancel_keyboard(language=None):
     """Returns an inline keyboard with Confirm/Cancel options."""
-    keyboard = [
-        [
-            InlineKeyboardButton(CONFIRM_BUTTON, callback_data='confirm'),
-            InlineKeyboardButton(CANCEL_BUTTON, callback_data='cancel_operation')
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return get_markup_json('confirm_cancel', language=language)
 
-def get_kyc_review_keyboard(user_id):
+def get_kyc_review_keyboard(user_id, language=None):
     """Returns an inline keyboard for approving/rejecting KYC."""
-    # These are the actual "Approve/Reject" buttons for KYC
-    keyboard = [
-        [
-            InlineKeyboardButton(APPROVE_BUTTON, callback_data=f'approve_kyc_{user_id}'),
-            InlineKeyboardButton(REJECT_BUTTON, callback_data=f'reject_kyc_{user_id}')
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return render_markup_template('kyc_review', user_id, language=language)
 
-def get_deposit_review_keyboard(transaction_id):
+def get_deposit_review_keyboard(transaction_id, language=None):
     """Returns an inline keyboard for approving/rejecting deposits."""
-    # These are the actual "Approve/Reject" buttons for Deposits
-    keyboard = [
-        [
-            InlineKeyboardButton(APPROVE_BUTTON, callback_data=f'approve_deposit_{transaction_id}'),
-            InlineKeyboardButton(REJECT_BUTTON, callback_data=f'reject_deposit_{transaction_id}')
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
+    return render_markup_template('deposit_review', transaction_id, language=language)
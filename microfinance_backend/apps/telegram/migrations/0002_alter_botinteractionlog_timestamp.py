@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='botinteractionlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Timestamp of the interaction.'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0002_alter_botinteractionlog_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('user_id', models.BigIntegerField(help_text='Telegram user ID.', primary_key=True, serialize=False)),
+                ('state', models.PositiveSmallIntegerField(help_text='One of the STATE_* constants in apps/telegram/states.py.')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='When the user is considered to have abandoned the flow.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Conversation State',
+                'verbose_name_plural': 'Conversation States',
+            },
+        ),
+    ]
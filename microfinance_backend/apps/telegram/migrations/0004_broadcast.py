@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0003_conversationstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Internal name of the broadcast.', max_length=255)),
+                ('text', models.TextField(help_text='Message text (HTML parse mode).')),
+                ('reply_markup', models.JSONField(blank=True, help_text='Optional inline keyboard.', null=True)),
+                ('segment', models.CharField(choices=[('ALL', 'All Telegram users'), ('UNREGISTERED', 'Not linked to an account'), ('NOT_KYC_VERIFIED', 'Not KYC verified'), ('ROLE', 'Linked users with a role')], default='ALL', max_length=20)),
+                ('segment_role', models.CharField(blank=True, help_text="Role to target when segment is 'Linked users with a role'.", max_length=20, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('PAUSED', 'Paused'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], db_index=True, default='PENDING', max_length=20)),
+                ('cursor', models.BigIntegerField(default=0, help_text='Last recipient user_id checkpointed.')),
+                ('total_recipients', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('throughput', models.FloatField(default=0, help_text='Messages per second during the latest run.')),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='A worker owns the job until this time; used to resume after a worker dies.', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_checkpoint_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='telegram_broadcasts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Broadcast Job',
+                'verbose_name_plural': 'Broadcast Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_user_id', models.BigIntegerField()),
+                ('delivered', models.BooleanField()),
+                ('message_id', models.BigIntegerField(blank=True, help_text='Telegram message_id when delivered.', null=True)),
+                ('error', models.CharField(blank=True, max_length=255, null=True)),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='telegram.broadcastjob')),
+            ],
+            options={
+                'verbose_name': 'Broadcast Recipient',
+                'verbose_name_plural': 'Broadcast Recipients',
+                'constraints': [models.UniqueConstraint(fields=('job', 'telegram_user_id'), name='unique_broadcast_recipient')],
+            },
+        ),
+    ]
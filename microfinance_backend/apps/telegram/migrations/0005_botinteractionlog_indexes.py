@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0004_broadcast'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='botinteractionlog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, help_text='Timestamp of the interaction.'),
+        ),
+        migrations.AddIndex(
+            model_name='botinteractionlog',
+            index=models.Index(fields=['telegram_user', '-timestamp'], name='botlog_user_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0005_botinteractionlog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InteractionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('HOUR', 'Hour'), ('DAY', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField(help_text='Start of the hour or day (project time zone).')),
+                ('command_used', models.CharField(blank=True, default='', help_text='Command used; empty for plain messages.', max_length=100)),
+                ('language', models.CharField(help_text='Reply language of the user.', max_length=10)),
+                ('is_new_user', models.BooleanField(help_text="Interaction within 24 hours of the user's first contact.")),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Interaction Rollup',
+                'verbose_name_plural': 'Interaction Rollups',
+                'ordering': ['-period_start'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'command_used', 'language', 'is_new_user'), name='unique_interaction_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0006_interaction_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_unique_id', models.CharField(help_text='Stable Telegram id of the file.', max_length=64, unique=True)),
+                ('file_id', models.CharField(help_text='Telegram file_id it was downloaded with.', max_length=255)),
+                ('file_size', models.PositiveIntegerField(blank=True, null=True)),
+                ('mime_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('stored_name', models.CharField(help_text='Name of the copy in the default storage.', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Telegram File',
+                'verbose_name_plural': 'Telegram Files',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0008_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcastjob',
+            name='lease_owner',
+            field=models.CharField(blank=True, help_text='Token of the worker holding the lease; checkpoints from any other worker are refused.', max_length=32, null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from apps.CustomUser.models import CustomUser # Import your CustomUser model
 
@@ -86,7 +87,9 @@ class BotInteractionLog(models.Model):
         help_text=_("The text of the bot's response.")
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now, # Set when the interaction happens; logs are written in batches later
+        editable=False,
+        db_index=True, # Admin ordering and retention.py's cutoff scans
         help_text=_("Timestamp of the interaction.")
     )
 
@@ -97,3 +100,237 @@ class BotInteractionLog(models.Model):
         verbose_name = _("Bot Interaction Log")
         verbose_name_plural = _("Bot Interaction Logs")
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['telegram_user', '-timestamp'], name='botlog_user_timestamp_idx'),
+        ]
+
+class ConversationState(models.Model):
+    """
+    Where a Telegram user is in a multi-step bot flow (see states.py).
+    Rows past expires_at are ignored and removed by purge_expired_states().
+    """
+    user_id = models.BigIntegerField(
+        primary_key=True,
+        help_text=_("Telegram user ID.")
+    )
+    state = models.PositiveSmallIntegerField(
+        help_text=_("One of the STATE_* constants in apps/telegram/states.py.")
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text=_("When the user is considered to have abandoned the flow.")
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.state}"
+
+    class Meta:
+        verbose_name = _("Conversation State")
+        verbose_name_plural = _("Conversation States")
+
+class BroadcastJob(models.Model):
+    """
+    A message sent to every TelegramUser in a segment (see broadcast.py).
+    Recipients are walked in user_id order; `cursor` is the last user_id
+    whose result has been checkpointed, so a restarted job resumes after it.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_PAUSED = 'PAUSED'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_CANCELLED = 'CANCELLED'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_RUNNING, _('Running')),
+        (STATUS_PAUSED, _('Paused')),
+        (STATUS_COMPLETED, _('Completed')),
+        (STATUS_CANCELLED, _('Cancelled')),
+    ]
+
+    SEGMENT_ALL = 'ALL'
+    SEGMENT_UNREGISTERED = 'UNREGISTERED'
+    SEGMENT_NOT_KYC_VERIFIED = 'NOT_KYC_VERIFIED'
+    SEGMENT_ROLE = 'ROLE'
+    SEGMENT_CHOICES = [
+        (SEGMENT_ALL, _('All Telegram users')),
+        (SEGMENT_UNREGISTERED, _('Not linked to an account')),
+        (SEGMENT_NOT_KYC_VERIFIED, _('Not KYC verified')),
+        (SEGMENT_ROLE, _('Linked users with a role')),
+    ]
+
+    name = models.CharField(max_length=255, help_text=_("Internal name of the broadcast."))
+    text = models.TextField(help_text=_("Message text (HTML parse mode)."))
+    reply_markup = models.JSONField(blank=True, null=True, help_text=_("Optional inline keyboard."))
+    segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES, default=SEGMENT_ALL)
+    segment_role = models.CharField(
+        max_length=20,
+        blank=True,
+        null=True,
+        help_text=_("Role to target when segment is 'Linked users with a role'.")
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    cursor = models.BigIntegerField(default=0, help_text=_("Last recipient user_id checkpointed."))
+    total_recipients = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    throughput = models.FloatField(default=0, help_text=_("Messages per second during the latest run."))
+    lease_expires_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text=_("A worker owns the job until this time; used to resume after a worker dies.")
+    )
+    lease_owner = models.CharField(
+        max_length=32,
+        blank=True,
+        null=True,
+        help_text=_("Token of the worker holding the lease; checkpoints from any other worker are refused.")
+    )
+    created_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='telegram_broadcasts'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_checkpoint_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def processed_count(self):
+        return self.sent_count + self.failed_count
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()}: {self.processed_count}/{self.total_recipients})"
+
+    class Meta:
+        verbose_name = _("Broadcast Job")
+        verbose_name_plural = _("Broadcast Jobs")
+        ordering = ['-created_at']
+
+class BroadcastRecipient(models.Model):
+    """Delivery result for one recipient of a BroadcastJob."""
+    job = models.ForeignKey(BroadcastJob, on_delete=models.CASCADE, related_name='recipients')
+    telegram_user_id = models.BigIntegerField()
+    delivered = models.BooleanField()
+    message_id = models.BigIntegerField(blank=True, null=True, help_text=_("Telegram message_id when delivered."))
+    error = models.CharField(max_length=255, blank=True, null=True)
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.job_id} -> {self.telegram_user_id}: {'delivered' if self.delivered else 'failed'}"
+
+    class Meta:
+        verbose_name = _("Broadcast Recipient")
+        verbose_name_plural = _("Broadcast Recipients")
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'telegram_user_id'], name='unique_broadcast_recipient'),
+        ]
+
+class InteractionRollup(models.Model):
+    """
+    Pre-aggregated BotInteractionLog counts per hour or day, maintained
+    incrementally by apps/telegram/rollups.py.
+    """
+    PERIOD_HOUR = 'HOUR'
+    PERIOD_DAY = 'DAY'
+    PERIOD_CHOICES = [
+        (PERIOD_HOUR, _('Hour')),
+        (PERIOD_DAY, _('Day')),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateTimeField(help_text=_("Start of the hour or day (project time zone)."))
+    command_used = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        help_text=_("Command used; empty for plain messages.")
+    )
+    language = models.CharField(max_length=10, help_text=_("Reply language of the user."))
+    is_new_user = models.BooleanField(help_text=_("Interaction within 24 hours of the user's first contact."))
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.period_start:%Y-%m-%d %H:%M} {self.command_used or '-'} {self.language}: {self.count}"
+
+    class Meta:
+        verbose_name = _("Interaction Rollup")
+        verbose_name_plural = _("Interaction Rollups")
+        ordering = ['-period_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'command_used', 'language', 'is_new_user'],
+                name='unique_interaction_rollup',
+            ),
+        ]
+
+class RollupCheckpoint(models.Model):
+    """High-water mark of a rollup: the last source row id already counted."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+class TelegramFile(models.Model):
+    """
+    A file sent to the bot and copied into Django storage, keyed by Telegram's
+    file_unique_id so the same upload is never downloaded twice.
+    """
+    file_unique_id = models.CharField(max_length=64, unique=True, help_text=_("Stable Telegram id of the file."))
+    file_id = models.CharField(max_length=255, help_text=_("Telegram file_id it was downloaded with."))
+    file_size = models.PositiveIntegerField(blank=True, null=True)
+    mime_type = models.CharField(max_length=100, blank=True, null=True)
+    stored_name = models.CharField(max_length=255, help_text=_("Name of the copy in the default storage."))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file_unique_id} -> {self.stored_name}"
+
+    class Meta:
+        verbose_name = _("Telegram File")
+        verbose_name_plural = _("Telegram Files")
+
+class OutboxMessage(models.Model):
+    """
+    A Telegram message written in the same transaction as the change that
+    caused it and delivered afterwards by apps/telegram/outbox.py.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_SENT = 'SENT'
+    STATUS_DEAD = 'DEAD'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_SENT, _('Sent')),
+        (STATUS_DEAD, _('Dead-lettered')),
+    ]
+
+    chat_id = models.BigIntegerField()
+    text = models.TextField()
+    reply_markup = models.TextField(blank=True, null=True, help_text=_("Serialized reply markup JSON."))
+    parse_mode = models.CharField(max_length=20, blank=True, default='HTML')
+    priority = models.PositiveSmallIntegerField(default=0, help_text=_("Outbound lane, lowest is sent first."))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        help_text=_("Not sent before this time (retry backoff, or a worker's claim on the row).")
+    )
+    last_error = models.CharField(max_length=255, blank=True, null=True)
+    telegram_message_id = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Outbox #{self.pk} to {self.chat_id} ({self.status})"
+
+    class Meta:
+        verbose_name = _("Outbox Message")
+        verbose_name_plural = _("Outbox Messages")
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
@@ -0,0 +1,287 @@
+# apps/telegram/outbound.py
+"""
+Rate-limited outbound message dispatcher.
+
+Telegram allows roughly 30 messages/second overall and about 1 message/second
+to the same chat; going faster produces 429 responses with a `retry_after`
+hint. The dispatcher keeps a global token bucket plus one bucket per chat,
+sends higher-priority lanes (transactional) before lower ones (marketing) and
+re-queues messages that Telegram asked us to retry later, keeping each
+chat's messages in the order they were submitted.
+
+Mass sends should go through `queue_outbound_messages()`, which hands
+batches to a Celery worker. Run that queue on a single worker process so that all
+sends share the same buckets, e.g.:
+
+    celery -A microfinance_backend.celery worker -Q telegram_outbound -P threads -c 4
+"""
+import collections
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .bot_api import BotAPIError, get_bot_api
+from .telegram_utils import serialize_markup
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lowest value is sent first
+PRIORITY_TRANSACTIONAL = 0 # Approvals, deposit confirmations, direct replies
+PRIORITY_NOTIFICATION = 1 # Reminders such as token expiry warnings
+PRIORITY_MARKETING = 2 # Broadcasts and promotions
+PRIORITY_LANES = (PRIORITY_TRANSACTIONAL, PRIORITY_NOTIFICATION, PRIORITY_MARKETING)
+
+# Errors that will not go away by retrying (bot blocked, chat not found, bad request)
+PERMANENT_ERROR_CODES = (400, 401, 403, 404)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Seconds until one token is available (0 if available now)."""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self, now=None):
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds, now=None):
+        """Pauses the bucket, used when Telegram returns retry_after."""
+        now = now if now is not None else time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+
+
+class RateLimiter:
+    """
+    Global + per-chat token buckets shared by every dispatcher in the process.
+    Thread-safe, so a threaded Celery worker can run several batches at once.
+    """
+
+    def __init__(self, global_rate=30, per_chat_rate=1, max_tracked_chats=10000):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_tracked_chats = max_tracked_chats
+        self.chat_buckets = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, capacity=1)
+            self.chat_buckets[chat_id] = bucket
+            if len(self.chat_buckets) > self.max_tracked_chats:
+                self.chat_buckets.popitem(last=False) # Forget the least recently used chat
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def chat_delay(self, chat_id, now=None):
+        with self.lock:
+            return self._chat_bucket(chat_id).delay(now)
+
+    def try_acquire(self, chat_id):
+        """
+        Takes a global and a per-chat token if both are available.
+        Returns 0 on success, otherwise the number of seconds to wait.
+        """
+        with self.lock:
+            now = time.monotonic()
+            chat_bucket = self._chat_bucket(chat_id)
+            wait = max(self.global_bucket.delay(now), chat_bucket.delay(now))
+            if wait > 0:
+                return wait
+            self.global_bucket.consume(now)
+            chat_bucket.consume(now)
+            return 0.0
+
+    def block_chat(self, chat_id, seconds):
+        with self.lock:
+            self._chat_bucket(chat_id).block(seconds)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Returns the process-wide rate limiter configured from settings."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    global_rate=getattr(settings, 'TELEGRAM_OUTBOUND_GLOBAL_RATE', 30),
+                    per_chat_rate=getattr(settings, 'TELEGRAM_OUTBOUND_PER_CHAT_RATE', 1),
+                )
+    return _rate_limiter
+
+
+class OutboundMessage:
+    """A sendMessage call waiting in a dispatcher lane."""
+
+    def __init__(self, chat_id, text, reply_markup=None, parse_mode='HTML', priority=PRIORITY_TRANSACTIONAL, reference=None):
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.parse_mode = parse_mode
+        self.priority = priority
+        self.reference = reference # Caller's own id (broadcast recipient, outbox row, ...)
+        self.attempts = 0
+        self.not_before = 0.0
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            chat_id=data['chat_id'],
+            text=data['text'],
+            reply_markup=data.get('reply_markup'),
+            parse_mode=data.get('parse_mode', 'HTML'),
+            priority=data.get('priority', PRIORITY_TRANSACTIONAL),
+            reference=data.get('reference'),
+        )
+
+    def to_params(self):
+        params = {'chat_id': self.chat_id, 'text': self.text}
+        if self.parse_mode:
+            params['parse_mode'] = self.parse_mode
+        if self.reply_markup:
+            params['reply_markup'] = serialize_markup(self.reply_markup)
+        return params
+
+
+class OutboundDispatcher:
+    """
+    Drains a set of OutboundMessages as fast as the rate limiter allows.
+    `on_result(message, ok, result_or_error)` is called once per message when
+    it is delivered or given up on.
+    """
+
+    def __init__(self, limiter=None, api=None, max_attempts=None, on_result=None):
+        self.limiter = limiter or get_rate_limiter()
+        self.api = api or get_bot_api()
+        self.max_attempts = max_attempts or getattr(settings, 'TELEGRAM_OUTBOUND_MAX_ATTEMPTS', 5)
+        self.on_result = on_result
+        self.lanes = {priority: collections.deque() for priority in PRIORITY_LANES}
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0}
+
+    def submit(self, message):
+        self.lanes.setdefault(message.priority, collections.deque()).append(message)
+
+    def pending(self):
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def _next_ready(self):
+        """
+        Pops the first message, in priority order, whose chat can receive now.
+        A chat whose oldest queued message is still waiting (rate limit or
+        retry backoff) is held back entirely, so its messages go out in order.
+        Returns (message, None) or (None, seconds_until_something_is_ready).
+        """
+        now = time.monotonic()
+        soonest = None
+        held_chats = set()
+        for priority in sorted(self.lanes):
+            lane = self.lanes[priority]
+            for index, message in enumerate(lane):
+                if message.chat_id in held_chats:
+                    continue
+                wait = max(message.not_before - now, self.limiter.chat_delay(message.chat_id, now))
+                if wait <= 0:
+                    del lane[index]
+                    return message, None
+                held_chats.add(message.chat_id)
+                soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    def _finish(self, message, ok, result):
+        self.stats['sent' if ok else 'failed'] += 1
+        if self.on_result:
+            self.on_result(message, ok, result)
+
+    def _requeue(self, message, delay):
+        message.not_before = time.monotonic() + delay
+        self.lanes[message.priority].appendleft(message)
+        self.stats['retried'] += 1
+
+    def send_one(self, message):
+        """Sends a message whose tokens have been acquired, handling retry_after."""
+        message.attempts += 1
+        try:
+            result = self.api.call('sendMessage', message.to_params())
+        except BotAPIError as e:
+            if e.retry_after:
+                logger.warning(f"Telegram flood limit for chat {message.chat_id}, retrying in {e.retry_after}s.")
+                self.limiter.block_chat(message.chat_id, e.retry_after)
+            if e.error_code in PERMANENT_ERROR_CODES or message.attempts >= self.max_attempts:
+                logger.error(f"Giving up on message to chat {message.chat_id} after {message.attempts} attempt(s): {e}")
+                self._finish(message, False, e)
+            else:
+                self._requeue(message, e.retry_after or min(2 ** message.attempts, 60))
+            return
+        self._finish(message, True, result)
+
+    def run(self, deadline=None):
+        """
+        Sends queued messages until the lanes are empty or `deadline`
+        (time.monotonic() value) passes. Returns the stats dict.
+        """
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            message, wait = self._next_ready()
+            if message is None:
+                time.sleep(min(wait, 1.0))
+                continue
+            global_wait = self.limiter.try_acquire(message.chat_id)
+            if global_wait > 0:
+                self.lanes[message.priority].appendleft(message)
+                time.sleep(min(global_wait, 1.0))
+                continue
+            self.send_one(message)
+        return self.stats
+
+
+def queue_outbound_messages(messages, priority=PRIORITY_MARKETING, batch_size=None):
+    """
+    Enqueues a list of message dicts ({'chat_id', 'text', 'reply_markup', ...})
+    on the outbound Celery queue in batches. Lower priority values are consumed
+    first by the broker (see CELERY_BROKER_TRANSPORT_OPTIONS).
+    """
+    from .tasks import dispatch_outbound_messages_task
+
+    batch_size = batch_size or getattr(settings, 'TELEGRAM_OUTBOUND_BATCH_SIZE', 30)
+    queue = getattr(settings, 'TELEGRAM_OUTBOUND_QUEUE', 'telegram_outbound')
+    batch = []
+    for message in messages:
+        batch.append(dict(message, priority=message.get('priority', priority)))
+        if len(batch) >= batch_size:
+            dispatch_outbound_messages_task.apply_async(args=(batch,), queue=queue, priority=priority)
+            batch = []
+    if batch:
+        dispatch_outbound_messages_task.apply_async(args=(batch,), queue=queue, priority=priority)
+
+def queue_outbound_message(chat_id, text, reply_markup=None, priority=PRIORITY_NOTIFICATION):
+    """
+    Enqueues a single message as its own Celery task. Pass the lane
+    explicitly; bulk senders should hand all their messages to
+    queue_outbound_messages() instead of calling this once per recipient.
+    """
+    queue_outbound_messages([{'chat_id': chat_id, 'text': text, 'reply_markup': reply_markup}], priority=priority)
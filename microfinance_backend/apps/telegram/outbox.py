@@ -0,0 +1,148 @@
+# apps/telegram/outbox.py
+"""
+Transactional outbox for messages that must not be lost (KYC decisions,
+deposit confirmations, ...).
+
+send_via_outbox() only inserts an OutboxMessage row, so it commits or rolls
+back together with the business change that triggered it and never waits on
+Telegram. drain_outbox() runs on the outbound worker: it claims due rows in
+batches, sends them through the rate-limited OutboundDispatcher and records
+the outcome.
+
+A failed send is retried with exponential backoff (or after Telegram's
+retry_after, whichever is longer); errors that retrying cannot fix and
+messages that failed TELEGRAM_OUTBOX_MAX_ATTEMPTS times are dead-lettered
+and can be re-queued from the admin. Delivery is at-least-once: a worker
+that dies after sending but before recording the result sends the message
+again once its claim expires.
+"""
+import datetime
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .bot_api import get_bot_api
+from .models import OutboxMessage
+from .outbound import PERMANENT_ERROR_CODES, PRIORITY_TRANSACTIONAL, OutboundDispatcher, OutboundMessage
+from .telegram_utils import serialize_markup
+
+logger = logging.getLogger(__name__)
+
+KICK_CACHE_KEY = 'tg_outbox_kick'
+
+
+def _kick_worker():
+    """Wakes the outbox worker, at most once a second; the periodic task covers anything missed."""
+    from .tasks import drain_outbox_task
+
+    if cache.add(KICK_CACHE_KEY, 1, timeout=1):
+        drain_outbox_task.apply_async(queue=getattr(settings, 'TELEGRAM_OUTBOUND_QUEUE', 'telegram_outbound'))
+
+def send_via_outbox(chat_id, text, reply_markup=None, parse_mode='HTML', priority=PRIORITY_TRANSACTIONAL):
+    """
+    Records a message for delivery once the current transaction commits.
+    Call it inside the transaction that makes the change the message reports.
+    """
+    message = OutboxMessage.objects.create(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=serialize_markup(reply_markup) if reply_markup else None,
+        parse_mode=parse_mode or '',
+        priority=priority,
+    )
+    transaction.on_commit(_kick_worker)
+    return message
+
+
+def retry_delay(attempts, retry_after=None):
+    """Seconds before attempt `attempts + 1`: jittered exponential backoff, never below retry_after."""
+    base = getattr(settings, 'TELEGRAM_OUTBOX_BACKOFF_BASE', 5)
+    ceiling = getattr(settings, 'TELEGRAM_OUTBOX_BACKOFF_MAX', 3600)
+    backoff = min(ceiling, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+    return max(backoff, retry_after or 0)
+
+def _claim_batch(batch_size):
+    """Takes up to `batch_size` due messages by pushing their next_attempt_at past the claim lease."""
+    now = timezone.now()
+    lease_until = now + datetime.timedelta(seconds=getattr(settings, 'TELEGRAM_OUTBOX_LEASE', 120))
+    with transaction.atomic():
+        rows = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxMessage.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('priority', 'next_attempt_at', 'id')[:batch_size]
+        )
+        OutboxMessage.objects.filter(pk__in=[row.pk for row in rows]).update(next_attempt_at=lease_until)
+    return rows
+
+def _send_batch(rows, stats):
+    results = {}
+
+    def on_result(message, ok, result):
+        results[message.reference] = (ok, result)
+
+    # One attempt per claim; retries are scheduled in the table so they survive restarts
+    dispatcher = OutboundDispatcher(api=get_bot_api(), max_attempts=1, on_result=on_result)
+    for row in rows:
+        dispatcher.submit(OutboundMessage(
+            row.chat_id, row.text, reply_markup=row.reply_markup, parse_mode=row.parse_mode,
+            priority=row.priority, reference=row.pk,
+        ))
+    dispatcher.run()
+
+    now = timezone.now()
+    max_attempts = getattr(settings, 'TELEGRAM_OUTBOX_MAX_ATTEMPTS', 8)
+    for row in rows:
+        ok, result = results[row.pk]
+        row.attempts += 1
+        if ok:
+            row.status = OutboxMessage.STATUS_SENT
+            row.sent_at = now
+            row.telegram_message_id = (result.get('result') or {}).get('message_id')
+            row.last_error = None
+            stats['sent'] += 1
+            continue
+        row.last_error = str(result)[:255]
+        if result.error_code in PERMANENT_ERROR_CODES or row.attempts >= max_attempts:
+            row.status = OutboxMessage.STATUS_DEAD
+            stats['dead'] += 1
+            logger.error(f"Outbox message {row.pk} to chat {row.chat_id} dead-lettered after {row.attempts} attempt(s): {result}")
+        else:
+            row.next_attempt_at = now + datetime.timedelta(seconds=retry_delay(row.attempts, result.retry_after))
+            stats['retried'] += 1
+    OutboxMessage.objects.bulk_update(
+        rows, ['status', 'attempts', 'next_attempt_at', 'last_error', 'telegram_message_id', 'sent_at'],
+    )
+
+def drain_outbox(batch_size=None, time_budget=None):
+    """
+    Sends due outbox messages until none are left or `time_budget` seconds
+    have passed. Returns {'sent', 'retried', 'dead'}.
+    """
+    batch_size = batch_size or getattr(settings, 'TELEGRAM_OUTBOX_BATCH_SIZE', 100)
+    deadline = time.monotonic() + time_budget if time_budget else None
+    stats = {'sent': 0, 'retried': 0, 'dead': 0}
+    while deadline is None or time.monotonic() < deadline:
+        rows = _claim_batch(batch_size)
+        if not rows:
+            break
+        _send_batch(rows, stats)
+    return stats
+
+
+def requeue_dead_messages(queryset):
+    """Gives dead-lettered messages a fresh set of attempts."""
+    return queryset.filter(status=OutboxMessage.STATUS_DEAD).update(
+        status=OutboxMessage.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(),
+    )
+
+def purge_sent_messages(days=None):
+    """Deletes delivered messages older than `days` days. Returns the number deleted."""
+    days = days if days is not None else getattr(settings, 'TELEGRAM_OUTBOX_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = OutboxMessage.objects.filter(status=OutboxMessage.STATUS_SENT, sent_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,138 @@
+# apps/telegram/polling.py
+"""
+Long-polling update runner, an alternative to the webhook.
+
+Updates are pulled with getUpdates in batches of up to `limit` and run
+through the same pipeline as telegram_webhook_view (update_id dedup, then
+process_update). A batch is split by sender so that each user's updates are
+handled in order, while different users are handled concurrently by a pool
+of worker threads. The offset is only advanced once the whole batch has been
+handled, so a crash replays at most one batch and dedup drops what was done.
+Used by `python manage.py run_telegram_polling`.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .bot_api import BotAPIError, get_bot_api
+from .dedup import mark_update_seen
+from .processing import process_update
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALLOWED_UPDATES = ('message', 'callback_query')
+MAX_BACKOFF = 60 # Seconds between getUpdates retries when Telegram is unreachable
+
+
+def update_sender(update):
+    """Key used to keep one user's updates in order (falls back to update_id)."""
+    for kind in ('message', 'edited_message', 'callback_query', 'inline_query', 'my_chat_member'):
+        sender = (update.get(kind) or {}).get('from')
+        if sender:
+            return sender['id']
+    return f"update:{update['update_id']}"
+
+
+def handle_updates_in_order(updates):
+    """Runs one sender's updates sequentially through the webhook pipeline."""
+    handled = 0
+    try:
+        for update in updates:
+            if not mark_update_seen(update['update_id']):
+                logger.info(f"Dropping already handled Telegram update {update['update_id']}.")
+                continue
+            try:
+                process_update(update)
+                handled += 1
+            except Exception as e:
+                logger.error(f"Error processing polled Telegram update {update['update_id']}: {e}", exc_info=True)
+    finally:
+        close_old_connections() # Worker threads each hold their own DB connection
+    return handled
+
+
+class UpdatePoller:
+    """Pulls updates with getUpdates and hands them to a thread pool."""
+
+    def __init__(self, api=None, workers=4, timeout=30, limit=100, allowed_updates=DEFAULT_ALLOWED_UPDATES):
+        self.api = api or get_bot_api()
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.limit = min(max(1, limit), 100) # Telegram caps a batch at 100 updates
+        self.allowed_updates = list(allowed_updates)
+        self.offset = None
+        self.stopping = False
+        self.stats = {'batches': 0, 'received': 0, 'handled': 0}
+
+    def prepare(self, drop_pending_updates=False):
+        """Removes the webhook; getUpdates is refused while one is set."""
+        self.api.call('deleteWebhook', {'drop_pending_updates': drop_pending_updates})
+
+    def fetch(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        params = {'timeout': timeout, 'limit': self.limit, 'allowed_updates': json.dumps(self.allowed_updates)}
+        if self.offset is not None:
+            params['offset'] = self.offset
+        read_timeout = getattr(settings, 'TELEGRAM_API_READ_TIMEOUT', 10)
+        connect_timeout = getattr(settings, 'TELEGRAM_API_CONNECT_TIMEOUT', 3.05)
+        # The HTTP read timeout must outlast the long poll itself
+        response = self.api.call('getUpdates', params, timeout=(connect_timeout, timeout + read_timeout))
+        return response.get('result', [])
+
+    def handle_batch(self, executor, updates):
+        by_sender = OrderedDict()
+        for update in updates:
+            by_sender.setdefault(update_sender(update), []).append(update)
+        handled = sum(executor.map(handle_updates_in_order, by_sender.values()))
+        self.offset = max(self.offset or 0, max(update['update_id'] for update in updates) + 1)
+        self.stats['batches'] += 1
+        self.stats['received'] += len(updates)
+        self.stats['handled'] += handled
+        return handled
+
+    def run(self, once=False):
+        """
+        Polls until stop() is called. With once=True, returns as soon as the
+        backlog is drained (a getUpdates call returns nothing).
+        """
+        backoff = 1
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tg-poll') as executor:
+            while not self.stopping:
+                try:
+                    updates = self.fetch(timeout=0 if once else None)
+                except BotAPIError as e:
+                    delay = e.retry_after or backoff
+                    logger.warning(f"getUpdates failed, retrying in {delay}s: {e}")
+                    time.sleep(delay)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    continue
+                backoff = 1
+                if not updates:
+                    if once:
+                        break
+                    continue
+                started = time.monotonic()
+                handled = self.handle_batch(executor, updates)
+                logger.info(
+                    f"Handled {handled}/{len(updates)} polled update(s) in {time.monotonic() - started:.2f}s "
+                    f"(next offset {self.offset})."
+                )
+        self.confirm()
+        return self.stats
+
+    def confirm(self):
+        """Acknowledges the last handled batch so Telegram does not resend it on the next start."""
+        if self.offset is None:
+            return
+        try:
+            self.api.call('getUpdates', {'offset': self.offset, 'limit': 1, 'timeout': 0})
+        except BotAPIError as e:
+            logger.warning(f"Could not confirm update offset {self.offset}: {e}")
+
+    def stop(self, *args):
+        self.stopping = True
@@ -0,0 +1,187 @@
+# apps/telegram/processing.py
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from .user_cache import sync_telegram_user
+from .interaction_log import log_interaction
+from .telegram_utils import send_telegram_message, answer_callback_query, answer_callback_query_in_background
+from .router import router, Reply, UpdateContext
+from .states import STATE_AWAITING_ID_DOCUMENT, clear_user_state, get_user_state, set_user_state
+from .files import TelegramFileTooLarge, message_attachment, queue_kyc_document_download
+from .catalog import translate, resolve_language
+
+logger = logging.getLogger(__name__)
+
+def process_update(update, callback_answered=False):
+    """
+    Runs the bot handlers for a single decoded Telegram update.
+    Called inline by the webhook view or by the Celery worker, depending on
+    settings.TELEGRAM_UPDATE_PROCESSING. `callback_answered` is True when the
+    webhook already answers the callback query in its HTTP response.
+    """
+    if 'message' in update:
+        handle_message(update['message'])
+    elif 'callback_query' in update:
+        handle_callback_query(update['callback_query'], answered=callback_answered)
+
+    # Add more 'elif' conditions here to handle other update types
+    # like 'edited_message', 'channel_post', 'inline_query', etc.
+    # Check Telegram Bot API documentation for full 'Update' object structure.
+
+def _run_route(handler, ctx):
+    """Runs a handler and sends its Reply; timed as a whole by the router."""
+    reply = handler(ctx)
+    if reply is not None:
+        send_telegram_message(ctx.chat_id, reply.text, reply_markup=reply.reply_markup)
+    return reply
+
+def handle_message(message):
+    """Identifies the user, routes the message and logs the interaction."""
+    chat_id = message['chat']['id']
+    from_user_data = message.get('from')
+    text = message.get('text', '').strip() # Get message text, default to empty string
+
+    if not from_user_data:
+        logger.warning("Received update without 'from' user information. Ignoring.")
+        return
+
+    # Ensure TelegramUser exists or create it; skipped when the profile is unchanged
+    with transaction.atomic():
+        telegram_user, created = sync_telegram_user(from_user_data)
+    if created:
+        logger.info(f"New Telegram user created: {telegram_user.username} ({telegram_user.user_id})")
+
+    ctx = UpdateContext(
+        chat_id, from_user_data, telegram_user=telegram_user, text=text, message_id=message.get('message_id'),
+        language=resolve_language(telegram_user.user_id, from_user_data.get('language_code')),
+        attachment=message_attachment(message),
+    )
+
+    if text.startswith('/'):
+        command_parts = text.split(' ', 1)
+        ctx.command = command_parts[0].lower()
+        ctx.args = command_parts[1] if len(command_parts) > 1 else ''
+        route, handler = router.resolve_command(ctx.command)
+    else:
+        ctx.state = get_user_state(telegram_user.user_id)
+        route, handler = router.resolve_text(ctx.state)
+
+    reply = router.dispatch(route, _run_route, handler, ctx) if handler else None
+
+    # One complete log row per message, written in batches (see interaction_log.py)
+    log_interaction(telegram_user, text, command_used=ctx.command, response_text=reply.text if reply else None)
+
+def handle_callback_query(callback_query, answered=False):
+    """Handles inline keyboard button presses (not Mini App launch buttons, those are handled by Telegram client)."""
+    from_user_data = callback_query['from']
+    ctx = UpdateContext(
+        callback_query['message']['chat']['id'],
+        from_user_data,
+        callback_query=callback_query,
+        message_id=callback_query['message']['message_id'],
+        language=resolve_language(from_user_data['id'], from_user_data.get('language_code')),
+    )
+
+    # Acknowledge callback query to remove "loading" state on button, without
+    # waiting for the Bot API round trip unless TELEGRAM_CALLBACK_ACK_MODE is 'sync'
+    if not answered:
+        if getattr(settings, 'TELEGRAM_CALLBACK_ACK_MODE', 'background') == 'sync':
+            answer_callback_query(callback_query['id'])
+        else:
+            answer_callback_query_in_background(callback_query['id'])
+
+    logger.info(f"Received callback query: {ctx.callback_data} from user {from_user_data.get('id')}")
+
+    route, handler = router.resolve_callback(ctx.callback_data)
+    if handler:
+        router.dispatch(route, _run_route, handler, ctx)
+
+
+# --- Command handlers ---
+# Reply text comes from the message catalog (localization.py and locales/) in the user's language
+
+@router.command('/start')
+def start_command(ctx):
+    first_name = ctx.telegram_user.first_name or ctx.telegram_user.username or ''
+    return Reply(translate('BOT_START_GREETING', ctx.language, first_name=first_name))
+
+@router.command('/help')
+def help_command(ctx):
+    return Reply(translate('BOT_HELP_TEXT', ctx.language))
+
+@router.command('/register')
+def register_command(ctx):
+    # The URL for your Mini App.
+    # IMPORTANT: Replace with your actual public domain or ngrok URL.
+    # Example: "https://your-public-domain.com/miniapp/"
+    # For local testing with ngrok, it would be your ngrok URL + /miniapp/
+    MINI_APP_URL = "https://e7d8-102-218-50-67.ngrok-free.app" # <-- **UPDATE THIS URL with your current ngrok URL**
+
+    reply_markup = {
+        "inline_keyboard": [
+            [
+                {
+                    "text": translate('REGISTER_BUTTON', ctx.language),
+                    "web_app": {"url": MINI_APP_URL}
+                }
+            ]
+        ]
+    }
+    return Reply(translate('REGISTER_PROMPT', ctx.language), reply_markup=reply_markup)
+
+@router.command('/kyc')
+def kyc_command(ctx):
+    # Customers finish KYC by sending the ID document their profile (created by staff) still needs
+    kyc_profile = _linked_kyc_profile(ctx.telegram_user)
+    if kyc_profile is None:
+        return Reply(translate('KYC_PROFILE_MISSING', ctx.language))
+    if kyc_profile.status == 'APPROVED':
+        return Reply(translate('KYC_ALREADY_APPROVED', ctx.language))
+    set_user_state(ctx.telegram_user.user_id, STATE_AWAITING_ID_DOCUMENT)
+    return Reply(translate('REQUEST_ID_DOCUMENT', ctx.language))
+
+# Placeholder for other commands (e.g., /balance, /loan_status, /purchase_shares, /referrals, /contact)
+# These will be implemented in later steps, often interacting with the Mini App.
+@router.fallback('command')
+def unknown_command(ctx):
+    return Reply(translate('UNKNOWN_COMMAND', ctx.language))
+
+@router.fallback('text')
+def plain_text(ctx):
+    # Handle non-command messages sent outside of a conversation flow.
+    # Conversation steps register with @router.state(STATE_...) instead.
+    return Reply(translate('ECHO_MESSAGE', ctx.language, text=ctx.text))
+
+
+# --- Conversation state handlers ---
+
+def _linked_kyc_profile(telegram_user):
+    """KYC profile of the account linked to this Telegram user, resolved in the database."""
+    from apps.kyc.models import KYCProfile
+    return KYCProfile.objects.filter(user__telegram_profile__user_id=telegram_user.user_id).first()
+
+@router.state(STATE_AWAITING_ID_DOCUMENT)
+def id_document_received(ctx):
+    if ctx.attachment is None:
+        return Reply(translate('REQUEST_ID_DOCUMENT', ctx.language))
+    kyc_profile = _linked_kyc_profile(ctx.telegram_user)
+    if kyc_profile is None:
+        clear_user_state(ctx.telegram_user.user_id)
+        return Reply(translate('KYC_PROFILE_MISSING', ctx.language))
+    try:
+        queue_kyc_document_download(kyc_profile, ctx.attachment) # Downloaded by a worker, not here
+    except TelegramFileTooLarge:
+        return Reply(translate('ID_DOCUMENT_TOO_LARGE', ctx.language))
+    clear_user_state(ctx.telegram_user.user_id)
+    return Reply(translate('KYC_SUBMITTED', ctx.language))
+
+# --- Callback query handlers ---
+# Register exact callback data or a prefix ending in '_', e.g. @router.callback('approve_kyc_')
+
+@router.callback('some_simple_action')
+def simple_action_callback(ctx):
+    # You might also edit the original message:
+    # edit_telegram_message(ctx.chat_id, ctx.message_id, 'Message updated after button press!')
+    return Reply(translate('SIMPLE_BUTTON_PRESSED', ctx.language))
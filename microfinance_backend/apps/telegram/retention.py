@@ -0,0 +1,141 @@
+# apps/telegram/retention.py
+"""
+Retention and archival for BotInteractionLog.
+
+Rows older than TELEGRAM_INTERACTION_LOG_RETENTION_DAYS are moved out of the
+database into gzip-compressed newline-delimited JSON files, one file per UTC
+day:
+
+    <TELEGRAM_INTERACTION_ARCHIVE_DIR>/2025/06/bot_interactions-2025-06-14.ndjson.gz
+
+Rows are moved in chunks of TELEGRAM_INTERACTION_ARCHIVE_CHUNK_SIZE: a chunk
+is appended to its day files (each append is a complete gzip member, so
+files stay readable if a run is interrupted), flushed to disk, and only then
+deleted from the table, so no single DELETE holds locks for long. If a run
+dies between writing and deleting, the chunk is archived again on the next
+run; readers drop the duplicates by row id.
+
+`python manage.py archive_interaction_logs` runs the archival and
+`python manage.py query_interaction_archive` searches the archive files.
+"""
+import datetime
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import BotInteractionLog
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = ('id', 'telegram_user_id', 'message_text', 'command_used', 'response_text', 'timestamp')
+ARCHIVE_FILE_PREFIX = 'bot_interactions-'
+ARCHIVE_FILE_SUFFIX = '.ndjson.gz'
+
+
+def archive_dir():
+    return str(getattr(settings, 'TELEGRAM_INTERACTION_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives', 'bot_interactions')))
+
+def archive_path(day, root=None):
+    """File holding the archived interactions of one UTC day."""
+    root = root or archive_dir()
+    return os.path.join(root, f"{day:%Y}", f"{day:%m}", f"{ARCHIVE_FILE_PREFIX}{day:%Y-%m-%d}{ARCHIVE_FILE_SUFFIX}")
+
+def retention_cutoff(days):
+    """Start of the UTC day `days` days ago; everything before it is archived."""
+    today = timezone.now().astimezone(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - datetime.timedelta(days=days)
+
+
+def _write_day(day, rows, root):
+    path = archive_path(day, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno()) # Durable before the rows are deleted
+
+def archive_interaction_logs(days=None, chunk_size=None, root=None, dry_run=False):
+    """
+    Moves interactions older than `days` days into the archive.
+    Returns the number of rows archived (or that would be, with dry_run).
+    """
+    days = days if days is not None else getattr(settings, 'TELEGRAM_INTERACTION_LOG_RETENTION_DAYS', 90)
+    chunk_size = chunk_size or getattr(settings, 'TELEGRAM_INTERACTION_ARCHIVE_CHUNK_SIZE', 2000)
+    root = root or archive_dir()
+    cutoff = retention_cutoff(days)
+    expired = BotInteractionLog.objects.filter(timestamp__lt=cutoff)
+
+    if dry_run:
+        return expired.count()
+
+    archived = 0
+    last_id = 0
+    while True:
+        # Keyset pagination on the primary key keeps every chunk an index range scan
+        rows = list(expired.filter(id__gt=last_id).order_by('id').values(*ARCHIVE_FIELDS)[:chunk_size])
+        if not rows:
+            break
+        by_day = defaultdict(list)
+        for row in rows:
+            stamp = row['timestamp'].astimezone(datetime.timezone.utc)
+            row['timestamp'] = stamp.isoformat()
+            by_day[stamp.date()].append(row)
+        for day in sorted(by_day):
+            _write_day(day, by_day[day], root)
+
+        ids = [row['id'] for row in rows]
+        BotInteractionLog.objects.filter(id__in=ids).delete()
+        archived += len(rows)
+        last_id = ids[-1]
+        logger.info(f"Archived {archived} bot interaction log(s) older than {cutoff:%Y-%m-%d} so far.")
+    return archived
+
+
+def archive_files(since=None, until=None, root=None):
+    """Archive files for UTC days in [since, until], oldest first; pruned by file name."""
+    root = root or archive_dir()
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not (filename.startswith(ARCHIVE_FILE_PREFIX) and filename.endswith(ARCHIVE_FILE_SUFFIX)):
+                continue
+            try:
+                day = datetime.date.fromisoformat(filename[len(ARCHIVE_FILE_PREFIX):-len(ARCHIVE_FILE_SUFFIX)])
+            except ValueError:
+                continue
+            if (since and day < since) or (until and day > until):
+                continue
+            paths.append((day, os.path.join(dirpath, filename)))
+    return [path for _, path in sorted(paths)]
+
+def iter_archived_interactions(since=None, until=None, telegram_user_id=None, command=None, contains=None, root=None):
+    """
+    Yields archived interaction dicts matching the filters, oldest day first.
+    `since`/`until` are dates (inclusive); `contains` is a case-insensitive
+    substring of the message or response text.
+    """
+    needle = contains.lower() if contains else None
+    for path in archive_files(since, until, root):
+        seen = set() # A day's file can hold a chunk twice if a run was interrupted
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if telegram_user_id is not None and row['telegram_user_id'] != telegram_user_id:
+                    continue
+                if command is not None and row['command_used'] != command:
+                    continue
+                if needle and needle not in (row['message_text'] or '').lower() and needle not in (row['response_text'] or '').lower():
+                    continue
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                yield row
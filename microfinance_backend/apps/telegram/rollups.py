@@ -0,0 +1,133 @@
+# apps/telegram/rollups.py
+"""
+Incremental usage rollups over BotInteractionLog.
+
+InteractionRollup holds hourly and daily counts per command_used, language
+and new-vs-returning user. update_interaction_rollups() only reads log rows
+above the last id it counted (the RollupCheckpoint high-water mark), lets the
+database GROUP BY each id range, and adds the results onto the existing
+counters, so each run costs proportional to the new rows, not the table.
+
+Rows younger than TELEGRAM_ROLLUP_LAG seconds, and every id above the first
+of them, are left for the next run: interaction logs are written in buffered
+batches, and bounding each run by age rather than by the newest visible id
+keeps a batch that commits late from slipping below the high-water mark, as
+long as batches commit within the lag.
+
+Dashboards read the counters with rollup_totals().
+"""
+import collections
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Max, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import BotInteractionLog, InteractionRollup, RollupCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'bot_interactions'
+NEW_USER_WINDOW = datetime.timedelta(days=1) # Interactions this soon after first contact count as "new user"
+
+
+def _safe_upper_id(after_id, lag):
+    """
+    Highest log id that can be counted now: the newest row older than the lag
+    window, kept below any younger row. Ids are taken when a batch is
+    inserted, not when it commits, so a visible young row says nothing about
+    the lower ids still uncommitted beneath it; a row older than the lag does.
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=lag)
+    pending = BotInteractionLog.objects.filter(id__gt=after_id)
+    settled = pending.filter(timestamp__lte=cutoff).aggregate(upper=Max('id'))['upper'] or after_id
+    recent = pending.filter(id__lte=settled, timestamp__gt=cutoff).order_by('id').values_list('id', flat=True).first()
+    return settled if recent is None else recent - 1
+
+def _count_range(low_id, high_id):
+    """Counts log rows with low_id < id <= high_id into {(period, start, command, language, is_new): n}."""
+    catalog = get_catalog()
+    grouped = (
+        BotInteractionLog.objects.filter(id__gt=low_id, id__lte=high_id)
+        .annotate(
+            hour=TruncHour('timestamp'),
+            is_new=ExpressionWrapper(Q(timestamp__lt=F('telegram_user__created_at') + NEW_USER_WINDOW), output_field=BooleanField()),
+        )
+        .values('hour', 'command_used', 'telegram_user__language_code', 'is_new')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    counts = collections.Counter()
+    for row in grouped:
+        hour = row['hour']
+        day = timezone.localtime(hour).replace(hour=0, minute=0, second=0, microsecond=0)
+        key = (row['command_used'] or '', catalog.normalize(row['telegram_user__language_code']), bool(row['is_new']))
+        counts[(InteractionRollup.PERIOD_HOUR, hour) + key] += row['n']
+        counts[(InteractionRollup.PERIOD_DAY, day) + key] += row['n']
+    return counts
+
+def _apply(counts):
+    """Adds counts onto existing rollup rows, creating missing ones."""
+    existing = {
+        (rollup.period, rollup.period_start, rollup.command_used, rollup.language, rollup.is_new_user): rollup
+        for rollup in InteractionRollup.objects.filter(period_start__in={key[1] for key in counts})
+    }
+    changed, created = [], []
+    for key, n in counts.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            period, period_start, command_used, language, is_new_user = key
+            created.append(InteractionRollup(
+                period=period, period_start=period_start, command_used=command_used,
+                language=language, is_new_user=is_new_user, count=n,
+            ))
+        else:
+            rollup.count += n
+            changed.append(rollup)
+    InteractionRollup.objects.bulk_update(changed, ['count'])
+    InteractionRollup.objects.bulk_create(created)
+
+def update_interaction_rollups(chunk_size=None, lag=None):
+    """
+    Counts log rows added since the last run into InteractionRollup.
+    Returns the number of log rows counted.
+    """
+    chunk_size = chunk_size or getattr(settings, 'TELEGRAM_ROLLUP_CHUNK_SIZE', 50000)
+    lag = lag if lag is not None else getattr(settings, 'TELEGRAM_ROLLUP_LAG', 300)
+    RollupCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+
+    counted = 0
+    while True:
+        with transaction.atomic():
+            # The row lock keeps two runs from counting the same range
+            checkpoint = RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT_NAME)
+            upper = min(_safe_upper_id(checkpoint.last_id, lag), checkpoint.last_id + chunk_size)
+            if upper <= checkpoint.last_id:
+                break
+            counts = _count_range(checkpoint.last_id, upper)
+            _apply(counts)
+            rows = sum(n for key, n in counts.items() if key[0] == InteractionRollup.PERIOD_HOUR)
+            checkpoint.last_id = upper
+            checkpoint.save(update_fields=['last_id', 'updated_at'])
+        counted += rows
+    if counted:
+        logger.info(f"Rolled up {counted} bot interaction(s); high-water mark is now {checkpoint.last_id}.")
+    return counted
+
+
+def rollup_totals(period=InteractionRollup.PERIOD_DAY, since=None, until=None, group_by=('period_start',)):
+    """
+    Summed counts from the rollup table, e.g.
+    rollup_totals(group_by=('command_used',), since=...) for command usage,
+    or group_by=('period_start', 'is_new_user') for a new-vs-returning series.
+    """
+    rollups = InteractionRollup.objects.filter(period=period)
+    if since is not None:
+        rollups = rollups.filter(period_start__gte=since)
+    if until is not None:
+        rollups = rollups.filter(period_start__lt=until)
+    return rollups.values(*group_by).annotate(total=Sum('count')).order_by(*group_by)
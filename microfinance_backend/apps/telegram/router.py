@@ -0,0 +1,213 @@
+# apps/telegram/router.py
+"""
+Table-driven routing for bot updates.
+
+Handlers are registered by command (`/start`), by callback-data prefix
+(`approve_kyc_`) or by conversation state (`STATE_AWAITING_NATIONAL_ID`).
+Commands and states are plain dict lookups; callback data is matched exactly
+first and then against its `_`-delimited prefixes, so dispatch cost does not
+grow with the number of routes. Each route keeps an execution-time histogram.
+"""
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds (last bucket is everything slower)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket execution-time histogram for one route."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+
+    def observe(self, elapsed_ms, failed=False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.total += 1
+        self.sum_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if failed:
+            self.errors += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket containing the given percentile (e.g. 0.95)."""
+        if not self.total:
+            return 0.0
+        target = fraction * self.total
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            'count': self.total,
+            'errors': self.errors,
+            'avg_ms': round(self.sum_ms / self.total, 2) if self.total else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 2),
+            'buckets': dict(zip([*map(str, LATENCY_BUCKETS_MS), 'inf'], self.counts)),
+        }
+
+
+class UpdateContext:
+    """Everything a handler needs to know about the update it is handling."""
+
+    def __init__(self, chat_id, from_user, telegram_user=None, text='', command=None, args='',
+                 callback_query=None, message_id=None, state=None, language=None, attachment=None):
+        self.chat_id = chat_id
+        self.from_user = from_user # Raw Telegram `User` dict
+        self.telegram_user = telegram_user
+        self.text = text
+        self.command = command
+        self.args = args
+        self.callback_query = callback_query
+        self.callback_data = callback_query['data'] if callback_query else None
+        self.message_id = message_id
+        self.state = state
+        self.language = language # Reply language, see catalog.resolve_language()
+        self.attachment = attachment # Photo/document sent with the message, see files.message_attachment()
+
+
+class Reply:
+    """What a handler wants sent back to the chat."""
+
+    def __init__(self, text, reply_markup=None):
+        self.text = text
+        self.reply_markup = reply_markup
+
+
+class Router:
+    """Maps commands, callback data and conversation states to handler functions."""
+
+    def __init__(self):
+        self.commands = {}
+        self.callbacks = {}
+        self.states = {}
+        self.fallbacks = {}
+        self.metrics = {}
+        self.metrics_lock = threading.Lock()
+        self._dispatched = 0
+
+    # --- Registration ---
+
+    def command(self, *names):
+        """Registers a handler for one or more commands, e.g. @router.command('/start')."""
+        def decorator(func):
+            for name in names:
+                self.commands[name.lower()] = func
+            return func
+        return decorator
+
+    def callback(self, data_or_prefix):
+        """
+        Registers a callback-query handler. A value ending in '_' is a prefix
+        ('approve_kyc_' matches 'approve_kyc_42'), anything else matches exactly.
+        """
+        def decorator(func):
+            self.callbacks[data_or_prefix] = func
+            return func
+        return decorator
+
+    def state(self, state):
+        """Registers a handler for free text sent while a user is in `state`."""
+        def decorator(func):
+            self.states[state] = func
+            return func
+        return decorator
+
+    def fallback(self, kind):
+        """Registers the handler used when nothing else matches: 'command', 'text' or 'callback'."""
+        def decorator(func):
+            self.fallbacks[kind] = func
+            return func
+        return decorator
+
+    # --- Lookup ---
+
+    def resolve_command(self, command):
+        handler = self.commands.get(command)
+        if handler is not None:
+            return f"command:{command}", handler
+        return "command:<unknown>", self.fallbacks.get('command')
+
+    def resolve_callback(self, data):
+        handler = self.callbacks.get(data)
+        if handler is not None:
+            return f"callback:{data}", handler
+        position = data.rfind('_')
+        while position != -1:
+            prefix = data[:position + 1]
+            handler = self.callbacks.get(prefix)
+            if handler is not None:
+                return f"callback:{prefix}", handler
+            position = data.rfind('_', 0, position)
+        return "callback:<unknown>", self.fallbacks.get('callback')
+
+    def resolve_text(self, state):
+        handler = self.states.get(state)
+        if handler is not None:
+            return f"state:{state}", handler
+        return "text", self.fallbacks.get('text')
+
+    # --- Dispatch ---
+
+    def dispatch(self, route, handler, *args, **kwargs):
+        """Runs a resolved handler and records its execution time under `route`."""
+        if handler is None:
+            logger.debug(f"No handler registered for route {route}.")
+            return None
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = handler(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._observe(route, (time.perf_counter() - started) * 1000, failed)
+
+    def _observe(self, route, elapsed_ms, failed):
+        with self.metrics_lock:
+            histogram = self.metrics.get(route)
+            if histogram is None:
+                histogram = self.metrics[route] = LatencyHistogram()
+            histogram.observe(elapsed_ms, failed)
+            self._dispatched += 1
+            log_every = getattr(settings, 'TELEGRAM_ROUTE_METRICS_LOG_EVERY', 1000)
+            should_log = log_every and self._dispatched % log_every == 0
+        slow_ms = getattr(settings, 'TELEGRAM_ROUTE_SLOW_MS', 1000)
+        if elapsed_ms >= slow_ms:
+            logger.warning(f"Slow bot route {route}: {elapsed_ms:.0f} ms")
+        if should_log:
+            self.log_metrics()
+
+    def metrics_snapshot(self):
+        """Returns {route: histogram summary} for this process."""
+        with self.metrics_lock:
+            return {route: histogram.snapshot() for route, histogram in self.metrics.items()}
+
+    def log_metrics(self):
+        for route, stats in sorted(self.metrics_snapshot().items()):
+            logger.info(
+                f"Bot route {route}: count={stats['count']} errors={stats['errors']} "
+                f"avg={stats['avg_ms']}ms p50<={stats['p50_ms']}ms p95<={stats['p95_ms']}ms "
+                f"p99<={stats['p99_ms']}ms max={stats['max_ms']}ms"
+            )
+
+
+# The bot's single routing table; handlers register themselves in processing.py
+router = Router()
@@ -0,0 +1,43 @@
+# apps/telegram/signals.py
+"""
+Keeps the per-process language cache (catalog.py) in step with the accounts
+it is read from. Connected in TelegramConfig.ready().
+
+Only this process's cache is dropped; other processes pick the change up
+within TELEGRAM_LANGUAGE_CACHE_TTL.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from .catalog import forget_user_language
+
+
+def _changed(update_fields, field_name):
+    return update_fields is None or field_name in update_fields
+
+def _forget_account_language(sender, instance, created, update_fields=None, **kwargs):
+    if created or not _changed(update_fields, 'preferred_language'):
+        return # A new account has no Telegram profile linked yet
+    TelegramUser = apps.get_model('telegram', 'TelegramUser')
+
+    def forget():
+        for telegram_user_id in TelegramUser.objects.filter(linked_custom_user_id=instance.pk).values_list('user_id', flat=True):
+            forget_user_language(telegram_user_id)
+
+    # After commit, so a concurrent reply cannot cache the old language again
+    transaction.on_commit(forget)
+
+def _forget_profile_language(sender, instance, update_fields=None, **kwargs):
+    if _changed(update_fields, 'linked_custom_user'):
+        transaction.on_commit(lambda: forget_user_language(instance.user_id))
+
+def connect_language_signals():
+    post_save.connect(
+        _forget_account_language, sender=apps.get_model('CustomUser', 'CustomUser'),
+        dispatch_uid='telegram_language_account',
+    )
+    post_save.connect(
+        _forget_profile_language, sender=apps.get_model('telegram', 'TelegramUser'),
+        dispatch_uid='telegram_language_profile',
+    )
@@ -1,7 +1,28 @@
 # states.py
+"""
+Conversation state for multi-step bot flows.
 
-# Example: A dictionary to store user states (mapping user_id to their current state)
-user_states = {}
+State is kept in a backend shared by every worker so a user keeps their place
+in a flow no matter which process handles their next update. The expiry is
+sliding: an entry lapses TELEGRAM_STATE_TTL seconds after the user was last
+active in the flow (the state was set or read for one of their messages),
+which bounds how much is stored without cutting off users mid-conversation.
+TELEGRAM_STATE_BACKEND selects the backend:
+  'db'    - ConversationState table with an indexed expires_at (default). One
+            primary-key SELECT per text message; the expiry is pushed forward
+            at most once per tenth of the TTL, so most reads do not write.
+  'cache' - the Django cache named by TELEGRAM_STATE_CACHE_ALIAS; use a shared
+            cache such as Redis in production, the local-memory cache is per process
+"""
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
 
 # Define your state constants
 STATE_NONE = 0
@@ -12,16 +33,131 @@ STATE_AWAITING_GF_NAME = 4
 STATE_AWAITING_FIRST_NAME =5
 STATE_AWAITING_FATHER_NAME = 6
 STATE_AWAITING_GRANDFATHER_NAME = 7
-STATE_AWAITING_NATIONAL_ID=8 
+STATE_AWAITING_NATIONAL_ID=8
 STATE_AWAITING_PAYMENT_AMOUNT=9
 STATE_CONFIRM_PAYMENT=10
 STATE_AWAITING_MIFOS_QUERY=11
+STATE_AWAITING_ID_DOCUMENT = 12
 # Add any other state constants your views.py expects
 
-# You might also have functions or classes related to state management here
-# For example:
+CACHE_KEY_PREFIX = 'tg_state:'
+
+
+class CacheStateBackend:
+    """Stores states as expiring keys in a Django cache (one key per user)."""
+
+    def __init__(self, ttl, cache_alias='default'):
+        self.ttl = ttl
+        self.cache = caches[cache_alias]
+
+    def get(self, user_id):
+        key = f"{CACHE_KEY_PREFIX}{user_id}"
+        state = self.cache.get(key, STATE_NONE)
+        if state != STATE_NONE:
+            self.cache.touch(key, self.ttl) # Sliding expiry: the user is still in the flow
+        return state
+
+    def get_many(self, user_ids):
+        found = self.cache.get_many([f"{CACHE_KEY_PREFIX}{user_id}" for user_id in user_ids])
+        return {user_id: found.get(f"{CACHE_KEY_PREFIX}{user_id}", STATE_NONE) for user_id in user_ids}
+
+    def set(self, user_id, state):
+        self.cache.set(f"{CACHE_KEY_PREFIX}{user_id}", state, self.ttl)
+
+    def clear(self, user_id):
+        self.cache.delete(f"{CACHE_KEY_PREFIX}{user_id}")
+
+    def purge_expired(self):
+        return 0 # The cache expires keys itself
+
+
+class DatabaseStateBackend:
+    """Stores states in the ConversationState table; expired rows read as STATE_NONE."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.refresh_after = datetime.timedelta(seconds=ttl / 10) # Activity this recent needs no write
+
+    def _live(self):
+        from .models import ConversationState
+        return ConversationState.objects.filter(expires_at__gt=timezone.now())
+
+    def get(self, user_id):
+        row = self._live().filter(user_id=user_id).values_list('state', 'expires_at').first()
+        if row is None:
+            return STATE_NONE
+        state, expires_at = row
+        now = timezone.now()
+        expires_at_now = now + datetime.timedelta(seconds=self.ttl)
+        if expires_at_now - expires_at >= self.refresh_after: # Sliding expiry, written at most once per tenth of the TTL
+            from .models import ConversationState
+            ConversationState.objects.filter(user_id=user_id, expires_at__gt=now).update(expires_at=expires_at_now)
+        return state
+
+    def get_many(self, user_ids):
+        found = dict(self._live().filter(user_id__in=user_ids).values_list('user_id', 'state'))
+        return {user_id: found.get(user_id, STATE_NONE) for user_id in user_ids}
+
+    def set(self, user_id, state):
+        from .models import ConversationState
+        expires_at = timezone.now() + datetime.timedelta(seconds=self.ttl)
+        ConversationState.objects.update_or_create(user_id=user_id, defaults={'state': state, 'expires_at': expires_at})
+
+    def clear(self, user_id):
+        from .models import ConversationState
+        ConversationState.objects.filter(user_id=user_id).delete()
+
+    def purge_expired(self, chunk_size=1000):
+        """Deletes expired rows in chunks so the table lock is never held for long. Returns rows deleted."""
+        from .models import ConversationState
+        deleted = 0
+        while True:
+            expired = list(
+                ConversationState.objects.filter(expires_at__lte=timezone.now())
+                .values_list('user_id', flat=True)[:chunk_size]
+            )
+            if not expired:
+                return deleted
+            deleted += ConversationState.objects.filter(user_id__in=expired).delete()[0]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_state_backend():
+    """Returns the process-wide state backend configured from settings."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                ttl = getattr(settings, 'TELEGRAM_STATE_TTL', 86400)
+                kind = getattr(settings, 'TELEGRAM_STATE_BACKEND', 'db')
+                if kind == 'cache':
+                    _backend = CacheStateBackend(ttl, getattr(settings, 'TELEGRAM_STATE_CACHE_ALIAS', 'default'))
+                elif kind == 'db':
+                    _backend = DatabaseStateBackend(ttl)
+                else:
+                    raise ValueError(f"Unknown TELEGRAM_STATE_BACKEND {kind!r}; expected 'db' or 'cache'.")
+    return _backend
+
 def set_user_state(user_id, state):
-    user_states[user_id] = state
+    """Moves a user to `state`; STATE_NONE ends the flow."""
+    if state == STATE_NONE:
+        clear_user_state(user_id)
+    else:
+        get_state_backend().set(user_id, state)
 
 def get_user_state(user_id):
-    return user_states.get(user_id, STATE_NONE)
\ No newline at end of file
+    return get_state_backend().get(user_id)
+
+def get_user_states(user_ids):
+    """Returns {user_id: state} for several users with a single backend round trip."""
+    user_ids = list(user_ids)
+    return get_state_backend().get_many(user_ids) if user_ids else {}
+
+def clear_user_state(user_id):
+    get_state_backend().clear(user_id)
+
+def purge_expired_states():
+    """Removes expired states from backends that do not expire entries themselves."""
+    return get_state_backend().purge_expired()
@@ -0,0 +1,128 @@
+# apps/telegram/tasks.py
+import logging
+from celery import shared_task
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .processing import process_update
+from .dedup import forget_update
+from .bot_api import BotAPIError
+from .broadcast import RUN_YIELDED, BroadcastRunner, enqueue_broadcast
+from .files import TelegramFileTooLarge, attach_kyc_document, download_telegram_file
+from .models import BroadcastJob
+from .outbound import OutboundDispatcher, OutboundMessage
+from .outbox import drain_outbox, purge_sent_messages
+from .retention import archive_interaction_logs
+from .rollups import update_interaction_rollups
+from .states import purge_expired_states
+
+logger = logging.getLogger(__name__)
+
+@shared_task(bind=True, ignore_result=True, max_retries=3)
+def process_telegram_update_task(self, update, callback_answered=False):
+    """
+    Celery task that runs the bot handlers for an update accepted by the webhook.
+    Start a worker with: celery -A microfinance_backend.celery worker -Q default
+
+    The webhook has already answered 200, so Telegram will not redeliver a
+    failed update: the task retries it, and once out of retries forgets its
+    update_id like the inline path does, so a replay of it is not dropped.
+    """
+    logger.debug(f"Worker processing Telegram update {update.get('update_id')}")
+    try:
+        process_update(update, callback_answered=callback_answered)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=5 * 2 ** self.request.retries)
+        forget_update(update.get('update_id'))
+        raise
+
+@shared_task(ignore_result=True)
+def dispatch_outbound_messages_task(messages):
+    """
+    Sends a batch of outbound messages through the rate-limited dispatcher.
+    Enqueued by apps.telegram.outbound.queue_outbound_messages().
+    """
+    dispatcher = OutboundDispatcher()
+    for message in messages:
+        dispatcher.submit(OutboundMessage.from_dict(message))
+    stats = dispatcher.run()
+    logger.info(f"Outbound batch done: {stats['sent']} sent, {stats['failed']} failed, {stats['retried']} retried.")
+
+@shared_task(ignore_result=True)
+def purge_expired_conversation_states_task():
+    """Periodic task (Celery Beat) that deletes expired conversation states."""
+    deleted = purge_expired_states()
+    if deleted:
+        logger.info(f"Purged {deleted} expired conversation state(s).")
+
+@shared_task(ignore_result=True, acks_late=True)
+def run_broadcast_task(job_id):
+    """
+    Sends a BroadcastJob for up to TELEGRAM_BROADCAST_TIME_BUDGET seconds,
+    then re-enqueues itself so long broadcasts never hold a worker for hours.
+    Enqueued on the outbound queue by apps.telegram.broadcast.start_broadcast().
+    """
+    try:
+        job = BroadcastJob.objects.get(pk=job_id)
+    except BroadcastJob.DoesNotExist:
+        logger.warning(f"Broadcast {job_id} no longer exists.")
+        return
+    outcome = BroadcastRunner(job).run(time_budget=getattr(settings, 'TELEGRAM_BROADCAST_TIME_BUDGET', 240))
+    if outcome == RUN_YIELDED:
+        enqueue_broadcast(job)
+
+@shared_task(ignore_result=True)
+def resume_stalled_broadcasts_task():
+    """Periodic task (Celery Beat) that re-enqueues running broadcasts whose worker died."""
+    stalled = BroadcastJob.objects.filter(status=BroadcastJob.STATUS_RUNNING).filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=timezone.now())
+    )
+    for job in stalled:
+        logger.warning(f"Resuming stalled broadcast {job.pk} from user_id {job.cursor}.")
+        enqueue_broadcast(job)
+
+@shared_task(ignore_result=True)
+def archive_interaction_logs_task():
+    """Periodic task (Celery Beat) that moves old BotInteractionLog rows to the archive."""
+    archived = archive_interaction_logs()
+    logger.info(f"Archived {archived} bot interaction log(s).")
+
+@shared_task(ignore_result=True)
+def update_interaction_rollups_task():
+    """Periodic task (Celery Beat) that adds new bot interactions to the usage rollups."""
+    update_interaction_rollups()
+
+@shared_task(bind=True, ignore_result=True, max_retries=5)
+def download_kyc_document_task(self, kyc_profile_id, file_id, file_unique_id=None, mime_type=None):
+    """
+    Streams an ID document sent to the bot into storage and attaches it to the KYC profile.
+    Enqueued by apps.telegram.files.queue_kyc_document_download().
+    """
+    try:
+        telegram_file = download_telegram_file(file_id, file_unique_id, mime_type)
+    except TelegramFileTooLarge as e:
+        logger.warning(f"Not storing KYC document for profile {kyc_profile_id}: {e}")
+        return
+    except BotAPIError as e:
+        raise self.retry(exc=e, countdown=e.retry_after or 30 * 2 ** self.request.retries)
+    if not attach_kyc_document(kyc_profile_id, telegram_file):
+        logger.warning(f"KYC profile {kyc_profile_id} no longer exists; kept {telegram_file.stored_name}.")
+
+@shared_task(ignore_result=True)
+def drain_outbox_task():
+    """
+    Delivers due OutboxMessage rows. Kicked by apps.telegram.outbox.send_via_outbox()
+    after commit and run periodically by Celery Beat to pick up retries.
+    """
+    stats = drain_outbox(time_budget=getattr(settings, 'TELEGRAM_OUTBOX_TIME_BUDGET', 50))
+    if any(stats.values()):
+        logger.info(f"Outbox drained: {stats['sent']} sent, {stats['retried']} to retry, {stats['dead']} dead-lettered.")
+
+@shared_task(ignore_result=True)
+def purge_sent_outbox_messages_task():
+    """Periodic task (Celery Beat) that deletes delivered outbox messages past retention."""
+    deleted = purge_sent_messages()
+    if deleted:
+        logger.info(f"Purged {deleted} delivered outbox message(s).")
@@ -1,41 +1,43 @@
 # C:\Users\u\Desktop\New folder\microfinance_backend\apps\telegram\telegram_utils.py
 
-import requests
 import json
-from django.conf import settings # Make sure settings are imported to access TELEGRAM_BOT_TOKEN
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# --- IMPORTANT: Ensure TELEGRAM_BOT_TOKEN is set in your Django settings.py ---
-# Example in your project's settings.py:
-# TELEGRAM_BOT_TOKEN = "YOUR_ACTUAL_BOT_TOKEN_HERE"
-# Replace "YOUR_ACTUAL_BOT_TOKEN_HERE" with the token you got from BotFather.
+from django.conf import settings
 
-TELEGRAM_BOT_TOKEN = settings.TELEGRAM_BOT_TOKEN
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/"
+from .bot_api import BotAPIError, get_bot_api
+
+logger = logging.getLogger(__name__)
+
+# All calls go through the shared pooled client in bot_api.py, which reads
+# TELEGRAM_BOT_TOKEN and the TELEGRAM_API_* timeouts from Django settings.
 
 def _make_telegram_api_call(method, params=None):
     """Helper function to make API calls to Telegram."""
-    url = f"{TELEGRAM_API_URL}{method}"
     try:
-        response = requests.post(url, json=params)
-        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Telegram API call error for method {method}: {e}")
-        # Log the full response for debugging if needed
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Response status code: {e.response.status_code}")
-            print(f"Response content: {e.response.text}")
+        return get_bot_api().call(method, params)
+    except BotAPIError as e:
+        logger.error(f"Telegram API call error for method {method}: {e}")
         return None
 
+def serialize_markup(reply_markup):
+    """Serializes a markup dict; pre-serialized markup (see menus.py) is passed through."""
+    return reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
+
 def send_telegram_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
-    """Sends a message to a Telegram chat."""
+    """
+    Sends a message to a Telegram chat. Failures are logged and return None;
+    messages that must arrive go through outbox.send_via_outbox() instead.
+    """
     params = {
         'chat_id': chat_id,
         'text': text,
         'parse_mode': parse_mode,
     }
     if reply_markup:
-        params['reply_markup'] = json.dumps(reply_markup)
+        params['reply_markup'] = serialize_markup(reply_markup)
     return _make_telegram_api_call('sendMessage', params)
 
 def edit_telegram_message(chat_id, message_id, text, reply_markup=None, parse_mode='HTML'):
@@ -47,7 +49,7 @@ def edit_telegram_message(chat_id, message_id, text, reply_markup=None, parse_mo
         'parse_mode': parse_mode,
     }
     if reply_markup:
-        params['reply_markup'] = json.dumps(reply_markup)
+        params['reply_markup'] = serialize_markup(reply_markup)
     return _make_telegram_api_call('editMessageText', params)
 
 def delete_telegram_message(chat_id, message_id):
@@ -67,4 +69,33 @@ def answer_callback_query(callback_query_id, text=None, show_alert=False):
         params['text'] = text
     if show_alert:
         params['show_alert'] = show_alert
-    return _make_telegram_api_call('answerCallbackQuery', params)
\ No newline at end of file
+    return _make_telegram_api_call('answerCallbackQuery', params)
+
+
+_ack_executor = None
+_ack_executor_lock = threading.Lock()
+
+def _get_ack_executor():
+    global _ack_executor
+    if _ack_executor is None:
+        with _ack_executor_lock:
+            if _ack_executor is None:
+                _ack_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'TELEGRAM_CALLBACK_ACK_WORKERS', 4),
+                    thread_name_prefix='tg-ack',
+                )
+    return _ack_executor
+
+def answer_callback_query_in_background(callback_query_id, text=None, show_alert=False):
+    """
+    Sends answerCallbackQuery from a background thread and returns at once,
+    so the button's spinner is dismissed while the handler is still running.
+    """
+    return _get_ack_executor().submit(answer_callback_query, callback_query_id, text, show_alert)
+
+def callback_answer_webhook_response(callback_query_id):
+    """
+    Body for answering a callback query in the webhook's HTTP response
+    (Telegram executes one Bot API method returned this way), saving a call.
+    """
+    return {'method': 'answerCallbackQuery', 'callback_query_id': callback_query_id}
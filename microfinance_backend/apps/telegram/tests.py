@@ -1,3 +1,1412 @@
-from django.test import TestCase
+import itertools
+import json
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from .interaction_log import flush_interaction_logs
+from .models import BotInteractionLog
+
+
+def message_update(update_id, text, user_id=5, **message):
+    return {
+        'update_id': update_id,
+        'message': dict({'message_id': update_id, 'chat': {'id': user_id}, 'from': {'id': user_id, 'first_name': 'Abebe'}, 'text': text}, **message),
+    }
+
+def bot_api_call():
+    """Patches BotAPIClient.call so no request reaches Telegram."""
+    return mock.patch('apps.telegram.bot_api.BotAPIClient.call', return_value={'ok': True})
+
+def translate_en(key):
+    from .catalog import translate
+    return translate(key, 'en')
+
+
+@override_settings(TELEGRAM_DEDUP_CACHE_ALIAS='default') # The process-local cache instead of Redis
+class WebhookTestCase(TestCase):
+    def setUp(self):
+        cache.clear() # Update ids, user profiles and states are remembered in the cache
+        self.addCleanup(flush_interaction_logs) # Not left in the process-wide buffer for the next test
+
+    def post_update(self, update, **headers):
+        return self.client.post('/webhook/', data=json.dumps(update), content_type='application/json', **headers)
+
+
+# --- Webhook ingestion (processing.py, tasks.py) ---
+
+class WebhookIngestionTests(WebhookTestCase):
+    def test_inline_mode_runs_the_handlers_before_answering(self):
+        with bot_api_call() as call:
+            response = self.post_update(message_update(1, '/start'))
+        self.assertEqual(response.json(), {"status": "ok"})
+        self.assertEqual(call.call_args_list[0].args[0], 'sendMessage')
+        flush_interaction_logs()
+        self.assertEqual(BotInteractionLog.objects.get().command_used, '/start')
+
+    @override_settings(TELEGRAM_UPDATE_PROCESSING='celery')
+    def test_celery_mode_only_enqueues(self):
+        with mock.patch('apps.telegram.views.process_telegram_update_task.apply_async') as apply_async, \
+                mock.patch('apps.telegram.views.process_update') as process_update:
+            response = self.post_update(message_update(2, 'hello'))
+        self.assertEqual(response.json(), {"status": "queued"})
+        self.assertEqual(apply_async.call_args.kwargs['args'][0]['update_id'], 2)
+        process_update.assert_not_called()
+
+    @override_settings(TELEGRAM_UPDATE_PROCESSING='celery')
+    def test_unreachable_broker_falls_back_to_inline(self):
+        with mock.patch('apps.telegram.views.process_telegram_update_task.apply_async', side_effect=ConnectionError), \
+                mock.patch('apps.telegram.views.process_update') as process_update, \
+                self.assertLogs('apps.telegram.views', 'ERROR'):
+            response = self.post_update(message_update(3, 'hello'))
+        self.assertEqual(response.json(), {"status": "ok"})
+        process_update.assert_called_once()
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='s3cret')
+    def test_secret_token_is_required_when_configured(self):
+        with mock.patch('apps.telegram.views.process_update') as process_update, \
+                self.assertLogs('apps.telegram.views', 'WARNING'):
+            self.assertEqual(self.post_update(message_update(4, 'x')).status_code, 403)
+            wrong = self.post_update(message_update(5, 'x'), HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='nope')
+            right = self.post_update(message_update(6, 'x'), HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='s3cret')
+        self.assertEqual(wrong.status_code, 403)
+        self.assertEqual(right.status_code, 200)
+        process_update.assert_called_once()
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='s3cret')
+    def test_set_webhook_registers_the_secret_token(self):
+        with bot_api_call() as call:
+            call_command('set_webhook', 'https://bot.example.com/webhook/', stdout=StringIO())
+        method, params = call.call_args.args
+        self.assertEqual(method, 'setWebhook')
+        self.assertEqual(params['url'], 'https://bot.example.com/webhook/')
+        self.assertEqual(params['secret_token'], 's3cret')
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET=None)
+    def test_set_webhook_without_a_secret(self):
+        with bot_api_call() as call:
+            call_command('set_webhook', 'https://bot.example.com/webhook/', stdout=StringIO())
+        self.assertNotIn('secret_token', call.call_args.args[1])
+
+
+# --- Shared Bot API client (bot_api.py) ---
+
+class BotAPIClientTests(TestCase):
+    def setUp(self):
+        from . import bot_api
+        self.bot_api = bot_api
+        bot_api.reset_bot_api()
+        self.addCleanup(bot_api.reset_bot_api)
+
+    def response(self, status_code, body):
+        response = mock.Mock(status_code=status_code)
+        response.json.return_value = body
+        return response
+
+    def test_one_pooled_client_per_process(self):
+        client = self.bot_api.get_bot_api()
+        self.assertIs(client, self.bot_api.get_bot_api())
+        with mock.patch.object(client.session, 'post', return_value=self.response(200, {'ok': True})) as post:
+            client.call('getMe')
+            client.call('getMe')
+        self.assertEqual(post.call_count, 2) # Both calls went through the same keep-alive session
+        self.bot_api.reset_bot_api()
+        self.assertIsNot(client, self.bot_api.get_bot_api())
+
+    @override_settings(TELEGRAM_API_CONNECT_TIMEOUT=1.5, TELEGRAM_API_READ_TIMEOUT=4)
+    def test_timeouts_come_from_settings(self):
+        client = self.bot_api.get_bot_api()
+        with mock.patch.object(client.session, 'post', return_value=self.response(200, {'ok': True})) as post:
+            client.call('getMe')
+        self.assertEqual(post.call_args.kwargs['timeout'], (1.5, 4))
+
+    def test_flood_control_error_carries_retry_after(self):
+        client = self.bot_api.get_bot_api()
+        body = {'ok': False, 'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 7}}
+        with mock.patch.object(client.session, 'post', return_value=self.response(429, body)):
+            with self.assertRaises(self.bot_api.BotAPIError) as raised:
+                client.call('sendMessage', {'chat_id': 1, 'text': 'x'})
+        self.assertEqual((raised.exception.error_code, raised.exception.retry_after), (429, 7))
+
+    def test_network_errors_become_bot_api_errors(self):
+        import requests
+
+        client = self.bot_api.get_bot_api()
+        with mock.patch.object(client.session, 'post', side_effect=requests.exceptions.ConnectTimeout('timed out')):
+            with self.assertRaises(self.bot_api.BotAPIError):
+                client.call('getMe')
+
+    def test_send_helpers_log_failures_and_return_none(self):
+        from .telegram_utils import send_telegram_message
+
+        client = self.bot_api.get_bot_api()
+        with mock.patch.object(client.session, 'post', return_value=self.response(400, {'ok': False, 'description': 'chat not found'})), \
+                self.assertLogs('apps.telegram.telegram_utils', 'ERROR'):
+            self.assertIsNone(send_telegram_message(1, 'x'))
+
+
+# --- Rate-limited outbound dispatcher (outbound.py) ---
+
+class OutboundDispatcherTests(TestCase):
+    def dispatcher(self, call, **kwargs):
+        from .outbound import OutboundDispatcher, RateLimiter
+
+        self.sent = []
+        self.results = []
+
+        def record(method, params):
+            self.sent.append((params['chat_id'], params['text']))
+            return call(params)
+        api = mock.Mock()
+        api.call.side_effect = record
+        return OutboundDispatcher(
+            limiter=RateLimiter(global_rate=1000, per_chat_rate=1000), api=api,
+            on_result=lambda message, ok, result: self.results.append((message.text, ok)), **kwargs
+        )
+
+    def test_transactional_lane_goes_first(self):
+        from .outbound import PRIORITY_MARKETING, PRIORITY_NOTIFICATION, PRIORITY_TRANSACTIONAL, OutboundMessage
+
+        dispatcher = self.dispatcher(lambda params: {'ok': True})
+        dispatcher.submit(OutboundMessage(1, 'promo', priority=PRIORITY_MARKETING))
+        dispatcher.submit(OutboundMessage(2, 'reminder', priority=PRIORITY_NOTIFICATION))
+        dispatcher.submit(OutboundMessage(3, 'deposit confirmed', priority=PRIORITY_TRANSACTIONAL))
+        self.assertEqual(dispatcher.run(), {'sent': 3, 'failed': 0, 'retried': 0})
+        self.assertEqual([text for _, text in self.sent], ['deposit confirmed', 'reminder', 'promo'])
+
+    def test_chat_stays_in_order_while_its_head_backs_off(self):
+        from .bot_api import BotAPIError
+        from .outbound import OutboundMessage
+
+        def call(params):
+            if params['text'] == 'first' and self.sent.count((1, 'first')) == 1:
+                raise BotAPIError('sendMessage', 'Bad Gateway', 502) # Retried after backoff, chat not rate limited
+            return {'ok': True}
+        dispatcher = self.dispatcher(call)
+        for chat_id, text in ((1, 'first'), (1, 'second'), (2, 'other chat')):
+            dispatcher.submit(OutboundMessage(chat_id, text))
+        with mock.patch('apps.telegram.outbound.time.sleep'), \
+                mock.patch('apps.telegram.outbound.time.monotonic', side_effect=itertools.count(time.monotonic(), 0.1)):
+            stats = dispatcher.run()
+        self.assertEqual(stats, {'sent': 3, 'failed': 0, 'retried': 1})
+        self.assertEqual(self.sent, [(1, 'first'), (2, 'other chat'), (1, 'first'), (1, 'second')])
+
+    def test_permanent_errors_are_not_retried(self):
+        from .bot_api import BotAPIError
+        from .outbound import OutboundMessage
+
+        def call(params):
+            raise BotAPIError('sendMessage', 'Forbidden: bot was blocked by the user', 403)
+        dispatcher = self.dispatcher(call)
+        dispatcher.submit(OutboundMessage(1, 'hi'))
+        with self.assertLogs('apps.telegram.outbound', 'ERROR'):
+            self.assertEqual(dispatcher.run()['failed'], 1)
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.results, [('hi', False)])
+
+    def test_single_messages_default_to_the_notification_lane(self):
+        from .outbound import PRIORITY_NOTIFICATION, queue_outbound_message
+
+        with mock.patch('apps.telegram.tasks.dispatch_outbound_messages_task.apply_async') as apply_async:
+            queue_outbound_message(1, 'Your tokens expire tomorrow')
+        self.assertEqual(apply_async.call_args.kwargs['priority'], PRIORITY_NOTIFICATION)
+        self.assertEqual(apply_async.call_args.kwargs['args'][0][0]['priority'], PRIORITY_NOTIFICATION)
+
+    def test_bulk_messages_are_enqueued_a_batch_at_a_time(self):
+        from apps.tokens.utils import warn_token_expiry
+        from .outbound import PRIORITY_NOTIFICATION, queue_outbound_messages
+
+        messages = []
+        for chat_id in range(25):
+            warn_token_expiry(chat_id, 5, 1, lambda chat_id, text: messages.append({'chat_id': chat_id, 'text': text}))
+        with mock.patch('apps.telegram.tasks.dispatch_outbound_messages_task.apply_async') as apply_async:
+            queue_outbound_messages(messages, priority=PRIORITY_NOTIFICATION, batch_size=10)
+        self.assertEqual(apply_async.call_count, 3)
+        self.assertEqual(sum(len(call.kwargs['args'][0]) for call in apply_async.call_args_list), 25)
+        self.assertEqual({call.kwargs['priority'] for call in apply_async.call_args_list}, {PRIORITY_NOTIFICATION})
+
+
+# --- Buffered interaction logs (interaction_log.py) ---
+
+class InteractionLogBufferTests(TestCase):
+    def setUp(self):
+        from .models import TelegramUser
+        self.telegram_user = TelegramUser.objects.create(user_id=5, first_name='Abebe')
+
+    def entry(self, text):
+        from django.utils import timezone
+        return BotInteractionLog(telegram_user=self.telegram_user, message_text=text, timestamp=timezone.now())
+
+    def test_rows_are_written_once_the_batch_is_full(self):
+        from .interaction_log import InteractionLogBuffer
+
+        buffer = InteractionLogBuffer(batch_size=3, max_age=60)
+        with mock.patch.object(buffer, '_ensure_timer'):
+            buffer.add(self.entry('a'))
+            buffer.add(self.entry('b'))
+            self.assertEqual(BotInteractionLog.objects.count(), 0)
+            with self.assertNumQueries(1): # One bulk INSERT for the whole batch
+                buffer.add(self.entry('c'))
+        self.assertEqual(list(BotInteractionLog.objects.order_by('id').values_list('message_text', flat=True)), ['a', 'b', 'c'])
+        self.assertEqual(buffer.pending, [])
+
+    def test_old_buffer_is_written_by_the_next_add(self):
+        from .interaction_log import InteractionLogBuffer
+
+        buffer = InteractionLogBuffer(batch_size=100, max_age=5)
+        with mock.patch.object(buffer, '_ensure_timer'):
+            buffer.add(self.entry('a'))
+            buffer.oldest -= 10
+            buffer.add(self.entry('b'))
+        self.assertEqual(BotInteractionLog.objects.count(), 2)
+
+    def test_timestamp_is_the_interaction_time_not_the_flush_time(self):
+        from .interaction_log import InteractionLogBuffer
+
+        buffer = InteractionLogBuffer(batch_size=100, max_age=60)
+        entry = self.entry('a')
+        with mock.patch.object(buffer, '_ensure_timer'):
+            buffer.add(entry)
+        buffer.flush()
+        self.assertEqual(BotInteractionLog.objects.get().timestamp, entry.timestamp)
+
+    def test_failed_write_is_logged_and_dropped(self):
+        from .interaction_log import InteractionLogBuffer
+
+        buffer = InteractionLogBuffer(batch_size=100, max_age=60)
+        buffer.pending.append(self.entry('a'))
+        with mock.patch.object(BotInteractionLog.objects, 'bulk_create', side_effect=RuntimeError('db down')), \
+                self.assertLogs('apps.telegram.interaction_log', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending, [])
+
+
+# --- Change-detecting TelegramUser upsert (user_cache.py) ---
+
+class TelegramUserUpsertTests(TestCase):
+    def setUp(self):
+        from . import user_cache
+        user_cache._cache = None # Fresh per-process fingerprint cache
+        self.addCleanup(setattr, user_cache, '_cache', None)
+
+    def sync(self, **profile):
+        from .user_cache import sync_telegram_user
+        with self.captureOnCommitCallbacks(execute=True):
+            return sync_telegram_user(dict({'id': 9, 'first_name': 'Abebe'}, **profile))
+
+    def test_unchanged_profile_is_read_not_written(self):
+        from .models import TelegramUser
+
+        telegram_user, created = self.sync()
+        self.assertTrue(created)
+        with self.assertNumQueries(1): # Primary-key SELECT only
+            cached, created = self.sync()
+        self.assertFalse(created)
+        self.assertEqual(cached.updated_at, TelegramUser.objects.get().updated_at)
+
+    def test_cache_hit_keeps_the_account_link(self):
+        from apps.CustomUser.models import CustomUser
+        from .models import TelegramUser
+
+        self.sync()
+        custom_user = CustomUser.objects.create_user('abebe', '9', '0911000000')
+        TelegramUser.objects.filter(pk=9).update(linked_custom_user=custom_user) # Linked outside the bot, e.g. by the Mini App
+        telegram_user, created = self.sync()
+        self.assertFalse(created)
+        self.assertEqual(telegram_user.linked_custom_user_id, custom_user.pk)
+        self.assertIsNotNone(telegram_user.created_at)
+
+    def test_changed_profile_is_written(self):
+        from .models import TelegramUser
+
+        self.sync()
+        self.sync(first_name='Kebede')
+        self.assertEqual(TelegramUser.objects.get().first_name, 'Kebede')
+
+    def test_row_changed_elsewhere_is_rewritten(self):
+        from .models import TelegramUser
+
+        self.sync()
+        TelegramUser.objects.filter(pk=9).update(first_name='Edited in admin')
+        self.sync()
+        self.assertEqual(TelegramUser.objects.get().first_name, 'Abebe')
+
+    def test_deleted_row_is_recreated(self):
+        from .models import TelegramUser
+
+        self.sync()
+        TelegramUser.objects.all().delete()
+        telegram_user, created = self.sync()
+        self.assertTrue(created)
+        self.assertTrue(TelegramUser.objects.filter(pk=9).exists())
+
+
+# --- Webhook deduplication (dedup.py) ---
+
+class WebhookDedupTests(WebhookTestCase):
+    def test_peek_reads_a_leading_update_id_only(self):
+        from .dedup import peek_update_id
+
+        self.assertEqual(peek_update_id(b'{"update_id": 42, "message": {}}'), 42)
+        self.assertIsNone(peek_update_id(b'{"message": {}, "update_id": 42}'))
+        self.assertIsNone(peek_update_id(b'not json'))
+
+    def test_redelivered_update_is_processed_once(self):
+        with mock.patch('apps.telegram.views.process_update') as process_update:
+            first = self.post_update(message_update(77, 'hi'))
+            again = self.post_update(message_update(77, 'hi'))
+            # update_id not first in the body: checked after decoding
+            body = json.dumps({'message': {'text': 'x'}, 'update_id': 78})
+            self.client.post('/webhook/', data=body, content_type='application/json')
+            later = self.client.post('/webhook/', data=body, content_type='application/json')
+        self.assertEqual(first.json(), {"status": "ok"})
+        self.assertEqual(again.json(), {"status": "duplicate"})
+        self.assertEqual(later.json(), {"status": "duplicate"})
+        self.assertEqual(process_update.call_count, 2)
+
+    def test_failed_update_is_accepted_on_redelivery(self):
+        with mock.patch('apps.telegram.views.process_update', side_effect=RuntimeError('boom')), \
+                self.assertLogs('apps.telegram.views', 'ERROR'):
+            self.assertEqual(self.post_update(message_update(90, 'hi')).status_code, 500)
+        with mock.patch('apps.telegram.views.process_update') as process_update:
+            self.assertEqual(self.post_update(message_update(90, 'hi')).json(), {"status": "ok"})
+        process_update.assert_called_once()
+
+    def test_failed_celery_update_is_retried_then_forgotten(self):
+        from .dedup import mark_update_seen
+        from .tasks import process_telegram_update_task
+
+        self.assertTrue(mark_update_seen(91)) # Accepted by the webhook, which answered "queued"
+        with mock.patch('apps.telegram.tasks.process_update', side_effect=RuntimeError('boom')) as process_update:
+            result = process_telegram_update_task.apply(args=(message_update(91, 'hi'),))
+        self.assertIsInstance(result.result, RuntimeError)
+        self.assertEqual(process_update.call_count, 4) # First run and three retries
+        self.assertTrue(mark_update_seen(91)) # A replay of it is not dropped
+
+    def test_unreachable_dedup_cache_accepts_updates(self):
+        from .dedup import forget_update, mark_update_seen
+
+        broken = mock.Mock(add=mock.Mock(side_effect=ConnectionError), delete=mock.Mock(side_effect=ConnectionError))
+        with mock.patch('apps.telegram.dedup._cache', return_value=broken), \
+                self.assertLogs('apps.telegram.dedup', 'WARNING'):
+            self.assertTrue(mark_update_seen(92))
+            self.assertTrue(mark_update_seen(92))
+            forget_update(92)
+
+    def test_dedup_uses_the_shared_cache_by_default(self):
+        from django.conf import settings as project_settings
+        from microfinance_backend import settings as defaults
+
+        self.assertEqual(defaults.TELEGRAM_DEDUP_CACHE_ALIAS, 'shared')
+        self.assertEqual(project_settings.CACHES['shared']['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+
+
+# --- Table-driven router (router.py) ---
+
+class RouterTests(WebhookTestCase):
+    def test_lookup_by_command_callback_prefix_and_state(self):
+        from .router import Router
+
+        router = Router()
+        start, approve, exact, awaiting, unknown = (lambda ctx: None for _ in range(5))
+        router.command('/start')(start)
+        router.callback('approve_kyc_')(approve)
+        router.callback('approve_kyc_all')(exact)
+        router.state(7)(awaiting)
+        router.fallback('callback')(unknown)
+        self.assertEqual(router.resolve_command('/start'), ('command:/start', start))
+        self.assertEqual(router.resolve_callback('approve_kyc_42'), ('callback:approve_kyc_', approve))
+        self.assertEqual(router.resolve_callback('approve_kyc_all'), ('callback:approve_kyc_all', exact))
+        self.assertEqual(router.resolve_callback('reject_kyc_42'), ('callback:<unknown>', unknown))
+        self.assertEqual(router.resolve_text(7), ('state:7', awaiting))
+        self.assertEqual(router.resolve_text(None), ('text', None))
+
+    def test_dispatch_records_latency_and_errors_per_route(self):
+        from .router import Router
+
+        router = Router()
+        router.dispatch('command:/ok', lambda: 'done')
+        with self.assertRaises(ValueError):
+            router.dispatch('command:/boom', mock.Mock(side_effect=ValueError))
+        metrics = router.metrics_snapshot()
+        self.assertEqual((metrics['command:/ok']['count'], metrics['command:/ok']['errors']), (1, 0))
+        self.assertEqual((metrics['command:/boom']['count'], metrics['command:/boom']['errors']), (1, 1))
+
+    def test_histogram_percentiles_use_bucket_bounds(self):
+        from .router import LatencyHistogram
+
+        histogram = LatencyHistogram()
+        for elapsed_ms in [1] * 90 + [40] * 9 + [7000]:
+            histogram.observe(elapsed_ms)
+        self.assertEqual(histogram.percentile(0.5), 5.0)
+        self.assertEqual(histogram.percentile(0.95), 50.0)
+        self.assertEqual(histogram.percentile(1.0), 7000)
+
+    @override_settings(TELEGRAM_CALLBACK_ACK_MODE='sync')
+    def test_updates_reach_their_handlers_end_to_end(self):
+        from .router import router
+
+        with bot_api_call() as call:
+            for update_id, text in enumerate(['/help', '/HELP extra', 'hello', '/nope'], start=500):
+                self.post_update(message_update(update_id, text))
+            self.post_update({'update_id': 600, 'callback_query': {
+                'id': 'q1', 'data': 'some_simple_action', 'from': {'id': 5}, 'message': {'chat': {'id': 5}, 'message_id': 3},
+            }})
+        flush_interaction_logs()
+        logs = list(BotInteractionLog.objects.order_by('id').values_list('command_used', 'response_text'))
+        self.assertEqual([command for command, _ in logs], ['/help', '/help', None, '/nope'])
+        self.assertIn('hello', logs[2][1])
+        self.assertEqual(logs[3][1], translate_en('UNKNOWN_COMMAND'))
+        methods = [c.args[0] for c in call.call_args_list]
+        self.assertEqual(methods.count('sendMessage'), 5)
+        self.assertEqual(methods.count('answerCallbackQuery'), 1)
+        self.assertIn('callback:some_simple_action', router.metrics_snapshot())
+
+
+# --- Conversation state backends (states.py) ---
+
+class ConversationStateTests(TestCase):
+    def backend(self, kind, ttl=3600):
+        from . import states
+        states._backend = None
+        self.addCleanup(setattr, states, '_backend', None)
+        with override_settings(TELEGRAM_STATE_BACKEND=kind, TELEGRAM_STATE_TTL=ttl):
+            return states.get_state_backend()
+
+    def check_round_trip(self, kind):
+        from . import states
+
+        self.backend(kind)
+        states.set_user_state(1, states.STATE_AWAITING_NATIONAL_ID)
+        states.set_user_state(2, states.STATE_AWAITING_PASSWORD)
+        self.assertEqual(states.get_user_state(1), states.STATE_AWAITING_NATIONAL_ID)
+        self.assertEqual(states.get_user_states([1, 2, 3]), {1: 8, 2: 3, 3: states.STATE_NONE})
+        states.set_user_state(1, states.STATE_NONE)
+        self.assertEqual(states.get_user_state(1), states.STATE_NONE)
+
+    def test_database_backend(self):
+        self.check_round_trip('db')
+
+    def test_cache_backend(self):
+        cache.clear()
+        self.check_round_trip('cache')
+
+    def test_database_expiry_slides_with_activity(self):
+        import datetime
+        from django.utils import timezone
+        from .models import ConversationState
+
+        backend = self.backend('db', ttl=3600)
+        ConversationState.objects.create(user_id=1, state=8, expires_at=timezone.now() + datetime.timedelta(minutes=5))
+        self.assertEqual(backend.get(1), 8)
+        remaining = ConversationState.objects.get().expires_at - timezone.now()
+        self.assertGreater(remaining, datetime.timedelta(minutes=59)) # Pushed forward by the read
+        with self.assertNumQueries(1): # Recently refreshed: read only
+            backend.get(1)
+
+    def test_cache_expiry_slides_with_activity(self):
+        cache.clear()
+        backend = self.backend('cache', ttl=60)
+        backend.set(1, 8)
+        with mock.patch.object(backend.cache, 'touch', wraps=backend.cache.touch) as touch:
+            self.assertEqual(backend.get(1), 8)
+            backend.get(2) # No state: nothing to refresh
+        touch.assert_called_once_with('tg_state:1', 60)
+
+    def test_expired_rows_read_as_no_state_and_are_purged(self):
+        import datetime
+        from django.utils import timezone
+        from . import states
+        from .models import ConversationState
+
+        self.backend('db')
+        ConversationState.objects.create(user_id=9, state=2, expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(states.get_user_state(9), states.STATE_NONE)
+        self.assertEqual(states.purge_expired_states(), 1)
+        self.assertFalse(ConversationState.objects.exists())
+
+
+# --- getUpdates long polling (polling.py) ---
+
+@override_settings(TELEGRAM_DEDUP_CACHE_ALIAS='default')
+class UpdatePollerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def poller(self, batches, **kwargs):
+        from .polling import UpdatePoller
+
+        self.calls = []
+
+        def call(method, params=None, timeout=None):
+            self.calls.append((method, params))
+            if method == 'getUpdates' and params.get('limit') != 1:
+                return {'ok': True, 'result': batches.pop(0) if batches else []}
+            return {'ok': True, 'result': True}
+        return UpdatePoller(api=mock.Mock(call=mock.Mock(side_effect=call)), **kwargs)
+
+    def test_drains_the_backlog_and_confirms_the_offset(self):
+        batches = [[message_update(10 + i, '/help', user_id=i % 3) for i in range(7)], [message_update(12, '/help')]]
+        poller = self.poller(batches, workers=3)
+        with mock.patch('apps.telegram.polling.process_update') as process_update:
+            stats = poller.run(once=True)
+        self.assertEqual(stats, {'batches': 2, 'received': 8, 'handled': 7}) # update 12 was already handled
+        self.assertEqual(process_update.call_count, 7)
+        polls = [params for method, params in self.calls if method == 'getUpdates']
+        self.assertNotIn('offset', polls[0])
+        self.assertEqual(polls[1]['offset'], 17)
+        self.assertEqual(self.calls[-1], ('getUpdates', {'offset': 17, 'limit': 1, 'timeout': 0}))
+
+    def test_one_senders_updates_stay_in_order(self):
+        seen = []
+        batch = [message_update(update_id, str(update_id), user_id=update_id % 2) for update_id in range(20, 40)]
+        poller = self.poller([batch], workers=4)
+        with mock.patch('apps.telegram.polling.process_update', side_effect=lambda update: seen.append(update['update_id'])):
+            poller.run(once=True)
+        for user_id in (0, 1):
+            sender_ids = [update_id for update_id in seen if update_id % 2 == user_id]
+            self.assertEqual(sender_ids, sorted(sender_ids))
+
+    def test_prepare_removes_the_webhook(self):
+        poller = self.poller([])
+        poller.prepare(drop_pending_updates=True)
+        self.assertEqual(self.calls, [('deleteWebhook', {'drop_pending_updates': True})])
+
+
+# --- Resumable broadcasts (broadcast.py) ---
+
+class BroadcastTests(TestCase):
+    def setUp(self):
+        from .models import BroadcastJob, TelegramUser
+        from .outbound import RateLimiter
+
+        TelegramUser.objects.bulk_create([TelegramUser(user_id=user_id) for user_id in range(1, 51)] + [TelegramUser(user_id=99, is_bot=True)])
+        self.job = BroadcastJob.objects.create(name='Launch', text='Hello')
+        self.limiter = RateLimiter(global_rate=100000, per_chat_rate=1000)
+        self.sent = []
+
+    def call(self, method, params=None, timeout=None):
+        from .bot_api import BotAPIError
+
+        if params['chat_id'] == 7:
+            raise BotAPIError(method, 'Forbidden: bot was blocked by the user', error_code=403)
+        self.sent.append(params['chat_id'])
+        return {'ok': True, 'result': {'message_id': params['chat_id'] * 10}}
+
+    def runner(self, **kwargs):
+        from .broadcast import BroadcastRunner
+        return BroadcastRunner(self.job, limiter=self.limiter, api=mock.Mock(call=mock.Mock(side_effect=self.call)), **kwargs)
+
+    def test_job_runs_to_completion_across_runs(self):
+        from .broadcast import RUN_BUSY, RUN_FINISHED, RUN_YIELDED
+        from .models import BroadcastRecipient
+
+        with self.assertLogs('apps.telegram', 'INFO'):
+            self.assertEqual(self.runner(page_size=20, concurrency=4).run(time_budget=0), RUN_YIELDED)
+            self.assertEqual(self.runner(page_size=20).run(), RUN_FINISHED)
+        self.assertEqual(self.runner().run(), RUN_BUSY) # Completed jobs are not runnable
+        self.job.refresh_from_db()
+        self.assertEqual(
+            (self.job.status, self.job.total_recipients, self.job.sent_count, self.job.failed_count, self.job.cursor, self.job.lease_owner),
+            ('COMPLETED', 50, 49, 1, 50, None),
+        )
+        self.assertEqual(sorted(self.sent), [user_id for user_id in range(1, 51) if user_id != 7])
+        self.assertEqual(BroadcastRecipient.objects.get(telegram_user_id=3).message_id, 30)
+        self.assertFalse(BroadcastRecipient.objects.get(telegram_user_id=7).delivered)
+
+    def test_replayed_page_is_not_counted_twice(self):
+        runner = self.runner(page_size=10)
+        self.assertTrue(runner.claim())
+        page = runner.next_page()
+        with self.assertLogs('apps.telegram.broadcast', 'INFO'):
+            for _ in range(2): # e.g. the page is sent again after a crash before the task was acknowledged
+                results = [(user_id, True, {'result': {'message_id': 1}}) for user_id in page]
+                self.assertTrue(runner.checkpoint(page, results, time.monotonic(), len(results)))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.sent_count, self.job.failed_count, self.job.recipients.count()), (10, 0, 10))
+
+    def test_worker_that_lost_its_lease_cannot_checkpoint_or_release(self):
+        from .broadcast import RUN_LOST_LEASE
+        from .models import BroadcastJob
+
+        stale = self.runner(page_size=10)
+
+        def send_page_while_stuck(executor, user_ids):
+            # The lease runs out and another worker claims the job before this page is checkpointed
+            BroadcastJob.objects.filter(pk=self.job.pk).update(lease_expires_at=None)
+            self.assertTrue(successor.claim())
+            return [(user_id, True, {}) for user_id in user_ids]
+        successor = self.runner(page_size=10)
+        with mock.patch.object(stale, 'send_page', side_effect=send_page_while_stuck), \
+                self.assertLogs('apps.telegram.broadcast', 'WARNING'):
+            self.assertEqual(stale.run(), RUN_LOST_LEASE)
+        self.assertFalse(stale.renew_lease())
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.sent_count, self.job.cursor), (0, 0)) # Nothing checkpointed by the stale worker
+        self.assertEqual(self.job.lease_owner, successor.lease_owner) # and the successor's lease was not released
+
+    def test_lease_is_renewed_while_a_page_is_sending(self):
+        runner = self.runner(page_size=50, concurrency=1, lease_seconds=0.3)
+
+        def slow_call(method, params=None, timeout=None):
+            time.sleep(0.01)
+            return {'ok': True, 'result': {}}
+        runner.api = mock.Mock(call=mock.Mock(side_effect=slow_call))
+        with mock.patch.object(runner, 'renew_lease', wraps=runner.renew_lease) as renew_lease, \
+                self.assertLogs('apps.telegram.broadcast', 'INFO'):
+            runner.run(time_budget=0.01)
+        self.assertGreaterEqual(renew_lease.call_count, 2)
+
+
+# --- Pre-serialized keyboards (menus.py) ---
+
+class MenuMarkupTests(TestCase):
+    def setUp(self):
+        from .menus import clear_markup_cache
+        clear_markup_cache()
+        self.addCleanup(clear_markup_cache)
+
+    def test_menu_is_serialized_once_and_reused(self):
+        from . import menus
+
+        with mock.patch('apps.telegram.menus.build_markup', wraps=menus.build_markup) as build_markup:
+            first = menus.get_customer_menu('en')
+            second = menus.get_customer_menu('en')
+        self.assertIs(first, second)
+        build_markup.assert_called_once()
+        markup = json.loads(first)
+        self.assertEqual(len(markup['keyboard']), 3)
+        self.assertTrue(markup['resize_keyboard'])
+
+    def test_languages_are_cached_separately(self):
+        from .menus import get_yes_no_keyboard
+
+        english = json.loads(get_yes_no_keyboard('en'))['inline_keyboard'][0]
+        amharic = json.loads(get_yes_no_keyboard('am'))['inline_keyboard'][0]
+        self.assertEqual([button['callback_data'] for button in amharic], ['yes', 'no'])
+        self.assertNotEqual([button['text'] for button in english], [button['text'] for button in amharic])
+
+    def test_template_is_filled_per_message(self):
+        from .menus import get_kyc_review_keyboard
+
+        buttons = json.loads(get_kyc_review_keyboard(42))['inline_keyboard'][0]
+        self.assertEqual([button['callback_data'] for button in buttons], ['approve_kyc_42', 'reject_kyc_42'])
+        # Values are escaped like any JSON string value
+        self.assertEqual(json.loads(get_kyc_review_keyboard('a"b'))['inline_keyboard'][0][0]['callback_data'], 'approve_kyc_a"b')
+
+    def test_serialized_markup_is_sent_unchanged(self):
+        from .menus import get_customer_menu
+        from .telegram_utils import send_telegram_message
+
+        with bot_api_call() as call:
+            send_telegram_message(1, 'Menu', reply_markup=get_customer_menu())
+        self.assertEqual(call.call_args.args[1]['reply_markup'], get_customer_menu())
+
+
+# --- Message catalog (catalog.py, locales/) ---
+
+class MessageCatalogTests(WebhookTestCase):
+    def setUp(self):
+        super().setUp()
+        from . import catalog
+        catalog._language_cache.clear()
+        self.addCleanup(catalog._language_cache.clear)
+
+    def test_compiled_template_matches_str_format(self):
+        from .catalog import CompiledTemplate
+
+        self.assertEqual(CompiledTemplate("a {x} {{b}} {y!r}").render(x=1, y='z'), "a 1 {b} 'z'")
+        self.assertEqual(CompiledTemplate("no fields {{}}").render(), "no fields {}")
+
+    def test_language_matching_and_fallback(self):
+        from .catalog import translate
+
+        self.assertEqual(translate('WELCOME_BACK', 'am-ET', username='Abebe'), 'እንኳን ደህና ተመለሱ፣ Abebe!')
+        self.assertEqual(translate('CANCEL_BUTTON', 'fr'), translate('CANCEL_BUTTON', 'en')) # Unsupported: default language
+        self.assertEqual(translate('CANCEL_BUTTON', None), translate('CANCEL_BUTTON', 'en'))
+
+    def test_every_translation_has_the_english_fields(self):
+        import string
+        from .catalog import get_catalog
+
+        catalog = get_catalog()
+        fields = lambda text: {name for _, name, _, _ in string.Formatter().parse(text) if name}
+        english = catalog.bundle('en')
+        for language in ('am', 'om'):
+            for key, template in catalog.bundle(language).items():
+                self.assertEqual(fields(template.text), fields(english[key].text), f"{language}:{key}")
+
+    def test_account_language_wins_over_the_client_and_is_cached(self):
+        from apps.CustomUser.models import CustomUser
+        from .catalog import forget_user_language, resolve_language
+        from .models import TelegramUser
+
+        custom_user = CustomUser.objects.create(username='chala', phone_number='1', telegram_id='77', preferred_language='om')
+        TelegramUser.objects.create(user_id=77, linked_custom_user=custom_user)
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_language(77, 'am'), 'om')
+            self.assertEqual(resolve_language(77, 'am'), 'om')
+        CustomUser.objects.filter(pk=custom_user.pk).update(preferred_language='am')
+        forget_user_language(77)
+        self.assertEqual(resolve_language(77, 'en'), 'am')
+        self.assertEqual(resolve_language(79, 'de'), 'en') # Unknown user, unsupported client language
+
+    def test_changed_preferred_language_is_used_for_the_next_reply(self):
+        from apps.CustomUser.models import CustomUser
+        from .catalog import translate
+        from .models import TelegramUser
+
+        custom_user = CustomUser.objects.create(username='chala', phone_number='1', telegram_id='9001', preferred_language='om')
+        TelegramUser.objects.create(user_id=9001, first_name='Chala', linked_custom_user=custom_user)
+        help_text = lambda language: translate('BOT_HELP_TEXT', language)
+        with bot_api_call() as call:
+            self.post_update(message_update(1, '/help', user_id=9001))
+        self.assertEqual(call.call_args.args[1]['text'], help_text('om')) # Now cached for this user
+
+        custom_user.preferred_language = 'am'
+        with self.captureOnCommitCallbacks(execute=True):
+            custom_user.save()
+        with bot_api_call() as call:
+            self.post_update(message_update(2, '/help', user_id=9001))
+        self.assertEqual(call.call_args.args[1]['text'], help_text('am'))
+
+    def test_bot_replies_in_the_clients_language(self):
+        update = message_update(9001, '/start')
+        update['message']['from'].update(first_name='Chala', language_code='om')
+        with bot_api_call() as call:
+            self.post_update(update)
+        self.assertIn('Akkam Chala', call.call_args.args[1]['text'])
+
+
+# --- Interaction log archival (retention.py) ---
+
+class InteractionArchiveTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from .models import TelegramUser
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.telegram_user = TelegramUser.objects.create(user_id=5, first_name='Abebe')
+
+    def log(self, days_ago, text, command=None):
+        import datetime
+        from django.utils import timezone
+        return BotInteractionLog.objects.create(
+            telegram_user=self.telegram_user, message_text=text, command_used=command,
+            response_text=f"reply to {text}", timestamp=timezone.now() - datetime.timedelta(days=days_ago),
+        )
+
+    def test_archived_rows_are_deleted_and_read_back(self):
+        from .retention import archive_interaction_logs, iter_archived_interactions
+
+        old = [self.log(40, 'first', '/start'), self.log(40, 'second'), self.log(35, 'third', '/balance')]
+        recent = self.log(1, 'recent')
+        self.assertEqual(archive_interaction_logs(days=30, chunk_size=2, root=self.root), 3)
+
+        self.assertEqual(list(BotInteractionLog.objects.values_list('id', flat=True)), [recent.id])
+        archived = list(iter_archived_interactions(root=self.root))
+        self.assertEqual([row['id'] for row in archived], [row.id for row in old])
+        self.assertEqual(archived[0]['message_text'], 'first')
+        self.assertEqual(archived[0]['telegram_user_id'], 5)
+        self.assertEqual(archived[0]['timestamp'], old[0].timestamp)
+
+    def test_rerun_after_an_interrupted_delete_does_not_duplicate(self):
+        from .retention import archive_interaction_logs, iter_archived_interactions
+
+        self.log(40, 'first')
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=RuntimeError('killed')):
+            with self.assertRaises(RuntimeError):
+                archive_interaction_logs(days=30, root=self.root)
+        self.assertEqual(BotInteractionLog.objects.count(), 1) # Written to the archive but not deleted
+        archive_interaction_logs(days=30, root=self.root)
+        self.assertEqual(BotInteractionLog.objects.count(), 0)
+        self.assertEqual(len(list(iter_archived_interactions(root=self.root))), 1)
+
+    def test_dry_run_counts_without_moving(self):
+        from .retention import archive_files, archive_interaction_logs
+
+        self.log(40, 'first')
+        self.assertEqual(archive_interaction_logs(days=30, root=self.root, dry_run=True), 1)
+        self.assertEqual(BotInteractionLog.objects.count(), 1)
+        self.assertEqual(archive_files(root=self.root), [])
+
+    def test_filters_and_day_range(self):
+        import datetime
+        from django.utils import timezone
+        from .retention import archive_interaction_logs, iter_archived_interactions
+
+        self.log(40, 'Hello', '/start')
+        self.log(35, 'balance please', '/balance')
+        archive_interaction_logs(days=30, root=self.root)
+
+        def texts(**filters):
+            return [row['message_text'] for row in iter_archived_interactions(root=self.root, **filters)]
+
+        self.assertEqual(texts(command='/balance'), ['balance please'])
+        self.assertEqual(texts(contains='HELLO'), ['Hello'])
+        self.assertEqual(texts(contains='reply to balance'), ['balance please']) # Response text is searched too
+        self.assertEqual(texts(telegram_user_id=6), [])
+        since = (timezone.now() - datetime.timedelta(days=37)).astimezone(datetime.timezone.utc).date()
+        self.assertEqual(texts(since=since), ['balance please'])
+
+    def test_query_command(self):
+        from .retention import archive_interaction_logs
+
+        self.log(40, 'first', '/start')
+        self.log(40, 'second')
+        archive_interaction_logs(days=30, root=self.root)
+
+        out = StringIO()
+        call_command('query_interaction_archive', '--count', '--archive-dir', self.root, stdout=out)
+        self.assertEqual(out.getvalue().strip(), '2')
+        out = StringIO()
+        call_command('query_interaction_archive', '--command', '/start', '--archive-dir', self.root, stdout=out)
+        row = json.loads(out.getvalue())
+        self.assertEqual(row['message_text'], 'first')
+
+
+# --- Incremental interaction rollups (rollups.py) ---
+
+class InteractionRollupTests(TestCase):
+    def setUp(self):
+        from .models import TelegramUser
+        self.telegram_user = TelegramUser.objects.create(user_id=5, first_name='Abebe', language_code='am')
+
+    def log(self, command, minutes_ago=60):
+        import datetime
+        from django.utils import timezone
+        return BotInteractionLog.objects.create(
+            telegram_user=self.telegram_user, command_used=command,
+            timestamp=timezone.now() - datetime.timedelta(minutes=minutes_ago),
+        )
+
+    def totals(self, **kwargs):
+        from .rollups import rollup_totals
+        return {row['command_used']: row['total'] for row in rollup_totals(group_by=('command_used',), **kwargs)}
+
+    def test_runs_only_count_new_rows(self):
+        from .models import RollupCheckpoint
+        from .rollups import update_interaction_rollups
+
+        self.log('/start')
+        self.log('/balance')
+        self.assertEqual(update_interaction_rollups(lag=0), 2)
+        self.assertEqual(update_interaction_rollups(lag=0), 0)
+        newest = self.log('/balance')
+        self.assertEqual(update_interaction_rollups(lag=0), 1)
+
+        self.assertEqual(self.totals(), {'/start': 1, '/balance': 2})
+        self.assertEqual(RollupCheckpoint.objects.get().last_id, newest.id)
+
+    def test_hourly_and_daily_counts_agree(self):
+        from .models import InteractionRollup
+        from .rollups import update_interaction_rollups
+
+        self.log('/start', minutes_ago=30)
+        self.log('/start', minutes_ago=150)
+        self.log(None)
+        update_interaction_rollups(lag=0, chunk_size=1) # One row per transaction
+        hourly = self.totals(period=InteractionRollup.PERIOD_HOUR)
+        self.assertEqual(hourly, self.totals())
+        self.assertEqual(hourly, {'/start': 2, '': 1})
+        self.assertEqual(InteractionRollup.objects.filter(period=InteractionRollup.PERIOD_HOUR, command_used='/start').count(), 2)
+
+    def test_language_and_new_user_split(self):
+        from .rollups import rollup_totals, update_interaction_rollups
+
+        self.log('/start')
+        update_interaction_rollups(lag=0)
+        row = rollup_totals(group_by=('language', 'is_new_user')).get()
+        self.assertEqual((row['language'], row['is_new_user'], row['total']), ('am', True, 1))
+
+    @override_settings(TELEGRAM_ROLLUP_LAG=600)
+    def test_rows_inside_the_lag_wait_for_the_next_run(self):
+        from .rollups import update_interaction_rollups
+
+        self.log('/start', minutes_ago=60)
+        self.log('/balance', minutes_ago=1)
+        self.log('/start', minutes_ago=60) # Committed late, behind a row still inside the lag
+        self.assertEqual(update_interaction_rollups(), 1)
+        self.assertEqual(update_interaction_rollups(lag=0), 2)
+        self.assertEqual(self.totals(), {'/start': 2, '/balance': 1})
+
+    @override_settings(TELEGRAM_ROLLUP_LAG=600)
+    def test_late_commit_below_a_visible_row_is_counted(self):
+        import datetime
+        from django.utils import timezone
+        from .models import RollupCheckpoint
+        from .rollups import update_interaction_rollups
+
+        # Id 10 is visible while the batch holding id 5 has not committed yet
+        BotInteractionLog.objects.create(id=10, telegram_user=self.telegram_user, command_used='/balance')
+        self.assertEqual(update_interaction_rollups(), 0)
+        self.assertEqual(RollupCheckpoint.objects.get().last_id, 0)
+        BotInteractionLog.objects.create(
+            id=5, telegram_user=self.telegram_user, command_used='/start',
+            timestamp=timezone.now() - datetime.timedelta(seconds=30),
+        )
+        self.assertEqual(update_interaction_rollups(lag=0), 2)
+        self.assertEqual(self.totals(), {'/start': 1, '/balance': 1})
+
+
+# --- Webhook replay load testing (loadtest.py) ---
+
+class ReplayLoadTests(TestCase):
+    def test_synthetic_updates_are_reproducible_and_mixed(self):
+        from .loadtest import synthesize_updates
+
+        updates = synthesize_updates(200, users=10, new_user_ratio=0.2, seed=7, first_update_id=1, first_user_id=100)
+        self.assertEqual(updates, synthesize_updates(200, users=10, new_user_ratio=0.2, seed=7, first_update_id=1, first_user_id=100))
+        self.assertEqual([update['update_id'] for update in updates], list(range(1, 201)))
+        self.assertTrue(any('callback_query' in update for update in updates))
+        self.assertTrue(any(update.get('message', {}).get('text', '').startswith('/') for update in updates))
+        senders = [(update.get('message') or update.get('callback_query'))['from']['id'] for update in updates]
+        new_users = [sender for sender in senders if sender >= 110]
+        self.assertEqual(len(new_users), len(set(new_users))) # First-time users are never reused
+        self.assertTrue(all(100 <= sender < 110 for sender in senders if sender < 110))
+
+    def test_captured_updates_round_trip(self):
+        import os
+        import tempfile
+        from .loadtest import capture_update, load_captured_updates
+
+        path = os.path.join(tempfile.mkdtemp(), 'updates.ndjson')
+        self.addCleanup(os.remove, path)
+        with override_settings(TELEGRAM_CAPTURE_UPDATES_FILE=path):
+            capture_update(b'{"update_id": 1,\n "message": {}}')
+            capture_update(b'{"update_id": 2}')
+        self.assertEqual(load_captured_updates(path), [{'update_id': 1, 'message': {}}, {'update_id': 2}])
+
+    def test_report_percentiles_and_errors(self):
+        from .loadtest import ReplayReport, percentile
+
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.99), 4)
+        self.assertEqual(percentile([], 0.5), 0.0)
+        report = ReplayReport([(0.010, 200, 4), (0.020, 200, 6), (0.030, 500, 8), (0.040, None, 0)], elapsed=2.0, bot_api_calls=6).as_dict()
+        self.assertEqual(report['throughput_rps'], 2.0)
+        self.assertEqual(report['latency_ms']['p50'], 20.0)
+        self.assertEqual(report['latency_ms']['max'], 40.0)
+        self.assertEqual(report['queries_per_update']['avg'], 4.5)
+        self.assertEqual(report['bot_api_calls_per_update'], 1.5)
+        self.assertEqual((report['errors'], report['error_rate']), (2, 0.5))
+
+    def test_stub_bot_api_answers_every_method(self):
+        import requests
+        from .loadtest import StubBotAPIServer
+
+        with StubBotAPIServer() as stub:
+            response = requests.post(f"{stub.base_url}/botTOKEN/sendMessage", json={'chat_id': 1, 'text': 'hi'}, timeout=5)
+        self.assertTrue(response.json()['ok'])
+        self.assertEqual(stub.calls, 1)
+
+
+@override_settings(TELEGRAM_DEDUP_CACHE_ALIAS='default')
+class ReplayRunTests(TransactionTestCase):
+    # Not TestCase: the replay's worker threads need to see each other's committed rows
+    def setUp(self):
+        cache.clear()
+
+    def test_replay_command_reports_every_update(self):
+        out = StringIO()
+        call_command('replay_webhook_load', '--count', '6', '--seed', '1', '--concurrency', '1', '--stub-latency', '0', '--json', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['updates'], 6)
+        self.assertEqual(report['errors'], 0)
+        self.assertGreater(report['queries_per_update']['avg'], 0)
+        self.assertGreater(report['bot_api_calls_per_update'], 0)
+
+
+# --- Callback query acknowledgement modes (telegram_utils.py) ---
+
+class CallbackAckTests(WebhookTestCase):
+    def callback_update(self, update_id, data='some_simple_action'):
+        return {'update_id': update_id, 'callback_query': {
+            'id': f'cb{update_id}', 'from': {'id': 5, 'first_name': 'Abebe'}, 'data': data,
+            'message': {'message_id': 1, 'chat': {'id': 5, 'type': 'private'}, 'date': 0},
+        }}
+
+    def methods(self, call):
+        return [args.args[0] for args in call.call_args_list]
+
+    @override_settings(TELEGRAM_CALLBACK_ACK_MODE='background')
+    def test_background_ack_runs_off_the_request_thread(self):
+        import threading
+
+        acked = threading.Event()
+        threads = []
+
+        def record(method, params=None):
+            if method == 'answerCallbackQuery':
+                threads.append(threading.current_thread().name)
+                acked.set()
+            return {'ok': True}
+
+        with mock.patch('apps.telegram.bot_api.BotAPIClient.call', side_effect=record):
+            response = self.post_update(self.callback_update(700))
+            self.assertTrue(acked.wait(5))
+        self.assertEqual(response.json(), {'status': 'ok'})
+        self.assertTrue(threads[0].startswith('tg-ack'))
+
+    @override_settings(TELEGRAM_CALLBACK_ACK_MODE='sync')
+    def test_sync_ack_is_sent_before_the_handler_replies(self):
+        with bot_api_call() as call:
+            response = self.post_update(self.callback_update(701))
+        self.assertEqual(response.json(), {'status': 'ok'})
+        self.assertEqual(self.methods(call)[0], 'answerCallbackQuery')
+        self.assertEqual(call.call_args_list[0].args[1], {'callback_query_id': 'cb701'})
+
+    @override_settings(TELEGRAM_CALLBACK_ACK_MODE='webhook_response')
+    def test_webhook_response_ack_saves_the_api_call(self):
+        with bot_api_call() as call:
+            response = self.post_update(self.callback_update(702))
+        self.assertEqual(response.json(), {'method': 'answerCallbackQuery', 'callback_query_id': 'cb702'})
+        self.assertNotIn('answerCallbackQuery', self.methods(call))
+
+    @override_settings(TELEGRAM_CALLBACK_ACK_MODE='webhook_response', TELEGRAM_UPDATE_PROCESSING='celery')
+    def test_queued_update_is_not_acknowledged_twice(self):
+        with mock.patch('apps.telegram.views.process_telegram_update_task.apply_async') as apply_async:
+            response = self.post_update(self.callback_update(703))
+        self.assertEqual(response.json()['method'], 'answerCallbackQuery')
+        self.assertEqual(apply_async.call_args.kwargs['kwargs'], {'callback_answered': True})
+
+
+# --- KYC ID documents sent to the bot (processing.py, files.py) ---
+
+def telegram_download(content):
+    """A streamed Bot API file download serving `content`."""
+    import io
+    import requests
+
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(content)
+    return response
+
+
+class KYCDocumentTests(WebhookTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from apps.CustomUser.models import CustomUser
+        from apps.kyc.models import KYCProfile
+        from .models import TelegramUser
+
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        custom_user = CustomUser.objects.create_user('abebe', '5', '0911000000')
+        TelegramUser.objects.create(user_id=5, first_name='Abebe', linked_custom_user=custom_user)
+        self.kyc_profile = KYCProfile.objects.create(user=custom_user, national_id_number='ET-1', id_document='')
+
+    def photo_update(self, update_id, file_size=1000):
+        update = message_update(update_id, '')
+        del update['message']['text']
+        update['message']['photo'] = [
+            {'file_id': 'small', 'file_unique_id': 'u-small', 'file_size': 10},
+            {'file_id': 'large', 'file_unique_id': 'u-large', 'file_size': file_size},
+        ]
+        return update
+
+    def replies(self, call):
+        return [args.args[1]['text'] for args in call.call_args_list if args.args[0] == 'sendMessage']
+
+    def test_kyc_command_then_photo_queues_the_download(self):
+        from .states import STATE_AWAITING_ID_DOCUMENT, STATE_NONE, get_user_state
+
+        with bot_api_call() as call, \
+                mock.patch('apps.telegram.tasks.download_kyc_document_task.apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.post_update(message_update(800, '/kyc'))
+            self.assertEqual(get_user_state(5), STATE_AWAITING_ID_DOCUMENT)
+            self.post_update(self.photo_update(801))
+
+        self.assertEqual(self.replies(call), [translate_en('REQUEST_ID_DOCUMENT'), translate_en('KYC_SUBMITTED')])
+        self.assertEqual(apply_async.call_args.kwargs['args'], (self.kyc_profile.pk, 'large', 'u-large', 'image/jpeg'))
+        self.assertEqual(get_user_state(5), STATE_NONE)
+
+    def test_kyc_command_without_a_profile(self):
+        self.kyc_profile.delete()
+        with bot_api_call() as call:
+            self.post_update(message_update(810, '/kyc'))
+        self.assertEqual(self.replies(call), [translate_en('KYC_PROFILE_MISSING')])
+
+    def test_approved_profile_is_not_asked_again(self):
+        from .states import STATE_NONE, get_user_state
+
+        self.kyc_profile.status = 'APPROVED'
+        self.kyc_profile.save()
+        with bot_api_call() as call:
+            self.post_update(message_update(820, '/kyc'))
+        self.assertEqual(self.replies(call), [translate_en('KYC_ALREADY_APPROVED')])
+        self.assertEqual(get_user_state(5), STATE_NONE)
+
+    def test_oversized_photo_is_refused_and_the_flow_stays_open(self):
+        from .states import STATE_AWAITING_ID_DOCUMENT, get_user_state, set_user_state
+
+        set_user_state(5, STATE_AWAITING_ID_DOCUMENT)
+        with bot_api_call() as call, mock.patch('apps.telegram.tasks.download_kyc_document_task.apply_async') as apply_async:
+            self.post_update(self.photo_update(830, file_size=30 * 1024 * 1024))
+        self.assertEqual(self.replies(call), [translate_en('ID_DOCUMENT_TOO_LARGE')])
+        apply_async.assert_not_called()
+        self.assertEqual(get_user_state(5), STATE_AWAITING_ID_DOCUMENT)
+
+    def test_download_streams_into_storage_once(self):
+        from django.core.files.storage import default_storage
+        from .files import download_telegram_file
+        from .models import TelegramFile
+
+        get_file = {'ok': True, 'result': {'file_id': 'large', 'file_unique_id': 'u-large', 'file_size': 6, 'file_path': 'photos/file_1.JPG'}}
+        with mock.patch('apps.telegram.bot_api.BotAPIClient.call', return_value=get_file), \
+                mock.patch('apps.telegram.bot_api.BotAPIClient.download', return_value=telegram_download(b'JPEG..')) as download:
+            telegram_file = download_telegram_file('large', mime_type='image/jpeg')
+            self.assertEqual(download_telegram_file('large', 'u-large'), telegram_file) # Known file_unique_id: no API calls
+        download.assert_called_once_with('photos/file_1.JPG')
+        self.assertEqual(telegram_file.stored_name, 'kyc_docs/u-large.jpg')
+        with default_storage.open(telegram_file.stored_name) as stored:
+            self.assertEqual(stored.read(), b'JPEG..')
+        self.assertEqual(TelegramFile.objects.count(), 1)
+
+    def test_download_task_attaches_the_document(self):
+        from .tasks import download_kyc_document_task
+
+        get_file = {'ok': True, 'result': {'file_id': 'large', 'file_unique_id': 'u-large', 'file_size': 6, 'file_path': 'photos/file_1.jpg'}}
+        with mock.patch('apps.telegram.bot_api.BotAPIClient.call', return_value=get_file), \
+                mock.patch('apps.telegram.bot_api.BotAPIClient.download', return_value=telegram_download(b'JPEG..')):
+            download_kyc_document_task.apply(args=(self.kyc_profile.pk, 'large', 'u-large', 'image/jpeg'))
+        self.kyc_profile.refresh_from_db()
+        self.assertEqual(self.kyc_profile.id_document.name, 'kyc_docs/u-large.jpg')
+
+    def test_file_above_the_limit_is_not_downloaded(self):
+        from .files import TelegramFileTooLarge, download_telegram_file
+
+        get_file = {'ok': True, 'result': {'file_id': 'x', 'file_unique_id': 'u-x', 'file_size': 30 * 1024 * 1024, 'file_path': 'documents/x.pdf'}}
+        with mock.patch('apps.telegram.bot_api.BotAPIClient.call', return_value=get_file), \
+                mock.patch('apps.telegram.bot_api.BotAPIClient.download') as download:
+            with self.assertRaises(TelegramFileTooLarge):
+                download_telegram_file('x')
+        download.assert_not_called()
+
+
+# --- Transactional outbox (outbox.py) ---
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        from .outbound import RateLimiter
+
+        cache.clear() # The worker kick is throttled through the cache
+        limiter = mock.patch('apps.telegram.outbound.get_rate_limiter', return_value=RateLimiter(global_rate=1000, per_chat_rate=1000))
+        limiter.start() # Not the process-wide limiter, which remembers chats across tests
+        self.addCleanup(limiter.stop)
+
+    def queue(self, text='Deposit confirmed', chat_id=5):
+        from .outbox import send_via_outbox
+
+        with mock.patch('apps.telegram.tasks.drain_outbox_task.apply_async'), self.captureOnCommitCallbacks(execute=True):
+            return send_via_outbox(chat_id, text)
+
+    def drain(self, side_effect):
+        from .outbox import drain_outbox
+
+        with mock.patch('apps.telegram.bot_api.BotAPIClient.call', side_effect=side_effect) as call:
+            stats = drain_outbox()
+        return stats, call
+
+    def test_message_is_kept_only_with_its_transaction(self):
+        from django.db import transaction
+        from .models import OutboxMessage
+        from .outbox import send_via_outbox
+
+        with mock.patch('apps.telegram.tasks.drain_outbox_task.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        send_via_outbox(5, 'rolled back')
+                        raise RuntimeError('deposit failed')
+                except RuntimeError:
+                    pass
+            self.assertEqual(callbacks, [])
+            self.assertFalse(OutboxMessage.objects.exists())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                send_via_outbox(5, 'kept')
+                send_via_outbox(5, 'kept too')
+        apply_async.assert_called_once() # One kick per second is enough
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_delivered_message_is_recorded(self):
+        from .models import OutboxMessage
+
+        message = self.queue()
+        stats, call = self.drain(lambda method, params: {'ok': True, 'result': {'message_id': 77}})
+        self.assertEqual(stats, {'sent': 1, 'retried': 0, 'dead': 0})
+        self.assertEqual(call.call_args.args[1]['text'], 'Deposit confirmed')
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.telegram_message_id), (OutboxMessage.STATUS_SENT, 1, 77))
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual(self.drain(lambda method, params: {'ok': True})[0]['sent'], 0) # Not sent twice
+
+    def test_transient_failure_is_retried_after_retry_after(self):
+        from django.utils import timezone
+        from .bot_api import BotAPIError
+        from .models import OutboxMessage
+
+        message = self.queue()
+        before = timezone.now()
+        with self.assertLogs('apps.telegram', 'WARNING'):
+            stats, _ = self.drain(BotAPIError('sendMessage', 'Too Many Requests', 429, retry_after=600))
+        self.assertEqual(stats, {'sent': 0, 'retried': 1, 'dead': 0})
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.STATUS_PENDING, 1))
+        self.assertGreaterEqual((message.next_attempt_at - before).total_seconds(), 600)
+        self.assertIn('Too Many Requests', message.last_error)
+        self.assertEqual(self.drain(lambda method, params: {'ok': True})[0]['sent'], 0) # Not due yet
+
+    def test_permanent_failure_is_dead_lettered_and_can_be_requeued(self):
+        from .bot_api import BotAPIError
+        from .models import OutboxMessage
+        from .outbox import requeue_dead_messages
+
+        message = self.queue()
+        with self.assertLogs('apps.telegram', 'ERROR'):
+            stats, _ = self.drain(BotAPIError('sendMessage', 'Forbidden: bot was blocked by the user', 403))
+        self.assertEqual(stats['dead'], 1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.STATUS_DEAD)
+
+        self.assertEqual(requeue_dead_messages(OutboxMessage.objects.all()), 1)
+        stats, _ = self.drain(lambda method, params: {'ok': True, 'result': {'message_id': 1}})
+        self.assertEqual(stats['sent'], 1)
+
+    @override_settings(TELEGRAM_OUTBOX_MAX_ATTEMPTS=2)
+    def test_message_is_dead_lettered_after_max_attempts(self):
+        from .bot_api import BotAPIError
+        from .models import OutboxMessage
+
+        message = self.queue()
+        error = BotAPIError('sendMessage', 'Bad Gateway', 502)
+        with self.assertLogs('apps.telegram', 'ERROR'):
+            self.drain(error)
+        OutboxMessage.objects.update(next_attempt_at=message.created_at) # Due again
+        with self.assertLogs('apps.telegram.outbox', 'ERROR'), self.assertLogs('apps.telegram.outbound', 'ERROR'):
+            stats, _ = self.drain(error)
+        self.assertEqual(stats, {'sent': 0, 'retried': 0, 'dead': 1})
+
+    def test_claimed_rows_are_leased_to_one_worker(self):
+        from .outbox import _claim_batch
+
+        self.queue('a')
+        self.queue('b')
+        self.assertEqual([row.text for row in _claim_batch(10)], ['a', 'b'])
+        self.assertEqual(_claim_batch(10), [])
+
+    def test_retry_delay_grows_and_is_capped(self):
+        from .outbox import retry_delay
+
+        with override_settings(TELEGRAM_OUTBOX_BACKOFF_BASE=5, TELEGRAM_OUTBOX_BACKOFF_MAX=60):
+            self.assertTrue(4 <= retry_delay(1) <= 6)
+            self.assertTrue(16 <= retry_delay(3) <= 24)
+            self.assertLessEqual(retry_delay(20), 72)
+            self.assertEqual(retry_delay(1, retry_after=300), 300)
+
+    def test_old_sent_messages_are_purged(self):
+        import datetime
+        from django.utils import timezone
+        from .models import OutboxMessage
+        from .outbox import purge_sent_messages
+
+        old, recent, pending = self.queue('old'), self.queue('recent'), self.queue('pending')
+        OutboxMessage.objects.filter(pk=old.pk).update(status=OutboxMessage.STATUS_SENT, sent_at=timezone.now() - datetime.timedelta(days=10))
+        OutboxMessage.objects.filter(pk=recent.pk).update(status=OutboxMessage.STATUS_SENT, sent_at=timezone.now())
+        self.assertEqual(purge_sent_messages(days=7), 1)
+        self.assertEqual(set(OutboxMessage.objects.values_list('text', flat=True)), {'recent', 'pending'})
+
+
+# --- Mini App initData validation (init_data.py) ---
+
+def sign_init_data(bot_token, auth_date=None, user=None, **fields):
+    """initData as the Telegram client sends it, signed for `bot_token`."""
+    import hashlib
+    import hmac
+    from urllib.parse import urlencode
+
+    params = dict(fields, auth_date=str(int(auth_date if auth_date is not None else time.time())))
+    if user is not None:
+        params['user'] = json.dumps(user)
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    data_check_string = '\n'.join(f"{key}={params[key]}" for key in sorted(params))
+    params['hash'] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(params)
+
+
+class InitDataValidatorTests(TestCase):
+    def validator(self, **kwargs):
+        from .init_data import InitDataValidator
+        return InitDataValidator('123:TOKEN', **kwargs)
+
+    def test_signed_init_data_is_accepted(self):
+        init_data = sign_init_data('123:TOKEN', user={'id': 5, 'first_name': 'Abebe'}, query_id='AAE')
+        is_valid, data = self.validator().validate(init_data)
+        self.assertTrue(is_valid)
+        self.assertEqual(data['user_data'], {'id': 5, 'first_name': 'Abebe'})
+        self.assertEqual(data['query_id'], 'AAE')
+        self.assertNotIn('hash', data)
+
+    def test_tampered_or_foreign_init_data_is_rejected(self):
+        validator = self.validator()
+        init_data = sign_init_data('123:TOKEN', user={'id': 5})
+        with self.assertLogs('apps.telegram.init_data', 'WARNING'):
+            self.assertEqual(validator.validate(init_data.replace('%22id%22%3A+5', '%22id%22%3A+6')), (False, None))
+            self.assertEqual(validator.validate(sign_init_data('999:OTHER', user={'id': 5})), (False, None))
+            self.assertEqual(validator.validate('auth_date=1&user=%7B%7D'), (False, None)) # No hash
+        self.assertEqual(validator.validate(''), (False, None))
+
+    def test_stale_auth_date_is_rejected(self):
+        validator = self.validator(max_age=3600)
+        with self.assertLogs('apps.telegram.init_data', 'INFO'):
+            self.assertFalse(validator.validate(sign_init_data('123:TOKEN', auth_date=time.time() - 7200))[0])
+        self.assertTrue(validator.validate(sign_init_data('123:TOKEN', auth_date=time.time() - 60))[0])
+
+    def test_repeat_validation_is_served_from_the_cache(self):
+        validator = self.validator(cache_size=2)
+        init_data = sign_init_data('123:TOKEN', user={'id': 5})
+        self.assertTrue(validator.validate(init_data)[0])
+        with mock.patch.object(validator, '_verify') as verify:
+            is_valid, data = validator.validate(init_data)
+            data['user_data'] = None # Callers get a copy
+            self.assertTrue(validator.validate(init_data)[1]['user_data'])
+        verify.assert_not_called()
+        self.assertTrue(is_valid)
+
+        for user_id in (6, 7):
+            validator.validate(sign_init_data('123:TOKEN', user={'id': user_id}))
+        self.assertNotIn(init_data, validator.cache) # Least recently used entry evicted
+
+    def test_cached_entry_does_not_outlive_max_age(self):
+        validator = self.validator(max_age=3600, cache_ttl=300)
+        init_data = sign_init_data('123:TOKEN', auth_date=time.time() - 3590)
+        self.assertTrue(validator.validate(init_data)[0])
+        self.assertLessEqual(validator.cache[init_data][1], time.time() + 10)
+        with mock.patch('apps.telegram.init_data.time.time', return_value=time.time() + 20), \
+                self.assertLogs('apps.telegram.init_data', 'INFO'):
+            self.assertFalse(validator.validate(init_data)[0])
+
+    def test_validator_follows_the_bot_token_setting(self):
+        from .init_data import get_init_data_validator, validate_telegram_init_data
+
+        with override_settings(TELEGRAM_BOT_TOKEN='123:TOKEN'):
+            self.assertTrue(validate_telegram_init_data(sign_init_data('123:TOKEN'))[0])
+            first = get_init_data_validator()
+        with override_settings(TELEGRAM_BOT_TOKEN='456:ROTATED'):
+            self.assertIsNot(get_init_data_validator(), first)
+            self.assertTrue(validate_telegram_init_data(sign_init_data('456:ROTATED'))[0])
@@ -0,0 +1,133 @@
+# apps/telegram/user_cache.py
+"""
+Change-detecting TelegramUser upsert.
+
+Every update carries the sender's Telegram profile. Instead of running
+update_or_create (SELECT + UPDATE, bumping updated_at) for every update, we
+remember a fingerprint of the last profile written for each user and only
+write when it changes; an unchanged profile costs one primary-key SELECT,
+so callers always get the full row (linked account included). Fingerprints live in an in-process LRU
+and, if TELEGRAM_USER_CACHE_ALIAS names a Django cache (e.g. Redis), in that
+shared cache as well so all workers benefit.
+"""
+import collections
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import TelegramUser
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'tg_user_fp:'
+
+
+def profile_from_telegram(from_user_data):
+    """Maps a Telegram `User` object to TelegramUser field values."""
+    return {
+        'first_name': from_user_data.get('first_name'),
+        'last_name': from_user_data.get('last_name'),
+        'username': from_user_data.get('username'),
+        'is_bot': from_user_data.get('is_bot', False),
+        'language_code': from_user_data.get('language_code'),
+    }
+
+def profile_fingerprint(fields):
+    """Stable digest of the values we would write for a user."""
+    values = {key: getattr(value, 'pk', value) for key, value in fields.items()} # Related objects by id
+    raw = '\x1f'.join(f"{key}={values[key]!r}" for key in sorted(values))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class ProfileFingerprintCache:
+    """Thread-safe LRU of user_id -> (fingerprint, expires_at), optionally backed by a Django cache."""
+
+    def __init__(self, max_entries=50000, ttl=3600, cache_alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.shared_cache = caches[cache_alias] if cache_alias else None
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                if entry[1] > now:
+                    self.entries.move_to_end(user_id)
+                    return entry[0]
+                del self.entries[user_id]
+        if self.shared_cache is not None:
+            fingerprint = self.shared_cache.get(f"{CACHE_KEY_PREFIX}{user_id}")
+            if fingerprint is not None:
+                self._remember_locally(user_id, fingerprint)
+            return fingerprint
+        return None
+
+    def _remember_locally(self, user_id, fingerprint):
+        with self.lock:
+            self.entries[user_id] = (fingerprint, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def set(self, user_id, fingerprint):
+        self._remember_locally(user_id, fingerprint)
+        if self.shared_cache is not None:
+            self.shared_cache.set(f"{CACHE_KEY_PREFIX}{user_id}", fingerprint, self.ttl)
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(f"{CACHE_KEY_PREFIX}{user_id}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_profile_cache():
+    """Returns the process-wide fingerprint cache configured from settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ProfileFingerprintCache(
+                    max_entries=getattr(settings, 'TELEGRAM_USER_CACHE_SIZE', 50000),
+                    ttl=getattr(settings, 'TELEGRAM_USER_CACHE_TTL', 3600),
+                    cache_alias=getattr(settings, 'TELEGRAM_USER_CACHE_ALIAS', None),
+                )
+    return _cache
+
+def _row_fields(telegram_user, fields):
+    """The row's current values for the keys in `fields` (related objects by id)."""
+    return {key: getattr(telegram_user, TelegramUser._meta.get_field(key).attname) for key in fields}
+
+def upsert_telegram_user(user_id, fields):
+    """
+    Creates or updates the TelegramUser row only if `fields` differ from what
+    was last written. Returns (telegram_user, created); on a cache hit the
+    row is read by primary key and not written.
+    """
+    cache = get_profile_cache()
+    fingerprint = profile_fingerprint(fields)
+    if cache.get(user_id) == fingerprint:
+        telegram_user = TelegramUser.objects.filter(pk=user_id).first()
+        if telegram_user is not None and profile_fingerprint(_row_fields(telegram_user, fields)) == fingerprint:
+            return telegram_user, False
+        cache.forget(user_id) # Row deleted or changed elsewhere (e.g. in the admin); write it below
+
+    telegram_user, created = TelegramUser.objects.update_or_create(user_id=user_id, defaults=fields)
+    # Only remember the fingerprint once the write is durable
+    transaction.on_commit(lambda: cache.set(user_id, fingerprint))
+    return telegram_user, created
+
+def sync_telegram_user(from_user_data):
+    """Upserts the sender of an update from its Telegram `User` object."""
+    return upsert_telegram_user(from_user_data['id'], profile_from_telegram(from_user_data))
@@ -68,7 +68,11 @@ def log_token_expiry(user_id, reason):
 def warn_token_expiry(chat_id, token_count, days_left, send_func):
     """
     Sends a warning message to a user about impending token expiration.
-    `send_func` would be a function like `telegram_bot.send_message`.
+    `send_func` would be a function like `telegram_bot.send_message`. When warning
+    many users at once, collect the messages and pass them to
+    `apps.telegram.outbound.queue_outbound_messages(..., priority=PRIORITY_NOTIFICATION)`
+    so the warnings are enqueued in batches on the rate-limited outbound queue,
+    behind transactional messages such as deposit confirmations.
     """
     if days_left in [3, 2, 1]:
         message = f"⚠️ You have {token_count} tokens expiring in {days_left} days."
@@ -22,7 +22,7 @@ def register_view(request):
             user.is_active = True # New users are active by default
             # You might want to auto-generate a strong password here or during account activation
             # For simplicity, if using UserCreationForm, it handles password.
-            user.save()
+            user.save(force_insert=True) # A new row; existing users (and their balances) are never overwritten from here
             
             # Log the user in immediately after registration (optional)
             login(request, user)
@@ -3,7 +3,7 @@ import os
 from celery import Celery
 
 # Set the default Django settings module for the 'celery' program.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'microfinance_backendt.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'microfinance_backend.settings')
 
 # Create a Celery application instance
 app = Celery('microfinance_backendoject')
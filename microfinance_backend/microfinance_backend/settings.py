@@ -24,7 +24,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-your-very-secret-key-for-development-only') # Use environment variable in production!
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True' # The Docker image sets False; its build runs collectstatic
 
 ALLOWED_HOSTS = ['*'] # Allow all hosts for development. Restrict in production.
 
@@ -56,6 +56,7 @@ SITE_ID = 1 # Required for django.contrib.sites
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.middleware.PrecompressedStaticMiddleware', # Serves collected static files; see apps/core/staticfiles.py
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -118,6 +119,16 @@ DATABASES = {
     # }
 }
 
+# 'default' is per process; 'shared' is Redis (the Celery broker's server), seen by every
+# web process and worker and kept across restarts, for state such as update_id dedup
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('DJANGO_SHARED_CACHE_URL', 'redis://localhost:6379/2'),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -161,6 +172,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles') # Collect static files here
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'), # Project-level static files
 ]
+# `python manage.py collectstatic` is the build step: outside DEBUG it writes content-hashed
+# copies (main.<hash>.js) plus .gz/.br variants, which PrecompressedStaticMiddleware serves
+# with immutable cache headers. .br variants need the optional `brotli` package.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG
+        else "apps.core.staticfiles.PrecompressedManifestStaticFilesStorage",
+    },
+}
+STATIC_PRECOMPRESS_MIN_SIZE = 256 # Smaller files are not worth compressing
+STATIC_MAX_AGE = 300 # Cache lifetime of collected files without a content hash in their name
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -174,6 +197,120 @@ TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '7493560731:AAFR_-6UjO
 # For production, always use environment variables for sensitive data!
 # Example: export TELEGRAM_BOT_TOKEN='123456:ABC-DEF1234ghIJKlmnOPQRST'
 
+# Optional secret passed to setWebhook as 'secret_token'; the webhook rejects requests without it.
+TELEGRAM_WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET')
+# Public URL registered by `python manage.py set_webhook`
+TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL')
+
+# Mini App initData validation (apps/telegram/init_data.py)
+TELEGRAM_INIT_DATA_MAX_AGE = 86400 # Seconds after auth_date that initData is accepted
+TELEGRAM_INIT_DATA_CACHE_SIZE = 10000 # Verified initData strings remembered per process
+TELEGRAM_INIT_DATA_CACHE_TTL = 300 # Seconds a verified string skips re-validation
+TELEGRAM_MINIAPP_SESSION_TTL = 900 # Seconds a Mini App session token (apps/miniapp/session.py) is valid
+# Per-user Mini App dashboards (apps/miniapp/dashboard.py), dropped by signals when the underlying rows change
+TELEGRAM_MINIAPP_DASHBOARD_CACHE_ALIAS = os.environ.get('TELEGRAM_MINIAPP_DASHBOARD_CACHE_ALIAS', 'default')
+TELEGRAM_MINIAPP_DASHBOARD_TTL = 300 # Longest a dashboard (and its ETag) lags writes that send no signals, e.g. QuerySet.update()
+# Server-pushed Mini App updates (apps/miniapp/events.py): 'memory' for a single web process, 'redis' across processes and workers
+# Streams need the ASGI server (see Dockerfile); set to False under WSGI and the Mini App polls the status endpoint instead
+TELEGRAM_MINIAPP_EVENTS_ENABLED = os.environ.get('TELEGRAM_MINIAPP_EVENTS_ENABLED', 'True') == 'True'
+TELEGRAM_MINIAPP_EVENTS_TOKEN_TTL = 60 # Seconds a stream token (it only opens /miniapp/api/events/) is valid
+TELEGRAM_MINIAPP_EVENTS_BROKER = os.environ.get('TELEGRAM_MINIAPP_EVENTS_BROKER', 'memory')
+TELEGRAM_MINIAPP_EVENTS_REDIS_URL = os.environ.get('TELEGRAM_MINIAPP_EVENTS_REDIS_URL', 'redis://localhost:6379/1')
+TELEGRAM_MINIAPP_EVENTS_KEEPALIVE = 25 # Seconds between keep-alive comments on an idle stream
+TELEGRAM_MINIAPP_EVENTS_MAX_PENDING = 100 # Events queued per stream before the oldest are dropped
+
+# How webhook updates are processed:
+#   'inline' - handlers run inside the webhook request (default, no worker needed)
+#   'celery' - the webhook only validates and enqueues the update, a Celery worker runs the handlers
+TELEGRAM_UPDATE_PROCESSING = os.environ.get('TELEGRAM_UPDATE_PROCESSING', 'inline')
+TELEGRAM_UPDATE_QUEUE = os.environ.get('TELEGRAM_UPDATE_QUEUE', 'default')
+# How inline button presses are acknowledged (answerCallbackQuery):
+#   'background'       - sent from a small thread pool while the handler runs (default)
+#   'webhook_response' - returned as the webhook's HTTP response body, no extra API call; instant with
+#                        TELEGRAM_UPDATE_PROCESSING = 'celery', after the handler when processing inline
+#   'sync'             - sent before the handler runs, blocking it for one Bot API round trip
+TELEGRAM_CALLBACK_ACK_MODE = os.environ.get('TELEGRAM_CALLBACK_ACK_MODE', 'background')
+TELEGRAM_CALLBACK_ACK_WORKERS = 4
+
+# Append every accepted webhook update to this NDJSON file, for `manage.py replay_webhook_load --file` (off when unset)
+TELEGRAM_CAPTURE_UPDATES_FILE = os.environ.get('TELEGRAM_CAPTURE_UPDATES_FILE')
+
+# Long-polling alternative to the webhook: python manage.py run_telegram_polling
+TELEGRAM_POLLING_WORKERS = int(os.environ.get('TELEGRAM_POLLING_WORKERS', '4'))
+TELEGRAM_POLLING_TIMEOUT = 30 # Seconds getUpdates waits for new updates
+
+# Redelivered updates are dropped by update_id (apps/telegram/dedup.py).
+# Must be shared by all workers and survive restarts, hence the Redis-backed 'shared' cache.
+TELEGRAM_DEDUP_CACHE_ALIAS = os.environ.get('TELEGRAM_DEDUP_CACHE_ALIAS', 'shared')
+TELEGRAM_DEDUP_TTL = 86400 # Telegram keeps undelivered updates for up to 24 hours
+
+# Bot reply languages (apps/telegram/catalog.py); each needs apps/telegram/locales/<code>.py except English.
+TELEGRAM_LANGUAGES = ('en', 'am', 'om')
+TELEGRAM_DEFAULT_LANGUAGE = 'en'
+TELEGRAM_LANGUAGE_CACHE_TTL = 600 # Seconds a user's preferred_language is cached per process
+
+# Per-route latency histograms kept by apps/telegram/router.py
+TELEGRAM_ROUTE_METRICS_LOG_EVERY = 1000 # Log a per-route summary every N handled updates (0 disables)
+TELEGRAM_ROUTE_SLOW_MS = 1000 # Log a warning when a single route takes longer than this
+
+# Shared Bot API client (apps/telegram/bot_api.py): keep-alive connection pool and timeouts in seconds.
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', 'https://api.telegram.org') # Point at a local Bot API server or a stub
+TELEGRAM_API_CONNECT_TIMEOUT = float(os.environ.get('TELEGRAM_API_CONNECT_TIMEOUT', '3.05'))
+TELEGRAM_API_READ_TIMEOUT = float(os.environ.get('TELEGRAM_API_READ_TIMEOUT', '10'))
+TELEGRAM_API_POOL_SIZE = int(os.environ.get('TELEGRAM_API_POOL_SIZE', '20'))
+TELEGRAM_API_HTTP2 = os.environ.get('TELEGRAM_API_HTTP2', 'False') == 'True' # Async client only, needs httpx[http2]
+
+# Outbound dispatcher (apps/telegram/outbound.py): Telegram flood limits and retry policy.
+TELEGRAM_OUTBOUND_QUEUE = os.environ.get('TELEGRAM_OUTBOUND_QUEUE', 'telegram_outbound')
+TELEGRAM_OUTBOUND_GLOBAL_RATE = 30 # Messages per second across all chats
+TELEGRAM_OUTBOUND_PER_CHAT_RATE = 1 # Messages per second to the same chat
+TELEGRAM_OUTBOUND_BATCH_SIZE = 30 # Messages per Celery task
+TELEGRAM_OUTBOUND_MAX_ATTEMPTS = 5
+
+# Transactional outbox (apps/telegram/outbox.py): messages written with the business change, delivered by the outbound worker.
+TELEGRAM_OUTBOX_BATCH_SIZE = 100 # Rows claimed per batch
+TELEGRAM_OUTBOX_TIME_BUDGET = 50 # Seconds one drain task runs (Beat starts one every minute)
+TELEGRAM_OUTBOX_LEASE = 120 # Seconds a claimed row is hidden from other workers
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = 8 # Then the message is dead-lettered
+TELEGRAM_OUTBOX_BACKOFF_BASE = 5 # Seconds before the first retry, doubled on each failure
+TELEGRAM_OUTBOX_BACKOFF_MAX = 3600
+TELEGRAM_OUTBOX_RETENTION_DAYS = 7 # Delivered rows are kept this long
+
+# Broadcasts (apps/telegram/broadcast.py) run on the outbound queue and share its rate limits.
+TELEGRAM_BROADCAST_PAGE_SIZE = 200 # Recipients sent between progress checkpoints
+TELEGRAM_BROADCAST_CONCURRENCY = 8 # Parallel senders per broadcast
+TELEGRAM_BROADCAST_TIME_BUDGET = 240 # Seconds a task sends before re-enqueueing the job
+TELEGRAM_BROADCAST_LEASE = 120 # Seconds without a checkpoint before a job counts as stalled
+
+# BotInteractionLog rows are buffered and written with bulk_create (apps/telegram/interaction_log.py).
+# A batch size of 1 writes every interaction immediately.
+TELEGRAM_INTERACTION_LOG_BATCH_SIZE = int(os.environ.get('TELEGRAM_INTERACTION_LOG_BATCH_SIZE', '100'))
+TELEGRAM_INTERACTION_LOG_MAX_AGE = 5.0 # Seconds before a partially filled buffer is written
+# Interactions older than the retention period are moved to gzipped NDJSON files (apps/telegram/retention.py).
+TELEGRAM_INTERACTION_LOG_RETENTION_DAYS = int(os.environ.get('TELEGRAM_INTERACTION_LOG_RETENTION_DAYS', '90'))
+TELEGRAM_INTERACTION_ARCHIVE_DIR = os.environ.get('TELEGRAM_INTERACTION_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archives', 'bot_interactions'))
+TELEGRAM_INTERACTION_ARCHIVE_CHUNK_SIZE = 2000 # Rows archived and deleted per batch
+# Hourly/daily usage counters built incrementally from the interaction log (apps/telegram/rollups.py).
+TELEGRAM_ROLLUP_CHUNK_SIZE = 50000 # Log ids counted per transaction
+TELEGRAM_ROLLUP_LAG = 300 # Seconds to wait before counting a log row, so late buffered writes are not skipped
+
+# Files sent to the bot (KYC ID photos) are streamed into the default storage by a Celery task (apps/telegram/files.py).
+TELEGRAM_FILE_QUEUE = 'default'
+TELEGRAM_FILE_CHUNK_SIZE = 64 * 1024 # Bytes read from Telegram per chunk
+TELEGRAM_FILE_MAX_SIZE = 20 * 1024 * 1024 # The Bot API does not serve larger files
+
+# TelegramUser upserts are skipped when the profile is unchanged (apps/telegram/user_cache.py).
+TELEGRAM_USER_CACHE_SIZE = 50000 # Users remembered per process
+TELEGRAM_USER_CACHE_TTL = 3600 # Seconds before a profile is written again even if unchanged
+TELEGRAM_USER_CACHE_ALIAS = os.environ.get('TELEGRAM_USER_CACHE_ALIAS') # Optional shared Django cache (e.g. Redis)
+
+# Conversation state for multi-step bot flows (apps/telegram/states.py), shared by all workers.
+#   'db'    - ConversationState table (default)
+#   'cache' - Django cache named by TELEGRAM_STATE_CACHE_ALIAS; must be shared (e.g. Redis) with several workers
+TELEGRAM_STATE_BACKEND = os.environ.get('TELEGRAM_STATE_BACKEND', 'db')
+TELEGRAM_STATE_CACHE_ALIAS = os.environ.get('TELEGRAM_STATE_CACHE_ALIAS', 'default')
+TELEGRAM_STATE_TTL = 86400 # Seconds of inactivity before a user's flow is abandoned (sliding, refreshed as they reply)
+
 # Celery Configuration (from your previous settings)
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -182,6 +319,12 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Africa/Nairobi'
 CELERY_ENABLE_UTC = True
+# Let task priorities (e.g. transactional over marketing Telegram messages) take effect on Redis
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
 
 from celery.schedules import timedelta
 CELERY_BEAT_SCHEDULE = {
@@ -197,7 +340,51 @@ CELERY_BEAT_SCHEDULE = {
         'args': (),
         'options': {'queue': 'default'}
     },
+    'resume-stalled-telegram-broadcasts': {
+        'task': 'apps.telegram.tasks.resume_stalled_broadcasts_task',
+        'schedule': timedelta(minutes=5),
+        'args': (),
+        'options': {'queue': 'default'}
+    },
+    'update-bot-interaction-rollups': {
+        'task': 'apps.telegram.tasks.update_interaction_rollups_task',
+        'schedule': timedelta(minutes=15),
+        'args': (),
+        'options': {'queue': 'default'}
+    },
+    'archive-bot-interaction-logs-daily': {
+        'task': 'apps.telegram.tasks.archive_interaction_logs_task',
+        'schedule': timedelta(days=1),
+        'args': (),
+        'options': {'queue': 'default'}
+    },
+    'drain-telegram-outbox': {
+        'task': 'apps.telegram.tasks.drain_outbox_task',
+        'schedule': timedelta(minutes=1),
+        'args': (),
+        'options': {'queue': TELEGRAM_OUTBOUND_QUEUE}
+    },
+    'purge-sent-telegram-outbox-daily': {
+        'task': 'apps.telegram.tasks.purge_sent_outbox_messages_task',
+        'schedule': timedelta(days=1),
+        'args': (),
+        'options': {'queue': 'default'}
+    },
+    'purge-expired-conversation-states-hourly': {
+        'task': 'apps.telegram.tasks.purge_expired_conversation_states_task',
+        'schedule': timedelta(hours=1),
+        'args': (),
+        'options': {'queue': 'default'}
+    },
+    'snapshot-account-balances-hourly': {
+        'task': 'apps.CustomUser.tasks.snapshot_balances_task',
+        'schedule': timedelta(hours=1),
+        'args': (),
+        'options': {'queue': 'default'}
+    },
 }
+# Balance ledger (apps/CustomUser/ledger.py)
+BALANCE_SNAPSHOT_BATCH_SIZE = 500 # Ledger entries read per step of a snapshot run
 
 # Authentication Settings for Web UI
 LOGIN_REDIRECT_URL = 'home' # URL name to redirect to after successful login